@@ -0,0 +1,525 @@
+'''Benchmark suite for bayes.py and bayesbest.py:  measures tokenize(), train(), load() of the
+saved database, the startup latency of a fresh process, single classify() and bulk
+classifyBatch() scoring, and the n-gram feature settings against the unigram model, on the
+shipped training/ and testing/ reviews and on synthetic corpora scaled up from them, and
+writes the results as JSON (throughput, latency percentiles, peak memory and accuracy).
+With --compare, the results are checked against a stored baseline (an earlier --output
+file), and any metric that got worse by more than --tolerance is flagged as a regression
+(and the exit status is 1), unless the change is within the noise:  smaller than the noise
+floor of its unit (NOISE_FLOORS), or within the spread of the repeated runs.
+
+    python benchmark.py [--classifiers bayes.py bayesbest.py] [--scales 1 10 100] [--runs 3]
+                        [--output results.json] [--compare baseline.json] [--tolerance 0.10]
+
+Each (classifier, scale) pair runs --runs times, each time in its own process and scratch
+directory, so that the shipped database is untouched and the peak memory of each run is its
+own; every metric is the median of the runs.  Every timing repeats its call for at least
+MIN_TIMING_SECONDS, so that no metric rests on a single run of a few milliseconds.
+'''
+
+import argparse, gc, importlib.util, json, multiprocessing, os, pickle, platform, random, re, resource, shutil, statistics, string, subprocess, sys, tempfile, time, types
+from nbclassify import corpus, engine, modelfile, ratings, vocabulary
+from loadgen import percentile
+
+trainDir = "training/"
+testDir  = "testing/"
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+NOVEL_WORD_RATE  = 0.05 # Share of Synthetic Sentences that get a Made-up Word
+MEMORY_BATCH     = 20   # Reviews each Memory Worker Scores (Few, so that the Model Dominates its Memory)
+
+MIN_TIMING_SECONDS = 0.2 # Least Time Each Timing Repeats its Call For (see bestTime())
+
+# Changes Smaller than these (by Unit) are Noise, and Never Flagged as Regressions
+NOISE_FLOORS = {"ms": 1.0, "us": 20.0, "sec": 0.01, "KB": 1024.0}
+
+# Feature Settings Compared by the Benchmark:  (Name, Longest N-gram, Hash Buckets)
+FEATURE_MODES = [("unigram", 1, 0), ("bigram", 2, 0), ("trigram", 3, 0), ("trigram_hashed", 3, 1 << 15)]
+
+
+def loadCorpus(lDirectories):
+    '''Return the contents of every file in the given directories, as a list of strings.'''
+
+    lTexts = []
+    for sDirectory in lDirectories:
+        for sFilename in sorted(os.listdir(sDirectory)):
+            lTexts.append(corpus.readText(os.path.join(sDirectory, sFilename)))
+    return lTexts
+
+
+def generateCorpus(sSourceDir, sTargetDir, iScale, iSeed = 510):
+    '''Write a synthetic corpus with iScale times as many reviews as sSourceDir to sTargetDir.
+    Every review is kept, along with iScale - 1 new reviews of the same rating and length,
+    made of sentences drawn at random from the reviews of that rating.  A few made-up words
+    are mixed in, so that the vocabulary keeps growing with the corpus, as a real one would.
+    An existing sTargetDir is reused as it is.'''
+
+    if os.path.isdir(sTargetDir):
+        return
+    rng = random.Random(iSeed)
+    dSentences = {}
+    lSources = []
+    for sFilename in sorted(os.listdir(sSourceDir)):
+        sText = corpus.readText(os.path.join(sSourceDir, sFilename))
+        sRating = sFilename.split("-")[1]
+        dSentences.setdefault(sRating, []).extend(sSentence for sSentence in SENTENCE_PATTERN.split(sText) if sSentence.strip())
+        lSources.append((sFilename, sRating, sText))
+
+    sPartialDir = sTargetDir.rstrip("/") + ".partial"
+    if os.path.isdir(sPartialDir):
+        shutil.rmtree(sPartialDir)
+    os.makedirs(sPartialDir)
+    for sFilename, sRating, sText in lSources:
+        shutil.copy(os.path.join(sSourceDir, sFilename), sPartialDir)
+        sStem, sExtension = os.path.splitext(sFilename)
+        lPool = dSentences[sRating]
+        for iCopy in range(1, iScale):
+            lSentences = []
+            iLength = 0
+            while iLength < len(sText) and lPool:
+                sSentence = rng.choice(lPool)
+                if rng.random() < NOVEL_WORD_RATE:
+                    sSentence = "%s zz%x" % (sSentence, rng.randrange(iScale * 1000))
+                lSentences.append(sSentence)
+                iLength += len(sSentence) + 1
+            with open(os.path.join(sPartialDir, "%sx%d%s" % (sStem, iCopy, sExtension)), "w", encoding = corpus.ENCODING) as fh:
+                fh.write(" ".join(lSentences))
+    os.rename(sPartialDir, sTargetDir)
+
+
+def peakMemory():
+    '''Return the peak resident memory of this process so far, in KB.'''
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def processMemory():
+    '''Return this process's resident, proportional (shared pages split between the processes
+    that map them) and private memory, in KB, or None where /proc/self/smaps_rollup is missing.'''
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        return None
+    dMemory = {}
+    for sLine in open("/proc/self/smaps_rollup"):
+        lFields = sLine.split()
+        if len(lFields) == 3 and lFields[2] == "kB":
+            dMemory[lFields[0].rstrip(":")] = int(lFields[1])
+    return (dMemory["Rss"], dMemory["Pss"], dMemory["Private_Clean"] + dMemory["Private_Dirty"])
+
+
+def objectSize(*lObjects):
+    '''Return the total size, in bytes, of the given objects and of every object they refer
+    to (counting each object once, and leaving out classes and modules).'''
+
+    setSeen = set()
+    lPending = list(lObjects)
+    iSize = 0
+    while lPending:
+        obj = lPending.pop()
+        if id(obj) in setSeen or isinstance(obj, (type, types.ModuleType)):
+            continue
+        setSeen.add(id(obj))
+        iSize += sys.getsizeof(obj)
+        lPending.extend(gc.get_referents(obj))
+    return iSize
+
+
+def bestTime(fCall, iRepeat):
+    '''Return the best wall time of fCall(), in seconds, out of at least iRepeat calls, repeated
+    until they have taken MIN_TIMING_SECONDS in all.'''
+
+    fBest = None
+    fTotal = 0.0
+    iCalls = 0
+    while iCalls < iRepeat or fTotal < MIN_TIMING_SECONDS:
+        fStart = time.time()
+        fCall()
+        fElapsed = time.time() - fStart
+        if fBest is None or fElapsed < fBest:
+            fBest = fElapsed
+        fTotal += fElapsed
+        iCalls += 1
+    return max(fBest, 1e-9)
+
+
+def loadAndScore(bc, sFilename):
+    '''Load the model saved in sFilename into bc, as the classifier does, and score one short
+    review with it (which builds whatever scoring tables the model needs).'''
+
+    bc.loadModel(sFilename)
+    bc.reviewLogFinalProbs("a review")
+
+
+def syntheticModel(sFilename, iWords, iSeed = 510):
+    '''Write a model file of iWords made-up words (of 2 to 12 letters, with random counts), in
+    place of the model of a corpus with a vocabulary that large.'''
+
+    rng = random.Random(iSeed)
+    dWords = {}
+    while len(dWords) < iWords:
+        dWords["".join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(2, 12)))] = rng.randint(1, 50)
+    iTotal = sum(dWords.values())
+    modelfile.writeModel(sFilename, [dWords, dict(dWords), 100, 100, iTotal, iTotal])
+
+
+def memoryWorker(cClassifier, sTrainPath, sModelFile, bMapped, lTexts, qResults, eDone):
+    '''Load a classifier, score the small batch lTexts (which builds its lookup tables), and
+    report the memory this added to the process (while every worker is still alive, so that
+    shared pages are split between them).'''
+
+    tBefore = processMemory()
+    bcWorker = cClassifier(sTrainPath, 1, bMapped, modelFile = sModelFile, lazy = False)
+    bcWorker.classifyBatch(lTexts)
+    gc.collect()
+    tAfter = processMemory()
+    qResults.put(tuple(iAfter - iBefore for iAfter, iBefore in zip(tAfter, tBefore)))
+    eDone.wait()
+
+
+def workerMemory(cClassifier, sTrainPath, sModelFile, bMapped, lTexts, iWorkers):
+    '''Return the mean increase in (rss, pss, private) memory of iWorkers scoring processes
+    that each load the model saved in sModelFile (mapped, or read into memory).  The
+    workers are spawned, not forked, so that none of them starts out sharing (and then
+    copying) the pages of this process.'''
+
+    oContext = multiprocessing.get_context("spawn")
+    qResults = oContext.Queue()
+    eDone = oContext.Event()
+    lWorkers = [oContext.Process(target = memoryWorker, args = (cClassifier, sTrainPath, sModelFile, bMapped, lTexts, qResults, eDone)) for i in range(iWorkers)]
+    for pWorker in lWorkers:
+        pWorker.start()
+    lResults = [qResults.get() for pWorker in lWorkers]
+    eDone.set()
+    for pWorker in lWorkers:
+        pWorker.join()
+    return [sum(lValues) / len(lValues) for lValues in zip(*lResults)]
+
+
+def loadModule(sName, sFilename):
+    '''Import the Python file sFilename as the module sName, and return the module.'''
+
+    oSpec = importlib.util.spec_from_file_location(sName, sFilename)
+    oModule = importlib.util.module_from_spec(oSpec)
+    sys.modules[sName] = oModule
+    oSpec.loader.exec_module(oModule)
+    return oModule
+
+
+STARTUP_SCRIPT = """
+import importlib.util, json, os, sys, time
+from nbclassify import corpus
+fStart = time.time()
+oSpec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(sys.argv[1]))[0], sys.argv[1])
+oModule = importlib.util.module_from_spec(oSpec)
+oSpec.loader.exec_module(oModule)
+fImported = time.time()
+bc = oModule.Bayes_Classifier(sys.argv[2], lazy = sys.argv[4] == "lazy")
+fConstructed = time.time()
+bc.classify(corpus.readText(sys.argv[3]))
+fDone = time.time()
+print(json.dumps({"import_ms": 1000 * (fImported - fStart), "construct_ms": 1000 * (fConstructed - fImported), "first_result_ms": 1000 * (fDone - fImported)}))
+"""
+
+
+def startupLatency(sClassifierFile, sTrainPath, sTestFile, bLazy):
+    '''Return the import, constructor and first classify() result latencies (from the end of the
+    import) of a fresh interpreter that loads the saved database in the current directory, in ms.'''
+
+    sClassifierFile = os.path.abspath(sClassifierFile)
+    dEnvironment = dict(os.environ, PYTHONPATH = os.path.dirname(sClassifierFile))
+    sOutput = subprocess.check_output([sys.executable, "-c", STARTUP_SCRIPT, sClassifierFile, sTrainPath, sTestFile,
+                                       "lazy" if bLazy else "eager"], env = dEnvironment)
+    return json.loads(sOutput.splitlines()[-1])
+
+
+def benchmarkClassifier(sClassifierFile, sTrainPath, sTestPath, bCheck, args):
+    '''Run every benchmark for one classifier file and corpus, in the current (scratch)
+    directory, and return the results as a dictionary of metric name -> (value, unit,
+    "higher" or "lower" is better).'''
+
+    dMetrics = {}
+    def record(sName, value, sUnit, sBetter):
+        dMetrics[sName] = {"value": value, "unit": sUnit, "better": sBetter}
+        print("  %-34s %14.3f %s" % (sName, value, sUnit))
+        sys.stdout.flush()
+
+    sModule = os.path.splitext(os.path.basename(sClassifierFile))[0]
+    oModule = loadModule(sModule, sClassifierFile)
+    cClassifier = oModule.Bayes_Classifier
+    iTrainDocs = len(os.listdir(sTrainPath))
+    iTrainBytes = sum(os.path.getsize(os.path.join(sTrainPath, sFilename)) for sFilename in os.listdir(sTrainPath))
+
+    # Training (There is No Database in the Scratch Directory Yet)
+    fStart = time.time()
+    bc = cClassifier(sTrainPath, args.workers[0], lazy = False)
+    fElapsed = time.time() - fStart
+    record("train.seconds", fElapsed, "sec", "lower")
+    record("train.docs_per_sec", iTrainDocs / fElapsed, "docs/sec", "higher")
+    record("train.peak_rss_kb", peakMemory(), "KB", "lower")
+    for iWorkers in args.workers[1:]:
+        record("train.workers_%d.seconds" % iWorkers, bestTime(lambda: bc.train(iWorkers), 1), "sec", "lower")
+
+    # Tokenizer Throughput (and Equivalence with the Original Tokenizer, on ASCII Reviews)
+    lTexts = loadCorpus([sTrainPath])
+    iChars = sum(len(sText) for sText in lTexts)
+    iRepeat = 3 if iChars < 50000000 else 1
+    if bCheck:
+        for sText in lTexts:
+            if not sText.isascii():
+                continue
+            lExpected = engine.referenceTokenize(sText)
+            if bc.tokenize(sText) != lExpected:
+                raise AssertionError("tokenize() differs from the reference tokenizer")
+            if bc.tokenize(sText, True) != [word.lower() for word in lExpected]:
+                raise AssertionError("tokenize(bLowercase = True) differs from the reference tokenizer")
+            if list(bc.iterTokens(sText, True)) != [word.lower() for word in lExpected]:
+                raise AssertionError("iterTokens() differs from the reference tokenizer")
+        record("tokenize.reference_chars_per_sec", iChars / bestTime(lambda: [engine.referenceTokenize(sText) for sText in lTexts], 1), "chars/sec", "higher")
+    record("tokenize.chars_per_sec", iChars / bestTime(lambda: [bc.tokenize(sText) for sText in lTexts], iRepeat), "chars/sec", "higher")
+    record("tokenize.iter_chars_per_sec", iChars / bestTime(lambda: [sum(1 for word in bc.iterTokens(sText, True)) for sText in lTexts], iRepeat), "chars/sec", "higher")
+    record("train.mb_per_sec", iTrainBytes / 1e6 / dMetrics["train.seconds"]["value"], "MB/sec", "higher")
+    lTexts = None
+
+    # Model Load Time (Binary Model Format and Legacy Pickle Database, Timed through loadModel()
+    # up to a First Score, as the Classifier Loads a Model; and Opening the Memory-Mapped Model)
+    lDatabase = bc.load(bc.modelFile)
+    f = open("database.pickle", "wb")
+    pickle.Pickler(f, 0).dump(lDatabase)
+    f.close()
+    del lDatabase
+    record("model.bytes", os.path.getsize(bc.modelFile), "bytes", "lower")
+    record("load.ms", 1000 * bestTime(lambda: loadAndScore(bc, bc.modelFile), 5), "ms", "lower")
+    record("load.pickle_ms", 1000 * bestTime(lambda: loadAndScore(bc, "database.pickle"), 5), "ms", "lower")
+    bc.loadModel(bc.modelFile)
+    record("load.mapped_ms", 1000 * bestTime(lambda: modelfile.MappedModel(bc.modelFile), 5), "ms", "lower")
+    os.remove("database.pickle")
+
+    # Model Memory (a Dictionary per Class vs. the Compact Count Table of vocabulary.py)
+    lDatabase = bc.load(bc.modelFile)
+    oTable = vocabulary.CountTable.fromMappings(lDatabase[0], lDatabase[1])
+    record("memory.dict_kb", objectSize(lDatabase[0], lDatabase[1]) / 1024.0, "KB", "lower")
+    record("memory.compact_kb", objectSize(oTable) / 1024.0, "KB", "lower")
+    record("memory.compact_min2_kb", objectSize(oTable.prune(2)) / 1024.0, "KB", "lower")
+    lDatabase = oTable = None
+
+    # Startup Latency of a Fresh Process (Import, Lazy or Eager Constructor, First Result)
+    sTestFile = os.path.join(sTestPath, sorted(os.listdir(sTestPath))[0])
+    for sMode, bLazy in [("lazy", True), ("eager", False)]:
+        dStartup = startupLatency(sClassifierFile, sTrainPath, sTestFile, bLazy)
+        if bLazy:
+            record("startup.import_ms", dStartup["import_ms"], "ms", "lower")
+        record("startup.%s_construct_ms" % sMode, dStartup["construct_ms"], "ms", "lower")
+        record("startup.%s_first_result_ms" % sMode, dStartup["first_result_ms"], "ms", "lower")
+
+    # Single classify() Latency (the First Call also Loads the Model and Builds the Log Probability Table)
+    lTexts = loadCorpus([sTestPath])
+    bc = cClassifier(sTrainPath)
+    fStart = time.time()
+    bc.classify(lTexts[0])
+    record("classify.first_ms", 1000 * (time.time() - fStart), "ms", "lower")
+    lLatencies = []
+    fStart = time.time()
+    for sText in lTexts[:args.max_docs]:
+        fCall = time.time()
+        bc.classify(sText)
+        lLatencies.append(time.time() - fCall)
+    fElapsed = time.time() - fStart
+    lLatencies.sort()
+    record("classify.docs_per_sec", len(lLatencies) / fElapsed, "docs/sec", "higher")
+    for iPercent in [50, 90, 99]:
+        record("classify.p%d_us" % iPercent, 1e6 * percentile(lLatencies, iPercent), "us", "lower")
+
+    # The Same with Instrumentation Enabled (the Metrics above are with it Disabled)
+    bc.enableMetrics()
+    fElapsed = bestTime(lambda: [bc.classify(sText) for sText in lTexts[:args.max_docs]], 3)
+    record("instrument.classify_docs_per_sec", min(len(lTexts), args.max_docs) / fElapsed, "docs/sec", "higher")
+    bc.disableMetrics()
+
+    # Bulk classifyBatch() Scoring
+    lBatches = [lTexts[i:i + args.batch_size] for i in range(0, len(lTexts), args.batch_size)]
+    lLatencies = []
+    def scoreAll():
+        for lBatch in lBatches:
+            fCall = time.time()
+            bc.classifyBatch(lBatch)
+            lLatencies.append(time.time() - fCall)
+    fElapsed = bestTime(scoreAll, 3)
+    lLatencies.sort()
+    record("bulk.docs_per_sec", len(lTexts) / fElapsed, "docs/sec", "higher")
+    for iPercent in [50, 99]:
+        record("bulk.batch_p%d_ms" % iPercent, 1000 * percentile(lLatencies, iPercent), "ms", "lower")
+
+    # Explanations (Single and Bulk, Top 10 Features per Class) and the Most Discriminative Words
+    record("explain.docs_per_sec", len(lTexts[:args.max_docs]) / bestTime(lambda: [bc.explain(sText) for sText in lTexts[:args.max_docs]], 3), "docs/sec", "higher")
+    record("explain.bulk_docs_per_sec", len(lTexts) / bestTime(lambda: [bc.explainBatch(lBatch) for lBatch in lBatches], 3), "docs/sec", "higher")
+    record("explain.discriminative_first_ms", 1000 * bestTime(lambda: (bc.buildLogProbTable(), bc.mostDiscriminative(20)), 1), "ms", "lower")
+    record("explain.discriminative_us", 1e6 * bestTime(lambda: bc.mostDiscriminative(20), 5), "us", "lower")
+
+    # N-gram Features:  Training and Scoring Throughput, Model Size and Accuracy, per Setting
+    lTruth = [corpus.fileLabel(sFilename) for sFilename in sorted(os.listdir(sTestPath))]
+    iLabeled = max(1, sum(1 for sLabel in lTruth if sLabel is not None))
+    for sMode, iNgrams, iHashBuckets in FEATURE_MODES:
+        fStart = time.time()
+        bcFeatures = cClassifier(sTrainPath, args.workers[0], modelFile = "database." + sMode, ngrams = iNgrams, hashBuckets = iHashBuckets, lazy = False)
+        record("features.%s.train_docs_per_sec" % sMode, iTrainDocs / (time.time() - fStart), "docs/sec", "higher")
+        record("features.%s.vocab_size" % sMode, len(bcFeatures.positiveWords.table.vocabulary), "features", "lower")
+        record("features.%s.memory_kb" % sMode, objectSize(bcFeatures.positiveWords.table) / 1024.0, "KB", "lower")
+        record("features.%s.bulk_docs_per_sec" % sMode, len(lTexts) / bestTime(lambda: bcFeatures.classifyBatch(lTexts), 3), "docs/sec", "higher")
+        lLabels = bcFeatures.classifyBatch(lTexts)
+        record("features.%s.accuracy" % sMode, sum(1 for sLabel, sTrue in zip(lLabels, lTruth) if sLabel == sTrue) / float(iLabeled), "fraction", "higher")
+        bcFeatures = None
+        os.remove("database." + sMode)
+
+    # K-Class Rating Model:  Training, and Scoring All the Classes (Single and Bulk)
+    fStart = time.time()
+    rc = ratings.Rating_Classifier(sTrainPath, args.workers[0], "ratings")
+    record("ratings.train_docs_per_sec", iTrainDocs / (time.time() - fStart), "docs/sec", "higher")
+    record("ratings.docs_per_sec", len(lTexts[:args.max_docs]) / bestTime(lambda: [rc.rate(sText) for sText in lTexts[:args.max_docs]], 3), "docs/sec", "higher")
+    record("ratings.bulk_docs_per_sec", len(lTexts) / bestTime(lambda: [rc.rateBatch(lBatch) for lBatch in lBatches], 3), "docs/sec", "higher")
+    rc = None
+    os.remove("ratings")
+
+    # Per-Process Memory of N Scoring Workers (Model Read into Memory vs. Memory-Mapped Model), for
+    # the Trained Model and a Made-up Model with a Large Vocabulary (where the Model Dominates)
+    if args.memory_workers > 0 and processMemory() is not None:
+        lTexts = lTexts[:MEMORY_BATCH]
+        lModels = [("", bc.modelFile)]
+        if args.memory_vocab > 0:
+            syntheticModel("database.large", args.memory_vocab)
+            lModels.append(("large_", "database.large"))
+        for sPrefix, sModelFile in lModels:
+            for sMode, bMapped in [("dict", False), ("mapped", True)]:
+                iRss, iPss, iPrivate = workerMemory(cClassifier, sTrainPath, sModelFile, bMapped, lTexts, args.memory_workers)
+                record("workers.%s%s_pss_kb" % (sPrefix, sMode), iPss, "KB", "lower")
+                record("workers.%s%s_private_kb" % (sPrefix, sMode), iPrivate, "KB", "lower")
+        if args.memory_vocab > 0:
+            os.remove("database.large")
+
+    record("peak_rss_kb", peakMemory(), "KB", "lower")
+    return dMetrics
+
+
+def runIsolated(sClassifierFile, sTrainPath, sTestPath, bCheck, args, qResults):
+    '''Run benchmarkClassifier() in a fresh scratch directory, and put its metrics (or the
+    error that stopped it) on qResults.'''
+
+    sScratchDir = tempfile.mkdtemp()
+    os.chdir(sScratchDir)
+    try:
+        qResults.put(benchmarkClassifier(sClassifierFile, sTrainPath, sTestPath, bCheck, args))
+    except Exception as e:
+        qResults.put("%s: %s" % (e.__class__.__name__, e))
+    finally:
+        shutil.rmtree(sScratchDir)
+
+
+def isRegression(dBase, dCurrent, fTolerance):
+    '''Return True if the metric dCurrent got worse than dBase (its baseline) by more than
+    fTolerance (a fraction of the baseline value), by more than the noise floor of its unit,
+    and beyond the spread of the runs:  every current run is worse than every baseline run.'''
+
+    fBase, fCurrent = dBase["value"], dCurrent["value"]
+    fChange = float(fCurrent - fBase) / fBase if fBase else 0.0
+    lBaseRuns, lCurrentRuns = dBase.get("runs", [fBase]), dCurrent.get("runs", [fCurrent])
+    if abs(fCurrent - fBase) <= NOISE_FLOORS.get(dCurrent["unit"], 0.0):
+        return False
+    if dCurrent["better"] == "lower":
+        return fChange > fTolerance and min(lCurrentRuns) > max(lBaseRuns)
+    return fChange < -fTolerance and max(lCurrentRuns) < min(lBaseRuns)
+
+
+def compareResults(dBaseline, dResults, fTolerance):
+    '''Print every metric of dResults next to its value in dBaseline, and return the names of
+    those that regressed (see isRegression()).'''
+
+    lRegressions = []
+    dBaseMetrics = dBaseline["metrics"]
+    print("\n%-52s %14s %14s %8s" % ("metric", "baseline", "current", "change"))
+    for sName in sorted(dResults["metrics"]):
+        if sName not in dBaseMetrics:
+            continue
+        fBase = dBaseMetrics[sName]["value"]
+        fCurrent = dResults["metrics"][sName]["value"]
+        fChange = float(fCurrent - fBase) / fBase if fBase else 0.0
+        bRegressed = isRegression(dBaseMetrics[sName], dResults["metrics"][sName], fTolerance)
+        if bRegressed:
+            lRegressions.append(sName)
+        print("%-52s %14.3f %14.3f %+7.1f%%%s" % (sName, fBase, fCurrent, 100 * fChange, "  REGRESSION" if bRegressed else ""))
+
+    lMissing = sorted(set(dBaseMetrics) - set(dResults["metrics"]))
+    if lMissing:
+        print("\n%d baseline metric(s) were not measured in this run." % len(lMissing))
+    return lRegressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the classifiers, and check the results against a baseline.")
+    parser.add_argument("--classifiers", nargs = "+", default = ["bayes.py", "bayesbest.py"], help = "classifier files (default: bayes.py bayesbest.py)")
+    parser.add_argument("--scales", nargs = "+", type = int, default = [1, 10], help = "corpus sizes, as multiples of training/ and testing/ (default: 1 10)")
+    parser.add_argument("--corpus-dir", help = "keep the synthetic corpora here, and reuse them on later runs (default: a temporary directory)")
+    parser.add_argument("--runs", type = int, default = 3, help = "runs of each classifier and scale; every metric is their median (default: 3)")
+    parser.add_argument("--workers", nargs = "+", type = int, default = [1], help = "training worker counts; the first trains the benchmarked model (default: 1)")
+    parser.add_argument("--memory-workers", type = int, default = 4, help = "scoring processes for the per-process memory measurement, 0 to skip (default: 4)")
+    parser.add_argument("--memory-vocab", type = int, default = 300000, help = "words of the made-up model the memory measurement is repeated on, 0 to skip (default: 300000)")
+    parser.add_argument("--max-docs", type = int, default = 10000, help = "most reviews timed one classify() call at a time (default: 10000)")
+    parser.add_argument("--batch-size", type = int, default = 1000, help = "reviews per classifyBatch() call (default: 1000)")
+    parser.add_argument("--output", help = "write the results to this JSON file")
+    parser.add_argument("--compare", metavar = "BASELINE", help = "flag regressions against the results in this JSON file")
+    parser.add_argument("--tolerance", type = float, default = 0.10, help = "largest change (as a fraction) not flagged as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    dResults = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                         "cpus": multiprocessing.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                         "classifiers": args.classifiers, "scales": args.scales, "runs": args.runs},
+                "metrics": {}}
+
+    sCorpusDir = args.corpus_dir or tempfile.mkdtemp()
+    try:
+        for iScale in args.scales:
+            if iScale == 1:
+                sTrainPath = os.path.abspath(trainDir) + "/"
+                sTestPath  = os.path.abspath(testDir) + "/"
+            else:
+                sTrainPath = os.path.abspath(os.path.join(sCorpusDir, "x%d" % iScale, "training")) + "/"
+                sTestPath  = os.path.abspath(os.path.join(sCorpusDir, "x%d" % iScale, "testing")) + "/"
+                fStart = time.time()
+                generateCorpus(trainDir, sTrainPath, iScale)
+                generateCorpus(testDir, sTestPath, iScale)
+                print("Synthetic x%d corpus ready in %.1f sec." % (iScale, time.time() - fStart))
+
+            for sClassifierFile in args.classifiers:
+                sPrefix = "%s/x%d/" % (os.path.splitext(os.path.basename(sClassifierFile))[0], iScale)
+                for iRun in range(args.runs):
+                    print("\n%s (%d training, %d testing reviews), run %d of %d:" % (sPrefix.rstrip("/"), len(os.listdir(sTrainPath)), len(os.listdir(sTestPath)), iRun + 1, args.runs))
+                    qResults = multiprocessing.Queue()
+                    pRun = multiprocessing.Process(target = runIsolated, args = (os.path.abspath(sClassifierFile), sTrainPath, sTestPath, iScale == 1, args, qResults))
+                    pRun.start()
+                    dMetrics = qResults.get()
+                    pRun.join()
+                    if not isinstance(dMetrics, dict):
+                        sys.exit("%s failed: %s" % (sPrefix.rstrip("/"), dMetrics))
+                    for sName, dMetric in dMetrics.items():
+                        dResults["metrics"].setdefault(sPrefix + sName, dict(dMetric, runs = []))["runs"].append(dMetric["value"])
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(sCorpusDir)
+
+    # Every Metric is the Median of its Runs
+    for dMetric in dResults["metrics"].values():
+        dMetric["value"] = statistics.median(dMetric["runs"])
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(dResults, fh, indent = 2, sort_keys = True)
+        print("\nResults written to %s." % args.output)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            dBaseline = json.load(fh)
+        if dBaseline["meta"].get("python") != dResults["meta"]["python"] or dBaseline["meta"].get("cpus") != dResults["meta"]["cpus"]:
+            print("\nNote: the baseline was measured on a different Python or machine.")
+        lRegressions = compareResults(dBaseline, dResults, args.tolerance)
+        if lRegressions:
+            print("\n%d regression(s) beyond %.0f%%: %s" % (len(lRegressions), 100 * args.tolerance, ", ".join(lRegressions)))
+            sys.exit(1)
+        print("\nNo regressions beyond %.0f%%." % (100 * args.tolerance))
@@ -0,0 +1,233 @@
+'''K-fold cross-validation of a classifier strategy (see strategies.py) on a training
+directory:  splits the labeled reviews into K folds (stratified by class), and for each fold
+makes a model of the other K - 1 folds and scores the held-out fold against the labels in the
+file names.  Reports the accuracy of each fold, their mean and variance, and the time spent
+on each fold.
+
+Nothing is retrained.  The reviews are read and tokenized once, and the features of each fold
+are counted once (see engine.Classifier.countTokenLists()); the full counts are their sum.  The
+training counts of a fold are the full counts minus the counts of the fold, and its model is
+made from them just as train() makes a model from the counts it reads (see
+engine.Classifier.modelFromCounts()).  The counts subtracted are the unweighted integer counts
+(the strategy weights them afterwards), so each fold model is exactly the model that
+retraining on the other folds would give; --verify retrains every fold to check.  The held-out
+reviews are scored from their tokens, in one vectorized pass (with NumPy).  The folds are
+spread over a pool of worker processes.
+
+    python crossvalidate.py [--strategy bayes] [--train-dir training/] [--folds 10]
+                            [--seed 510] [--workers N] [--ngrams N] [--hash-buckets N]
+                            [--output FILE] [--verify]
+'''
+
+import argparse, json, multiprocessing, os, random, shutil, sys, tempfile, time
+from nbclassify import corpus, engine, strategies
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+stats = None # Tokens and Counts of the Folds, Collected before the Pool is Started (and Handed to Each Worker)
+bc    = None # The Classifier whose Models are Made from the Counts (One per Worker Process)
+
+
+def initWorker(dClassifierArgs, dStats):
+    '''Pool initializer:  makes the classifier of a worker process from the keyword arguments
+    dClassifierArgs (see engine.Classifier), and keeps it and the statistics dStats (see
+    collectStatistics()) as the globals that evaluateFold() reads.  Handing them over this way
+    works whether the pool forks its workers or spawns them (as on macOS, and on Linux from
+    Python 3.14), which do not see the globals of the parent.'''
+
+    global bc, stats
+    bc = engine.Classifier(**dClassifierArgs)
+    bc.claimModel()
+    stats = dStats
+
+
+def assignFolds(lNames, iFolds, iSeed):
+    '''Splits the labeled review files lNames into iFolds folds:  the files of each class are
+    shuffled (by a random generator seeded with iSeed) and dealt out to the folds in turn, so
+    every fold holds about the same share of each class.  Returns the list of the folds, each
+    a sorted list of file names.'''
+
+    oRandom = random.Random(iSeed)
+    lFolds = [[] for i in range(iFolds)]
+    iNext = 0
+    for sLabel in ["positive", "negative"]:
+        lClass = sorted(sName for sName in lNames if corpus.fileLabel(sName) == sLabel)
+        oRandom.shuffle(lClass)
+        for sName in lClass:
+            lFolds[iNext % iFolds].append(sName)
+            iNext = iNext + 1
+    return [sorted(lFold) for lFold in lFolds]
+
+
+def collectStatistics(bc, sTrainDir, lFolds):
+    '''Reads and tokenizes the reviews of every fold once, and returns, as a dictionary, the
+    token lists and true labels of each fold, the counts of each fold (in the layout of the
+    shard counts of train(), see engine.Classifier.countTokenLists()), and the full counts:
+    the (word, counts) rows of all the folds, merged in sorted word order, and the sums of the
+    other entries of the fold counts (e.g. the numbers of docs).'''
+
+    lFoldTokens = []
+    lFoldLabels = []
+    lFoldCounts = []
+    for lFold in lFolds:
+        lTokenLists = [bc.tokenize(bc.loadFile(os.path.join(sTrainDir, sName)), True) for sName in lFold]
+        lLabels = [corpus.fileLabel(sName) for sName in lFold]
+        lFoldTokens.append(lTokenLists)
+        lFoldLabels.append(lLabels)
+        lFoldCounts.append(bc.countTokenLists(lTokenLists, lLabels))
+
+    oFullCounts = corpus.CountSpiller(len(lFoldCounts[0][0].columns))
+    for lCounts in lFoldCounts:
+        oFullCounts.absorb(lCounts[0])
+    lFullStatistics = [sum(lCounts[i] for lCounts in lFoldCounts) for i in range(1, len(lFoldCounts[0]))]
+
+    return {"foldTokens": lFoldTokens, "foldLabels": lFoldLabels, "foldCounts": lFoldCounts,
+            "fullRows": list(oFullCounts.iterMerged()), "fullStatistics": lFullStatistics}
+
+
+def trainingRows(iFold):
+    '''Yields the (word, counts) rows of the training counts of fold iFold:  the full counts
+    minus those of the fold, in sorted word order, leaving out the words with no count left
+    (which retraining would never see).'''
+
+    lFoldColumns = stats["foldCounts"][iFold][0].columns
+    for word, lCounts in stats["fullRows"]:
+        lLeft = [count - dFoldCounts.get(word,0) for count, dFoldCounts in zip(lCounts, lFoldColumns)]
+        if any(lLeft):
+            yield word, lLeft
+
+
+def deriveModel(bc, iFold):
+    '''Makes the model of bc for fold iFold from its training counts (see trainingRows()).'''
+
+    lStatistics = [iTotal - iCount for iTotal, iCount in zip(stats["fullStatistics"], stats["foldCounts"][iFold][1:])]
+    bc.modelFromCounts(trainingRows(iFold), lStatistics)
+
+
+def labelTokenLists(bc, lTokenLists):
+    '''Returns the classifications of the reviews with the given token lists, as
+    classifyBatch() would return them (one at a time, without NumPy).'''
+
+    if numpy is None:
+        return [bc.labelScore(*(bc.logFinalProbs(lTokens) + (len(lTokens),)))[0] for lTokens in lTokenLists]
+    return bc.labelBatch(*bc.tokenBatchLogFinalProbs(lTokenLists))
+
+
+def evaluateFold(iFold):
+    '''Makes the model of one fold and scores its held-out reviews with it.  Returns the fold,
+    the number of reviews labeled correctly, the number of reviews, and the time spent making
+    the model and scoring, as a tuple.'''
+
+    fStart = time.time()
+    deriveModel(bc, iFold)
+    fDerived = time.time()
+    lLabels = labelTokenLists(bc, stats["foldTokens"][iFold])
+    fScored = time.time()
+
+    iCorrect = sum(1 for sLabel, sTrue in zip(lLabels, stats["foldLabels"][iFold]) if sLabel == sTrue)
+    return iFold, iCorrect, len(lLabels), fDerived - fStart, fScored - fDerived
+
+
+def modelState(bc):
+    '''Returns the counts and counters of the model of bc, for comparison.'''
+
+    return (sorted(bc.positiveWords.items()), sorted(bc.negativeWords.items()),
+            bc.numPositiveDocs, bc.numNegativeDocs, bc.numPositiveWords, bc.numNegativeWords)
+
+
+def verifyFold(bc, sTrainDir, lFolds, iFold):
+    '''Retrains bc from scratch on the files of the other folds (linked into a scratch
+    directory, so the database is left alone), and returns True if it gives the same model,
+    and the same labels for the held-out fold, as deriveModel().'''
+
+    deriveModel(bc, iFold)
+    tDerived = modelState(bc)
+    lDerivedLabels = labelTokenLists(bc, stats["foldTokens"][iFold])
+
+    sTrainDirectory, sModelFile = bc.trainDirectory, bc.modelFile
+    sScratchDir = tempfile.mkdtemp(prefix = "crossvalidate-")
+    try:
+        sFoldDir = os.path.join(sScratchDir, "training")
+        for lFold in lFolds[:iFold] + lFolds[iFold + 1:]:
+            for sName in lFold:
+                sLink = os.path.join(sFoldDir, sName)
+                if not os.path.isdir(os.path.dirname(sLink)):
+                    os.makedirs(os.path.dirname(sLink))
+                os.symlink(os.path.abspath(os.path.join(sTrainDir, sName)), sLink)
+        bc.trainDirectory = sFoldDir
+        bc.modelFile = os.path.join(sScratchDir, "database")
+        bc.train()
+    finally:
+        bc.trainDirectory, bc.modelFile = sTrainDirectory, sModelFile
+        shutil.rmtree(sScratchDir)
+
+    return modelState(bc) == tDerived and labelTokenLists(bc, stats["foldTokens"][iFold]) == lDerivedLabels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Cross-validate a classifier on a training directory, deriving each fold's model by count subtraction.")
+    parser.add_argument("--strategy", choices = strategies.strategyNames(), default = "bayes", help = "scoring strategy of the classifier (default: bayes)")
+    parser.add_argument("--train-dir", default = "training/", help = "directory of labeled reviews (default: training/)")
+    parser.add_argument("--folds", type = int, default = 10, help = "number of folds (default: 10)")
+    parser.add_argument("--seed", type = int, default = 510, help = "seed of the shuffle that assigns the folds (default: 510)")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(), help = "worker processes (default: one per CPU)")
+    parser.add_argument("--ngrams", type = int, default = 1, help = "longest n-gram of the features (default: 1)")
+    parser.add_argument("--hash-buckets", type = int, default = 0, help = "hash the features into this many buckets (default: 0, no hashing)")
+    parser.add_argument("--output", metavar = "FILE", help = "write the results of every fold to FILE, as JSON")
+    parser.add_argument("--verify", action = "store_true", help = "retrain every fold from scratch, and check that it gives the same model and labels")
+    args = parser.parse_args()
+
+    lNames = corpus.listDocuments(args.train_dir)
+    if lNames is None:
+        sys.exit("crossvalidate.py needs a training directory, not %s" % args.train_dir)
+    lNames = [sName for sName in lNames if corpus.fileLabel(sName) is not None]
+    if not 2 <= args.folds <= len(lNames):
+        sys.exit("need between 2 and %d folds" % len(lNames))
+
+    # Nothing is Loaded or Trained:  Every Model is Made from Counts
+    dClassifierArgs = {"trainDirectory": args.train_dir, "ngrams": args.ngrams, "hashBuckets": args.hash_buckets, "strategy": args.strategy}
+    bc = engine.Classifier(**dClassifierArgs)
+    bc.claimModel()
+
+    fStart = time.time()
+    lFolds = assignFolds(lNames, args.folds, args.seed)
+    stats = collectStatistics(bc, args.train_dir, lFolds)
+    fCollected = time.time()
+
+    pool = multiprocessing.Pool(max(1, min(args.workers, args.folds)), initWorker, (dClassifierArgs, stats))
+    try:
+        lResults = sorted(pool.imap_unordered(evaluateFold, range(args.folds)))
+    finally:
+        pool.close()
+        pool.join()
+    fEvaluated = time.time()
+
+    # Accuracy of Each Fold, and their Mean and (Sample) Variance
+    lAccuracies = [iCorrect / float(iDocs) for iFold, iCorrect, iDocs, fDerive, fScore in lResults]
+    fMean = sum(lAccuracies) / len(lAccuracies)
+    fVariance = sum((fAccuracy - fMean) ** 2 for fAccuracy in lAccuracies) / (len(lAccuracies) - 1)
+
+    print("Tokenized and counted %d reviews once in %.2f sec." % (len(lNames), fCollected - fStart))
+    print("Evaluated %d folds in %.2f sec on %d worker(s)." % (args.folds, fEvaluated - fCollected, max(1, min(args.workers, args.folds))))
+    print("\n%4s  %7s  %8s  %10s  %10s" % ("fold", "reviews", "accuracy", "derive ms", "score ms"))
+    for (iFold, iCorrect, iDocs, fDerive, fScore), fAccuracy in zip(lResults, lAccuracies):
+        print("%4d  %7d  %8.4f  %10.1f  %10.1f" % (iFold, iDocs, fAccuracy, 1000 * fDerive, 1000 * fScore))
+    print("\nMean accuracy %.4f, variance %.6f (standard deviation %.4f)." % (fMean, fVariance, fVariance ** 0.5))
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"strategy": args.strategy, "folds": args.folds, "seed": args.seed,
+                       "mean_accuracy": fMean, "variance": fVariance, "collect_seconds": fCollected - fStart,
+                       "results": [{"fold": iFold, "reviews": iDocs, "correct": iCorrect, "accuracy": fAccuracy,
+                                    "derive_seconds": fDerive, "score_seconds": fScore}
+                                   for (iFold, iCorrect, iDocs, fDerive, fScore), fAccuracy in zip(lResults, lAccuracies)]}, fh, indent = 2)
+
+    if args.verify:
+        fStart = time.time()
+        lMismatches = [iFold for iFold in range(args.folds) if not verifyFold(bc, args.train_dir, lFolds, iFold)]
+        if lMismatches:
+            sys.exit("Retraining gives a different model for fold(s) %s." % ", ".join(str(iFold) for iFold in lMismatches))
+        print("\nRetraining every fold from scratch (%.2f sec) gives the same models and labels." % (time.time() - fStart))
@@ -1,26 +1,27 @@
-testFile = "bayes.py"
+import os
+from nbclassify import engine
+
+strategy = "bayes"
 trainDir = "training/"
 testDir  = "testing/"
 
-execfile(testFile)
-bc = Bayes_Classifier(trainDir)
+bc = engine.Classifier(trainDir, strategy = strategy)
 
 iFileList = []
 
 for fFileObj in os.walk(testDir + "/"):
 	iFileList = fFileObj[2]
 	break
-print '%d test reviews.' % len(iFileList)
+print('%d test reviews.' % len(iFileList))
 
 results = {"negative":0, "neutral":0, "positive":0}
 
-print "\nFile Classifications:"
-for filename in iFileList:
-	fileText = bc.loadFile(testDir + filename)
-	result = bc.classify(fileText)
-	print "%s: %s" % (filename, result)
+print("\nFile Classifications:")
+fileTexts = [bc.loadFile(testDir + filename) for filename in iFileList]
+for filename, result in zip(iFileList, bc.classifyBatch(fileTexts)):
+	print("%s: %s" % (filename, result))
 	results[result] += 1
 
-print "\nResults Summary:"
+print("\nResults Summary:")
 for r in results:
-	print "%s: %d" % (r, results[r])
+	print("%s: %d" % (r, results[r]))
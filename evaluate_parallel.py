@@ -0,0 +1,229 @@
+'''Parallel, streaming evaluation runner:  classifies every review under a test directory on
+a pool of worker processes, one chunk of files at a time, and scores the results against the
+labels in the file names (movies-5-* are positive, movies-1-* negative, any other rating
+neutral).  Reports the accuracy, the precision / recall / F1 of each class, the confusion
+matrix, and the time spent in each stage (reading the files, tokenizing and scoring).
+
+Only a few chunks per worker are in flight at a time, and the workers send back labels rather
+than texts, so memory use does not grow with the number of test files.  The labels are those
+of the serial loop in evaluate.py (--verify checks every one against classify()).
+
+    python evaluate_parallel.py [--strategy bayes] [--test-dir testing/] [--workers N]
+                                [--chunk-size 500] [--labels FILE] [--verify] [--metrics FILE]
+'''
+
+import argparse, collections, multiprocessing, os, sys, time
+from nbclassify import corpus, engine, instrument, strategies
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CLASSES = ["negative", "neutral", "positive"]
+
+bc = None # The Classifier of this Process (Each Worker Makes its Own, see initWorker())
+
+
+def trueClass(sFilename):
+    '''Returns the true class of a review from its file name (see corpus.fileLabel()), with
+    "neutral" for a rating that is neither positive nor negative, or None if the name holds
+    no rating.'''
+
+    if corpus.fileRating(sFilename) is None:
+        return None
+    return corpus.fileLabel(sFilename) or "neutral"
+
+
+def iterChunks(sTestDir, iChunkSize):
+    '''Yields the paths of the files under sTestDir (walked recursively, in sorted order), in
+    lists of up to iChunkSize paths.'''
+
+    lChunk = []
+    for sDirectory, lSubdirectories, lFilenames in os.walk(sTestDir):
+        lSubdirectories.sort()
+        for sFilename in sorted(lFilenames):
+            lChunk.append(os.path.join(sDirectory, sFilename))
+            if len(lChunk) == iChunkSize:
+                yield lChunk
+                lChunk = []
+    if lChunk:
+        yield lChunk
+
+
+def classifyChunk(tArgs):
+    '''Reads, tokenizes and scores one chunk of files with the classifier bc of the worker
+    (see initWorker()).  tArgs is a tuple of the list of paths and the verify flag.  Returns
+    the list of labels, the (read, tokenize, score) times, the number of labels that differ
+    from classify() (counted only when verifying), and a snapshot of the classifier's metrics
+    for the chunk (None if they are not enabled, see initWorker()).'''
+
+    lPaths, bVerify = tArgs
+
+    fStart = time.time()
+    lTexts = [bc.loadFile(sPath) for sPath in lPaths]
+    fRead = time.time()
+
+    if numpy is None:
+        # Without NumPy, classifyBatch() Tokenizes and Scores in One Step
+        fTokenized = fRead
+        lLabels = bc.classifyBatch(lTexts)
+    else:
+        lTokenLists = [bc.tokenize(sText, True) for sText in lTexts]
+        fTokenized = time.time()
+        aPositive, aNegative, aLengths = bc.tokenBatchLogFinalProbs(lTokenLists)
+        lLabels = bc.labelBatch(aPositive, aNegative, aLengths)
+    fScored = time.time()
+
+    iMismatches = 0
+    if bVerify:
+        iMismatches = sum(1 for sText, sLabel in zip(lTexts, lLabels) if bc.classify(sText) != sLabel)
+
+    dMetrics = None
+    if bc.metrics is not None:
+        dMetrics = bc.metrics.snapshot()
+        bc.metrics.reset()
+
+    return lLabels, (fRead - fStart, fTokenized - fRead, fScored - fTokenized), iMismatches, dMetrics
+
+
+def initWorker(dClassifierArgs):
+    '''Pool initializer:  makes the classifier bc of a worker process from the keyword
+    arguments dClassifierArgs (see engine.Classifier), which loads the model the parent saved,
+    and builds its lookup tables before the first chunk.  Its metrics are then cleared, so
+    that each chunk hands back only its own, and the parent adds them up.  Making the
+    classifier here, rather than inheriting the parent's, works whether the pool forks its
+    workers or spawns them (as on macOS, and on Linux from Python 3.14).'''
+
+    global bc
+    bc = engine.Classifier(**dClassifierArgs)
+    bc.classifyBatch([""])
+    if bc.metrics is not None:
+        bc.metrics.reset()
+
+
+def classifyAll(dClassifierArgs, sTestDir, iWorkers, iChunkSize, bVerify, fhLabels = None):
+    '''Classifies every file under sTestDir on a pool of iWorkers processes, each with a
+    classifier made from dClassifierArgs (see initWorker()), keeping at most two chunks per
+    worker in flight, and returns the confusion counts (a Counter of (true, predicted) pairs,
+    with None as the true class of unlabeled files), the summed stage times, and the number of
+    mismatches.  The labels are written to fhLabels, in file order, if given.'''
+
+    dConfusion = collections.Counter()
+    lStageTimes = [0.0, 0.0, 0.0]
+    iMismatches = 0
+
+    pool = multiprocessing.Pool(iWorkers, initWorker, (dClassifierArgs,))
+    qPending = collections.deque()
+    try:
+        def collect():
+            lPaths, oResult = qPending.popleft()
+            lLabels, tTimes, iChunkMismatches, dMetrics = oResult.get()
+            if dMetrics is not None:
+                bc.metrics.absorb(dMetrics)
+            for sPath, sLabel in zip(lPaths, lLabels):
+                dConfusion[(trueClass(sPath), sLabel)] += 1
+                if fhLabels is not None:
+                    fhLabels.write("%s: %s\n" % (sPath, sLabel))
+            for i in range(3):
+                lStageTimes[i] += tTimes[i]
+            return iChunkMismatches
+
+        for lPaths in iterChunks(sTestDir, iChunkSize):
+            qPending.append((lPaths, pool.apply_async(classifyChunk, ((lPaths, bVerify),))))
+            if len(qPending) >= 2 * iWorkers:
+                iMismatches += collect()
+        while qPending:
+            iMismatches += collect()
+    finally:
+        pool.close()
+        pool.join()
+
+    return dConfusion, lStageTimes, iMismatches
+
+
+def classMetrics(dConfusion, sClass):
+    '''Returns the precision, recall, F1 and support of one class, from the confusion counts.'''
+
+    iTruePositives = dConfusion[(sClass, sClass)]
+    iPredicted = sum(iCount for (sTrue, sPredicted), iCount in dConfusion.items() if sTrue is not None and sPredicted == sClass)
+    iSupport = sum(iCount for (sTrue, sPredicted), iCount in dConfusion.items() if sTrue == sClass)
+    fPrecision = iTruePositives / float(iPredicted) if iPredicted else 0.0
+    fRecall = iTruePositives / float(iSupport) if iSupport else 0.0
+    fF1 = 2 * fPrecision * fRecall / (fPrecision + fRecall) if fPrecision + fRecall else 0.0
+    return fPrecision, fRecall, fF1, iSupport
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Classify a test directory in parallel, and score the results against the labels in the file names.")
+    parser.add_argument("--strategy", choices = strategies.strategyNames(), default = "bayes", help = "scoring strategy of the classifier (default: bayes)")
+    parser.add_argument("--train-dir", default = "training/", help = "training directory, used if there is no saved model yet (default: training/)")
+    parser.add_argument("--test-dir", default = "testing/", help = "directory of reviews to classify, walked recursively (default: testing/)")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(), help = "worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type = int, default = 500, help = "files per chunk (default: 500)")
+    parser.add_argument("--model", default = None, help = "saved model file (default: the model file of the strategy, e.g. database)")
+    parser.add_argument("--mapped", action = "store_true", help = "memory-map the saved model read-only, shared between processes (slower, especially one review at a time; saves memory only for very large vocabularies)")
+    parser.add_argument("--labels", metavar = "FILE", help = "write each file's label to FILE ('-' for stdout), in the format of evaluate.py")
+    parser.add_argument("--verify", action = "store_true", help = "also classify each file with classify(), and check that the labels agree")
+    parser.add_argument("--metrics", metavar = "FILE", help = "write the counters and stage timings of the classifier (summed over workers) to FILE (Prometheus text if it ends in .prom, JSON otherwise)")
+    args = parser.parse_args()
+
+    # Load the Classifier (Training and Saving a Model First, if there is None, so that the Workers
+    # Only Load it), whose Metrics Add Up those of the Workers
+    dClassifierArgs = {"trainDirectory": args.train_dir, "workers": 1, "mapped": args.mapped, "modelFile": args.model,
+                       "metrics": bool(args.metrics), "strategy": args.strategy}
+    bc = engine.Classifier(**dClassifierArgs)
+    bc.classifyBatch([""])
+
+    fhLabels = None
+    if args.labels == "-":
+        fhLabels = sys.stdout
+    elif args.labels:
+        fhLabels = open(args.labels, "w")
+
+    fStart = time.time()
+    dConfusion, lStageTimes, iMismatches = classifyAll(dClassifierArgs, args.test_dir, max(1, args.workers), args.chunk_size, args.verify, fhLabels)
+    fElapsed = time.time() - fStart
+    if fhLabels is not None and fhLabels is not sys.stdout:
+        fhLabels.close()
+    if args.metrics:
+        instrument.writeMetrics(args.metrics, bc)
+
+    iTotal = sum(dConfusion.values())
+    iUnlabeled = sum(iCount for (sTrue, sPredicted), iCount in dConfusion.items() if sTrue is None)
+    iLabeled = iTotal - iUnlabeled
+    print("%d test reviews in %.2f sec (%.0f reviews/sec) on %d worker(s)." % (iTotal, fElapsed, iTotal / max(fElapsed, 1e-9), args.workers))
+
+    print("\nResults Summary:")
+    for sClass in CLASSES:
+        print("%s: %d" % (sClass, sum(iCount for (sTrue, sPredicted), iCount in dConfusion.items() if sPredicted == sClass)))
+
+    print("\nStage Times (Summed over Workers):")
+    for sStage, fTime in zip(["read", "tokenize", "score"], lStageTimes):
+        print("%-9s %8.3f sec  (%5.1f%%)" % (sStage + ":", fTime, 100 * fTime / max(sum(lStageTimes), 1e-9)))
+    if numpy is None:
+        print("(without NumPy, tokenizing is counted under score)")
+
+    if iLabeled:
+        lTrueClasses = [sClass for sClass in CLASSES if any(sTrue == sClass for (sTrue, sPredicted) in dConfusion)]
+        print("\nConfusion Matrix (Rows: True Class, Columns: Predicted Class):")
+        print("%-10s" % "" + "".join("%10s" % sClass for sClass in CLASSES))
+        for sTrue in lTrueClasses:
+            print("%-10s" % sTrue + "".join("%10d" % dConfusion[(sTrue, sPredicted)] for sPredicted in CLASSES))
+
+        print("\n%-10s %10s %10s %10s %10s" % ("", "precision", "recall", "F1", "support"))
+        lF1 = []
+        for sClass in lTrueClasses:
+            fPrecision, fRecall, fF1, iSupport = classMetrics(dConfusion, sClass)
+            lF1.append(fF1)
+            print("%-10s %10.3f %10.3f %10.3f %10d" % (sClass, fPrecision, fRecall, fF1, iSupport))
+        iCorrect = sum(dConfusion[(sClass, sClass)] for sClass in CLASSES)
+        print("\naccuracy:  %.3f  (%d of %d)" % (iCorrect / float(iLabeled), iCorrect, iLabeled))
+        print("macro F1:  %.3f" % (sum(lF1) / len(lF1)))
+    if iUnlabeled:
+        print("\n%d file(s) had no rating in their name, and were not scored." % iUnlabeled)
+
+    if args.verify:
+        if iMismatches:
+            sys.exit("%d label(s) differ from classify()." % iMismatches)
+        print("\nAll labels match classify().")
@@ -0,0 +1,91 @@
+'''Load generator for server.py:  replays the reviews in testing/ against a running server,
+over several concurrent, pipelined connections, and reports the request rate and the
+p50 / p99 latencies.
+
+    python loadgen.py (--unix PATH | --tcp HOST:PORT) [--connections 4] [--requests 20000]
+'''
+
+import argparse, json, os, socket, threading, time
+from nbclassify import corpus
+
+
+def percentile(lSorted, fPercent):
+    '''Returns the fPercent-th percentile of an already sorted list (nearest rank).'''
+
+    if not lSorted:
+        return 0.0
+    return lSorted[min(len(lSorted) - 1, int(len(lSorted) * fPercent / 100.0))]
+
+
+def runConnection(sAddress, lLines, iRequests, iWindow, lLatencies):
+    '''Sends iRequests requests (cycling through lLines) over one connection, keeping up to
+    iWindow of them in flight, and appends the latency of each to lLatencies.'''
+
+    if ":" in sAddress and not os.path.exists(sAddress):
+        sHost, sPort = sAddress.rsplit(":", 1)
+        sock = socket.create_connection((sHost, int(sPort)))
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(sAddress)
+    fOut = sock.makefile("wb")
+    fIn  = sock.makefile("rb")
+
+    lSent = []
+    semWindow = threading.Semaphore(iWindow)
+
+    def sendRequests():
+        for i in range(iRequests):
+            semWindow.acquire()
+            lSent.append(time.time())
+            fOut.write(lLines[i % len(lLines)])
+            fOut.flush()
+
+    tSender = threading.Thread(target = sendRequests)
+    tSender.daemon = True
+    tSender.start()
+
+    lConnectionLatencies = []
+    for i in range(iRequests):
+        fIn.readline()
+        lConnectionLatencies.append(time.time() - lSent[i])
+        semWindow.release()
+
+    tSender.join()
+    sock.close()
+    lLatencies.extend(lConnectionLatencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Measure the latency and throughput of server.py.")
+    parser.add_argument("--unix", metavar = "PATH", help = "server's Unix socket")
+    parser.add_argument("--tcp", metavar = "HOST:PORT", help = "server's TCP socket")
+    parser.add_argument("--test-dir", default = "testing/", help = "directory of reviews to send (default: testing/)")
+    parser.add_argument("--connections", type = int, default = 4, help = "concurrent connections (default: 4)")
+    parser.add_argument("--requests", type = int, default = 20000, help = "total requests (default: 20000)")
+    parser.add_argument("--window", type = int, default = 64, help = "requests in flight per connection (default: 64)")
+    args = parser.parse_args()
+    if not (args.unix or args.tcp):
+        parser.error("one of --unix or --tcp is required")
+
+    lLines = []
+    for sFilename in sorted(os.listdir(args.test_dir)):
+        sText = corpus.readText(os.path.join(args.test_dir, sFilename))
+        lLines.append((json.dumps({"id": sFilename, "text": sText}) + "\n").encode("utf-8"))
+
+    lLatencies = []
+    iPerConnection = args.requests // args.connections
+    lThreads = [threading.Thread(target = runConnection, args = (args.unix or args.tcp, lLines, iPerConnection, args.window, lLatencies))
+                for i in range(args.connections)]
+
+    fStart = time.time()
+    for tConnection in lThreads:
+        tConnection.start()
+    for tConnection in lThreads:
+        tConnection.join()
+    fElapsed = time.time() - fStart
+
+    lLatencies.sort()
+    print("%d requests over %d connections in %.2f sec" % (len(lLatencies), args.connections, fElapsed))
+    print("throughput: %10.1f requests/sec" % (len(lLatencies) / fElapsed))
+    print("latency p50: %8.2f ms" % (1000 * percentile(lLatencies, 50)))
+    print("latency p99: %8.2f ms" % (1000 * percentile(lLatencies, 99)))
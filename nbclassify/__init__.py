@@ -0,0 +1,18 @@
+'''Naive Bayes sentiment classifiers for movie reviews.  The modules of the package:
+
+    engine      the classifier engine (tokenizer, counting, model tables and scorers)
+    strategies  the scoring strategies of the engine, "bayes" and "bayesbest"
+    bayes       Bayes_Classifier, the engine with the "bayes" strategy
+    bayesbest   Bayes_Classifier, the engine with the "bayesbest" strategy
+    ratings     Rating_Classifier, a K-class model of the star rating of a review
+    corpus      streaming access to training corpora, and spilled counts
+    features    n-gram and hashed features
+    vocabulary  the compact count table of a model
+    modelfile   the binary model file formats
+    lrucache    the result caches of the classifier
+    instrument  metrics and profilers
+    cli         the "nbclassify" command
+
+The modules are imported one by one (e.g. "from nbclassify import engine"), so that a script
+only pays for what it uses.
+'''
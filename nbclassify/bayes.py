@@ -0,0 +1,16 @@
+'''The plain Naive Bayes classifier:  the classifier engine (see engine.py) with the "bayes"
+strategy, under the name the scripts have always used.'''
+
+from . import engine
+
+
+class Bayes_Classifier(engine.Classifier):
+    '''Implements a Naive Bayes classifer designed to classify movie reviews as
+    either positive or negative, based on the words within the review.  In that
+    regard, this can be viewed as a "Sentiment Analysis".  This classifier can
+    train on a training set, or load a pre-computed database (derived from a
+    previous training session, and saved in the binary format of modelfile.py).
+    Every feature counts once, and a review must favor a class by a margin of 0.2
+    (see strategies.Strategy).'''
+
+    defaultStrategy = "bayes"
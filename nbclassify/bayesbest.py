@@ -0,0 +1,66 @@
+'''The improved Naive Bayes classifier:  the classifier engine (see engine.py) with the
+"bayesbest" strategy, whose tuning knobs are properties of the classifier.'''
+
+from . import engine
+
+
+class Bayes_Classifier(engine.Classifier):
+    '''Implements an improved Naive Bayes classifer designed to classify movie
+    reviews as either positive or negative, based on the words within the review.
+    This class is adapted upon bayes.py, byt modifying the neutrality bias, and
+    adding extra checks for punctuation and review length (see
+    strategies.BestStrategy).  Its model is saved apart from that of bayes.py
+    (in database.bayesbest, by default), since its counts are scaled.'''
+
+    defaultStrategy = "bayesbest"
+
+    @property
+    def neutralityBias(self):
+        '''Getter for the neutralityBias property'''
+        return self.strategy.neutralityBias
+
+    @property
+    def punctuationWeight(self):
+        '''Getter for the punctuationWeight property'''
+        return self.strategy.punctuationWeight
+
+    @property
+    def shortReviewWeight(self):
+        '''Getter for the shortReviewWeight property'''
+        return self.strategy.shortReviewWeight
+
+    @property
+    def shortReviewLength(self):
+        '''Getter for the shortReviewLength property'''
+        return self.strategy.shortReviewLength
+
+    @property
+    def reviewLengthWeight(self):
+        '''Getter for the reviewLengthWeight property'''
+        return self.strategy.reviewLengthWeight
+
+    @neutralityBias.setter
+    def neutralityBias(self, value):
+        '''Setter for the neutralityBias property'''
+        self.strategy.neutralityBias = value
+
+    @punctuationWeight.setter
+    def punctuationWeight(self, value):
+        '''Setter for the punctuationWeight property'''
+        self.strategy.punctuationWeight = value
+
+    @shortReviewWeight.setter
+    def shortReviewWeight(self, value):
+        '''Setter for the shortReviewWeight property'''
+        self.strategy.shortReviewWeight = value
+
+    @shortReviewLength.setter
+    def shortReviewLength(self, value):
+        '''Setter for the shortReviewLength property'''
+        self.strategy.shortReviewLength = value
+
+    @reviewLengthWeight.setter
+    def reviewLengthWeight(self, value):
+        '''Setter for the reviewLengthWeight property'''
+        self.strategy.reviewLengthWeight = value
+
@@ -0,0 +1,142 @@
+'''Command-line entry point of the classifiers, installed as the "nbclassify" command (see
+pyproject.toml), with a subcommand for each of the everyday tasks of the scripts:
+
+    nbclassify train SOURCE [--strategy bayes] [--model database] [--workers N] ...
+    nbclassify classify FILE... [--strategy bayes] [--model database]
+    nbclassify evaluate [--test-dir testing/] [--strategy bayes] [--model database]
+    nbclassify update positive|negative FILE... [--remove]
+    nbclassify migrate DATABASE [OUTPUT]
+
+The classifier is the engine (see engine.py) with the scoring strategy named by --strategy
+(--classifier, as before), bayes (the first phase) or bayesbest (the second), looked up in
+the registry of strategies.py.  Each strategy keeps its own model file by default.
+'''
+
+import argparse, os, sys
+from . import corpus, engine, instrument, modelfile, strategies
+
+CLASSES     = ["positive", "negative", "neutral"]
+
+
+def makeClassifier(args, sTrainSource, **dOptions):
+    '''Returns a classifier with the strategy named by args.strategy, saving its model to
+    args.model (or to the model file of the strategy), with the given options.'''
+
+    return engine.Classifier(sTrainSource, modelFile = args.model, metrics = bool(args.metrics), strategy = args.strategy, **dOptions)
+
+
+def writeMetrics(args, bc):
+    '''Writes the metrics of bc to the file named by args.metrics, if any.'''
+
+    if args.metrics:
+        instrument.writeMetrics(args.metrics, bc)
+
+
+def train(args):
+    '''Trains a classifier from scratch on args.source, and saves it to args.model.'''
+
+    bc = makeClassifier(args, args.source, workers = args.workers, spillWords = args.spill_words,
+                        ngrams = args.ngrams, hashBuckets = args.hash_buckets)
+    bc.train(args.workers)
+    writeMetrics(args, bc)
+    print("Trained on %d positive and %d negative reviews (%d distinct features)." % (bc.numPositiveDocs, bc.numNegativeDocs, len(set(bc.positiveWords) | set(bc.negativeWords))))
+
+
+def classify(args):
+    '''Classifies the given review files ("-" for a review read from stdin), one line each.'''
+
+    bc = makeClassifier(args, args.train_dir)
+    lTexts = [sys.stdin.read() if sFilename == "-" else bc.loadFile(sFilename) for sFilename in args.files]
+    for sFilename, (sLabel, fScore) in zip(args.files, bc.classifyBatch(lTexts, True)):
+        print("%s: %s (%.4f)" % (sFilename, sLabel, fScore))
+    writeMetrics(args, bc)
+
+
+def evaluate(args):
+    '''Classifies the reviews of args.test_dir, and reports how many fall in each class and
+    the accuracy against the labels in the file names.'''
+
+    bc = makeClassifier(args, args.train_dir)
+    lNames = corpus.listDocuments(args.test_dir)
+    if lNames is None:
+        sys.exit("evaluate needs a test directory, not %s" % args.test_dir)
+    lLabels = bc.classifyBatch([bc.loadFile(os.path.join(args.test_dir, sName)) for sName in lNames])
+    writeMetrics(args, bc)
+
+    print("%d test reviews." % len(lNames))
+    print("\nResults Summary:")
+    for sClass in CLASSES:
+        print("%s: %d" % (sClass, sum(1 for sLabel in lLabels if sLabel == sClass)))
+    lTrue = [corpus.fileLabel(sName) for sName in lNames]
+    iLabeled = sum(1 for sTrue in lTrue if sTrue is not None)
+    if iLabeled:
+        iCorrect = sum(1 for sLabel, sTrue in zip(lLabels, lTrue) if sLabel == sTrue)
+        print("\nAccuracy: %.4f (%d of %d labeled reviews)" % (iCorrect / iLabeled, iCorrect, iLabeled))
+
+
+def update(args):
+    '''Adds labeled review files to the saved model (or, with --remove, backs them out).'''
+
+    bc = makeClassifier(args, args.train_dir)
+    if args.remove:
+        bc.remove(args.files, [args.label] * len(args.files), bFiles = True)
+    else:
+        bc.update(args.files, [args.label] * len(args.files), bFiles = True)
+    writeMetrics(args, bc)
+    print("%s %d %s review(s)." % ("Removed" if args.remove else "Added", len(args.files), args.label))
+    print("The model now holds %d positive and %d negative reviews." % (bc.numPositiveDocs, bc.numNegativeDocs))
+
+
+def migrate(args):
+    '''Converts a pickle database of an earlier version to the binary model format.'''
+
+    modelfile.migrate(args.database, args.output)
+
+
+def main(lArgs = None):
+    parser = argparse.ArgumentParser(prog = "nbclassify", description = "Train, run and maintain the Naive Bayes review classifiers.")
+    subparsers = parser.add_subparsers(dest = "command", metavar = "COMMAND")
+    subparsers.required = True
+
+    # Options Shared by the Commands that Use a Classifier
+    common = argparse.ArgumentParser(add_help = False)
+    common.add_argument("--strategy", "--classifier", choices = strategies.strategyNames(), default = "bayes", help = "scoring strategy of the classifier (default: bayes)")
+    common.add_argument("--model", default = None, help = "model file (default: the model file of the strategy, e.g. database)")
+    common.add_argument("--metrics", metavar = "FILE", help = "write the counters and stage timings to FILE (Prometheus text if it ends in .prom, JSON otherwise)")
+
+    parserTrain = subparsers.add_parser("train", parents = [common], help = "train a classifier from scratch, and save it")
+    parserTrain.add_argument("source", help = "training directory, archive (.tar, .tar.gz, .zip) or JSONL file (.jsonl, .jsonl.gz) of {\"label\", \"text\"} records")
+    parserTrain.add_argument("--workers", type = int, default = 1, help = "worker processes counting the files of a directory (default: 1)")
+    parserTrain.add_argument("--spill-words", type = int, default = 0, help = "spill the partial counts to disk whenever they hold more than this many words (default: 0, never)")
+    parserTrain.add_argument("--ngrams", type = int, default = 1, help = "longest n-gram of the features (default: 1)")
+    parserTrain.add_argument("--hash-buckets", type = int, default = 0, help = "hash the features into this many buckets (default: 0, no hashing)")
+    parserTrain.set_defaults(run = train)
+
+    parserClassify = subparsers.add_parser("classify", parents = [common], help = "classify review files")
+    parserClassify.add_argument("files", nargs = "+", help = "review files ('-' for stdin)")
+    parserClassify.add_argument("--train-dir", default = "training/", help = "training directory, used if there is no saved model yet (default: training/)")
+    parserClassify.set_defaults(run = classify)
+
+    parserEvaluate = subparsers.add_parser("evaluate", parents = [common], help = "classify a test directory, and report the accuracy")
+    parserEvaluate.add_argument("--test-dir", default = "testing/", help = "directory of reviews to classify (default: testing/)")
+    parserEvaluate.add_argument("--train-dir", default = "training/", help = "training directory, used if there is no saved model yet (default: training/)")
+    parserEvaluate.set_defaults(run = evaluate)
+
+    parserUpdate = subparsers.add_parser("update", parents = [common], help = "add labeled reviews to the saved model (or back them out)")
+    parserUpdate.add_argument("label", choices = ["positive", "negative"], help = "the class of the reviews")
+    parserUpdate.add_argument("files", nargs = "+", help = "review files to add (or remove)")
+    parserUpdate.add_argument("--remove", action = "store_true", help = "remove the reviews from the model, instead of adding them")
+    parserUpdate.add_argument("--train-dir", default = "training/", help = "training directory, used if there is no saved model yet (default: training/)")
+    parserUpdate.set_defaults(run = update)
+
+    parserMigrate = subparsers.add_parser("migrate", help = "convert a pickle database of an earlier version to the binary model format")
+    parserMigrate.add_argument("database", help = "pickle database to convert")
+    parserMigrate.add_argument("output", nargs = "?", help = "model file to write (default: DATABASE itself)")
+    parserMigrate.set_defaults(run = migrate)
+
+    args = parser.parse_args(lArgs)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
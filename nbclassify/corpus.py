@@ -0,0 +1,323 @@
+'''Streaming access to training corpora for Bayes_Classifier.train():  reads labeled reviews
+from a directory tree of review files, a tar or zip archive of them, a gzipped review file, or
+a JSONL file of labeled records, a fixed-size chunk at a time; and counts their words within a
+memory budget, spilling the partial counts to sorted run files on disk and merging them at the
+end (see CountSpiller).
+
+Review files are labeled by their names, as in the training directory (movies-5-* positive,
+movies-1-* negative, others ignored).  A JSONL record is a {"label": ..., "text": ...} object
+or a [label, text] pair, whose label is "positive" / "negative" or a rating (5 or 1); other
+records are ignored.  Files named *.jsonl (or *.jsonl.gz) are read as records, wherever they
+are found.  With bRatings set (as for the K-class model of ratings.py), the reviews are
+labeled by their ratings instead, whatever they are (see fileRating()).
+
+Reviews are decoded from UTF-8 as they are read (see decodeChunks()); bytes that are not valid
+UTF-8 are decoded as U+FFFD, the replacement character, rather than failing the whole corpus.
+loadFile() of the classifiers reads a review the same way.'''
+
+import codecs, gzip, hashlib, heapq, json, os, stat, tarfile, tempfile, unicodedata, zipfile
+
+CHUNK_SIZE = 65536 # Bytes Read at a Time
+MAX_RUNS   = 64    # Run Files Merged at Once (More are Merged into One Run First)
+
+ENCODING        = "utf-8"   # Encoding of the Reviews
+ENCODING_ERRORS = "replace" # Undecodable Bytes are Read as U+FFFD
+
+FILE_LABELS   = {"5": "positive", "1": "negative"}
+RECORD_LABELS = {"positive": "positive", "5": "positive", "negative": "negative", "1": "negative"}
+
+
+def fileLabel(sName):
+    '''Returns the class of a review file from its name (movies-<rating>-<id>.txt):
+    "positive" for a rating of 5, "negative" for 1, and None otherwise.'''
+
+    lFields = os.path.basename(sName).split("-")
+    if len(lFields) < 2:
+        return None
+    return FILE_LABELS.get(lFields[1])
+
+
+def fileRating(sName):
+    '''Returns the rating of a review file from its name (movies-<rating>-<id>.txt), as an
+    integer, or None if the name holds no rating.'''
+
+    lFields = os.path.basename(sName).split("-")
+    if len(lFields) < 3 or not lFields[1].isdigit():
+        return None
+    return int(lFields[1])
+
+
+def recordLabel(label):
+    '''Returns the class of a JSONL record label ("positive", "negative", or a rating), or
+    None if it is neither positive nor negative.'''
+
+    return RECORD_LABELS.get(str(label).strip().lower())
+
+
+def recordRating(label):
+    '''Returns the rating of a JSONL record label (a rating, or "positive" / "negative",
+    read as 5 / 1), as an integer, or None if it is neither.'''
+
+    sLabel = str(label).strip().lower()
+    if sLabel.isdigit():
+        return int(sLabel)
+    return {"positive": 5, "negative": 1}.get(sLabel)
+
+
+def listDocuments(sSource):
+    '''Returns the paths (relative to sSource) of the files under the directory sSource,
+    walked recursively, in sorted order; or None if sSource is not a directory (archives and
+    record files are read as one stream).'''
+
+    if not os.path.isdir(sSource):
+        return None
+    lNames = []
+    for sDirectory, lSubdirectories, lFilenames in os.walk(sSource):
+        lSubdirectories.sort()
+        sRelative = os.path.relpath(sDirectory, sSource)
+        for sFilename in sorted(lFilenames):
+            lNames.append(sFilename if sRelative == os.curdir else os.path.join(sRelative, sFilename))
+    return lNames
+
+
+def fingerprint(sSource):
+    '''Returns a fingerprint of the training source sSource (a hex digest of the name, size
+    and modification time of each of its files, or of the archive or record file itself), so
+    that a model can tell whether it was trained on the current source; or None if sSource
+    does not exist.  Each file is stat()ed once (os.walk() would stat it a second time), as
+    this runs whenever a saved model is opened.'''
+
+    if os.path.isdir(sSource):
+        lPending = [""]
+    elif os.path.isfile(sSource):
+        sSource, lPending = os.path.dirname(sSource), [os.path.basename(sSource)]
+    else:
+        return None
+
+    oDigest = hashlib.sha1()
+    while lPending:
+        sName = lPending.pop()
+        oStat = os.stat(os.path.join(sSource, sName))
+        if stat.S_ISDIR(oStat.st_mode):
+            lPending.extend(os.path.join(sName, sEntry) for sEntry in sorted(os.listdir(os.path.join(sSource, sName)), reverse = True))
+        else:
+            oDigest.update(os.fsencode(sName) + ("\t%d\t%r\n" % (oStat.st_size, oStat.st_mtime)).encode("ascii"))
+    return oDigest.hexdigest()
+
+
+def iterDocuments(sSource, lNames = None, iChunkSize = CHUNK_SIZE, bRatings = False):
+    '''Yields (name, class, chunks) for every positive or negative review in sSource, where
+    chunks is an iterator of the text of the review, in pieces of at most iChunkSize bytes
+    (which must be consumed before the next review is read).  sSource is a directory (of which
+    only the files in lNames are read, if given), a tar archive (optionally compressed), a zip
+    archive, or a single (optionally gzipped) review or JSONL file.  If bRatings is set, yields
+    (name, rating, chunks) for every rated review instead.'''
+
+    if os.path.isdir(sSource):
+        for sName in (lNames if lNames is not None else listDocuments(sSource)):
+            for tDocument in iterFileDocuments(os.path.join(sSource, sName), sName, iChunkSize, bRatings):
+                yield tDocument
+    elif not os.path.isfile(sSource):
+        raise IOError("training source not found: %s" % sSource)
+    elif tarfile.is_tarfile(sSource):
+        oArchive = tarfile.open(sSource, "r:*")
+        try:
+            for oMember in oArchive:
+                if oMember.isfile():
+                    for tDocument in iterStreamDocuments(oMember.name, oArchive.extractfile(oMember), iChunkSize, bRatings):
+                        yield tDocument
+        finally:
+            oArchive.close()
+    elif zipfile.is_zipfile(sSource):
+        oArchive = zipfile.ZipFile(sSource)
+        try:
+            for oMember in oArchive.infolist():
+                if not oMember.filename.endswith("/"):
+                    for tDocument in iterStreamDocuments(oMember.filename, oArchive.open(oMember), iChunkSize, bRatings):
+                        yield tDocument
+        finally:
+            oArchive.close()
+    else:
+        for tDocument in iterFileDocuments(sSource, os.path.basename(sSource), iChunkSize, bRatings):
+            yield tDocument
+
+
+def iterFileDocuments(sPath, sName, iChunkSize = CHUNK_SIZE, bRatings = False):
+    '''Yields the reviews of one file (see iterStreamDocuments()), decompressing it if its
+    name ends in .gz.'''
+
+    if sName.endswith(".gz"):
+        fh = gzip.open(sPath, "rb")
+        sName = sName[:-len(".gz")]
+    else:
+        fh = open(sPath, "rb")
+    try:
+        for tDocument in iterStreamDocuments(sName, fh, iChunkSize, bRatings):
+            yield tDocument
+    finally:
+        fh.close()
+
+
+def iterStreamDocuments(sName, fh, iChunkSize = CHUNK_SIZE, bRatings = False):
+    '''Yields the reviews of the open file fh, named sName:  one record per line if it is a
+    JSONL file, and otherwise the file itself, if its name labels it (by rating, if bRatings
+    is set).'''
+
+    if sName.endswith(".jsonl"):
+        for iLine, line in enumerate(fh):
+            if not line.strip():
+                continue
+            record = json.loads(line.decode(ENCODING, ENCODING_ERRORS))
+            label, sText = (record.get("label"), record.get("text")) if isinstance(record, dict) else record
+            sLabel = recordRating(label) if bRatings else recordLabel(label)
+            if sLabel is not None and sText is not None:
+                yield "%s:%d" % (sName, iLine + 1), sLabel, iter([sText])
+    else:
+        sLabel = fileRating(sName) if bRatings else fileLabel(sName)
+        if sLabel is not None:
+            yield sName, sLabel, decodeChunks(iterChunks(fh, iChunkSize))
+
+
+def iterChunks(fh, iChunkSize = CHUNK_SIZE):
+    '''Yields the contents of the open file fh, in pieces of at most iChunkSize bytes (a
+    shorter piece is the last one, as read() only returns less than asked at the end).'''
+
+    while True:
+        sChunk = fh.read(iChunkSize)
+        if sChunk:
+            yield sChunk
+        if len(sChunk) < iChunkSize:
+            break
+
+
+def decodeChunks(iChunks):
+    '''Yields the text of a review given as chunks of bytes, decoded from UTF-8 (see
+    ENCODING).  A character whose bytes are split between two chunks is decoded whole.'''
+
+    return codecs.iterdecode(iChunks, ENCODING, ENCODING_ERRORS)
+
+
+def readText(sFilename):
+    '''Returns the text of a review file, decoded as the reviews of a corpus are.'''
+
+    with open(sFilename, "r", encoding = ENCODING, errors = ENCODING_ERRORS, newline = "") as fh:
+        return fh.read()
+
+
+def iterChunkTokens(iChunks, oPattern):
+    '''Yields the lowercased tokens of a text given in chunks (matches of oPattern, whose
+    matches must cover every non-whitespace character, as with TOKEN_PATTERN), one list per
+    chunk.  As with Classifier.tokenize(), the text is normalized to NFC before matching, and
+    the tokens are lowercased after.  A token that reaches the end of a chunk may continue in
+    the next one (as may the accents of its last letter), so it is carried over, and the
+    result is the same as tokenizing the whole text at once.'''
+
+    sCarry = ""
+    for sChunk in iChunks:
+        sText = unicodedata.normalize("NFC", sCarry + sChunk)
+        lTokens = oPattern.findall(sText)
+        sCarry = ""
+        if lTokens and not sText[-1].isspace():
+            sCarry = lTokens.pop()
+        yield list(map(str.lower, lTokens))
+    if sCarry:
+        yield [sCarry.lower()]
+
+
+class CountSpiller(object):
+    '''Word counts in iColumns columns (e.g. positive and negative), held in one dictionary
+    per column (the columns attribute).  Whenever they hold more than maxWords words in all
+    (0 for no limit), spillIfFull() writes them to a sorted run file in spillDir and clears
+    them; iterMerged() then merges the runs and the counts still in memory.  Spillers are
+    picklable, so that worker processes can hand theirs back (see absorb()).'''
+
+    def __init__(self, iColumns, maxWords = 0, spillDir = None):
+        self.columns  = [{} for i in range(iColumns)]
+        self.maxWords = maxWords
+        self.spillDir = spillDir
+        self.runs     = []
+
+    def spillIfFull(self):
+        '''Spills the counts to disk if they hold more than maxWords words.'''
+
+        if self.maxWords and sum(len(dCounts) for dCounts in self.columns) > self.maxWords:
+            self.spill()
+
+    def spill(self):
+        '''Writes the counts in memory to a new run file, and clears them.'''
+
+        if not any(self.columns):
+            return
+        self.runs.append(self.writeRun(self.iterMemory()))
+        for dCounts in self.columns:
+            dCounts.clear()
+        if len(self.runs) > MAX_RUNS:
+            lOldRuns = self.runs
+            self.runs = [self.writeRun(self.iterMerged(bMemory = False))]
+            for sPath in lOldRuns:
+                os.remove(sPath)
+
+    def writeRun(self, iRows):
+        '''Writes (word, counts) rows, in sorted word order, to a new run file (one tab
+        separated line per word; tokens hold no whitespace), and returns its path.'''
+
+        iHandle, sPath = tempfile.mkstemp(prefix = "counts-", suffix = ".run", dir = self.spillDir)
+        with os.fdopen(iHandle, "w", encoding = "utf-8", newline = "\n") as fh:
+            for word, lCounts in iRows:
+                fh.write("%s\t%s\n" % (word, "\t".join(str(count) for count in lCounts)))
+        return sPath
+
+    def absorb(self, oOther):
+        '''Adds the counts of another spiller (e.g. of one shard) to these, and takes over its
+        run files.'''
+
+        for dCounts, dOtherCounts in zip(self.columns, oOther.columns):
+            for word, count in dOtherCounts.items():
+                dCounts[word] = dCounts.get(word,0) + count
+            self.spillIfFull()
+        self.runs.extend(oOther.runs)
+        oOther.runs = []
+
+    def iterMemory(self):
+        '''Yields (word, counts) for the words in memory, in sorted order.'''
+
+        for word in sorted(set().union(*self.columns)):
+            yield word, [dCounts.get(word,0) for dCounts in self.columns]
+
+    def iterMerged(self, bMemory = True):
+        '''Yields (word, counts) for every word in the runs and (if bMemory is set) in memory,
+        in sorted order, summing the counts of a word over all of them.'''
+
+        lSources = [iterRun(sPath) for sPath in self.runs]
+        if bMemory:
+            lSources.append(self.iterMemory())
+
+        sLastWord = None
+        lTotals = None
+        for word, lCounts in heapq.merge(*lSources):
+            if word != sLastWord:
+                if lTotals is not None:
+                    yield sLastWord, lTotals
+                sLastWord, lTotals = word, list(lCounts)
+            else:
+                for i, count in enumerate(lCounts):
+                    lTotals[i] = lTotals[i] + count
+        if lTotals is not None:
+            yield sLastWord, lTotals
+
+    def cleanup(self):
+        '''Deletes the run files.'''
+
+        for sPath in self.runs:
+            if os.path.exists(sPath):
+                os.remove(sPath)
+        self.runs = []
+
+
+def iterRun(sPath):
+    '''Yields the (word, counts) rows of a run file written by CountSpiller.writeRun().'''
+
+    with open(sPath, "r", encoding = "utf-8", newline = "\n") as fh:
+        for sLine in fh:
+            lFields = sLine.rstrip("\n").split("\t")
+            yield lFields[0], [int(sCount) for sCount in lFields[1:]]
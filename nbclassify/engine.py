@@ -0,0 +1,1395 @@
+'''The classifier engine shared by bayes.py and bayesbest.py:  the tokenizer, the counting of
+the training reviews (in shards, on a pool of worker processes), the count table and the
+model files, the log probability tables, and the scorers, one review at a time or in
+vectorized batches, with their caches and instrumentation.  What the two classifiers do
+differently, the weighting of the counts and the decision rule, is a strategy object (see
+strategies.py), chosen by name:
+
+    bc = engine.Classifier("training/", strategy = "bayesbest")
+
+bayes.py and bayesbest.py each define Bayes_Classifier as the engine with their strategy.  The
+tokenizer, the feature extraction, the staleness check and the sharded counting are also
+module-level functions (tokenizeText(), extractFeatures(), isStaleModel() and mapShards()),
+which the K-class model of ratings.py shares.
+'''
+
+import heapq, math, multiprocessing, os, pickle, re, shutil, tempfile, threading, time, unicodedata
+from . import corpus, features, instrument, lrucache, modelfile, strategies, vocabulary
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def markClasses():
+    '''Returns the Unicode combining marks (general category M, e.g. accents and the vowel
+    signs of Indic scripts), as the bodies of two regular expression character classes:  those
+    of the Basic Multilingual Plane, and the rest (of planes 1 and 14, the only others that
+    have any).  The re module's \\w leaves marks out, so TOKEN_PATTERN adds them itself.'''
+
+    lRanges = []
+    iCodes = (iCode for iCode in list(range(0x20000)) + list(range(0xE0000, 0xE1000)) if unicodedata.category(chr(iCode))[0] == "M")
+    for iCode in iCodes:
+        if lRanges and lRanges[-1][1] == iCode - 1:
+            lRanges[-1][1] = iCode
+        else:
+            lRanges.append([iCode, iCode])
+
+    lClasses = ["", ""]
+    for iFirst, iLast in lRanges:
+        lClasses[iFirst > 0xFFFF] += re.escape(chr(iFirst)) + ("-" + re.escape(chr(iLast)) if iLast > iFirst else "")
+    return lClasses
+
+# Precompiled Token Pattern:  A Run of Word Characters (Unicode Letters, Digits and Underscores),
+# Apostrophes and Hyphens, and the Combining Marks Within It, or Any Other Single Non-Whitespace
+# Character.  (Marks Outside the BMP are Only Looked Up for Characters Outside It, as a Character
+# Class with Any is Much Slower to Match.)
+TOKEN_PATTERN = re.compile(r"[\w'-]+(?:(?:[%s]|(?=[\U00010000-\U0010FFFF])[%s])+[\w'-]*)*|\S" % tuple(markClasses()))
+
+def referenceTokenize(sText):
+    '''The per-character tokenizer of the original bayes.py, verbatim:  a token is a run of
+    ASCII letters, digits, apostrophes, underscores and hyphens, or any other single
+    non-whitespace character.  It is kept as the reference that tokenize() must reproduce
+    exactly on ASCII text (as the shipped reviews are); on other text, tokenize() treats
+    Unicode letters and marks as word characters instead.'''
+
+    lTokens = []
+    sToken = ""
+    for c in sText:
+        if re.match("[a-zA-Z0-9]", str(c)) != None or c == "\'" or c == "_" or c == '-':
+            sToken += c
+        else:
+            if sToken != "":
+                lTokens.append(sToken)
+                sToken = ""
+            if c.strip() != "":
+                lTokens.append(str(c.strip()))
+
+    if sToken != "":
+        lTokens.append(sToken)
+
+    return lTokens
+
+
+def normalizeText(sText):
+    '''Returns sText in Unicode normalization form NFC, which composes the letters and accents
+    that may be written apart (e.g. "e" and U+0301) into one character, as tokenizing expects.'''
+
+    return unicodedata.normalize("NFC", sText)
+
+
+def tokenizeText(sText, bLowercase = False):
+    '''Returns the list of the tokens of sText, lowercased if bLowercase is set (see
+    Classifier.tokenize()).'''
+
+    lTokens = TOKEN_PATTERN.findall(normalizeText(sText))
+    if bLowercase:
+        return list(map(str.lower, lTokens))
+    return lTokens
+
+
+def extractFeatures(lTokens, iNgrams = 1, iHashBuckets = 0):
+    '''Returns the features of a list of (lowercased) tokens, for the feature settings
+    iNgrams and iHashBuckets (see Classifier.extractFeatures()).'''
+
+    if iNgrams > 1 or iHashBuckets > 0:
+        return features.extract(lTokens, iNgrams, iHashBuckets)
+    return lTokens
+
+
+def isStaleModel(dHeader, sTrainSource, iNgrams = None, iHashBuckets = None):
+    '''Returns True if the model whose header is dHeader (None for a model without one, e.g.
+    a pickle database, which has the default feature settings) was trained on a different
+    training set than sTrainSource holds now, or with feature settings other than iNgrams and
+    iHashBuckets (None for any).  See Classifier.isStale().'''
+
+    iModelNgrams, iModelHashBuckets = (dHeader["ngrams"], dHeader["hashBuckets"]) if dHeader is not None else (1, 0)
+    if (iNgrams is not None and iNgrams != iModelNgrams) or (iHashBuckets is not None and iHashBuckets != iModelHashBuckets):
+        return True
+
+    sFingerprint = dHeader["fingerprint"] if dHeader is not None else None
+    if sFingerprint is None:
+        return False
+    sCurrent = corpus.fingerprint(sTrainSource)
+    return sCurrent is not None and sCurrent != sFingerprint
+
+
+def mapShards(fCountShard, sTrainSource, tShardArgs, workers = 1):
+    '''Splits the reviews of sTrainSource into shards, and returns the list of their counts,
+    in file order:  fCountShard(tArgs) counts one shard, where tArgs is sTrainSource, the list
+    of the file names of the shard (None for all the reviews of the source), and then
+    tShardArgs.  With workers > 1, and a directory to train on, the shards are counted by a
+    pool of that many worker processes (so fCountShard must be a module-level function);
+    several shards are made per worker, to balance the load.  Archives and JSONL files are
+    read as one stream, in one shard.'''
+
+    lFileList = corpus.listDocuments(sTrainSource)
+    if workers <= 1 or lFileList is None:
+        return [fCountShard((sTrainSource, lFileList) + tuple(tShardArgs))]
+
+    iShardSize = max(1, int(math.ceil(len(lFileList) / float(workers * 4))))
+    lShardArgs = [(sTrainSource, lFileList[iStart:iStart + iShardSize]) + tuple(tShardArgs)
+                  for iStart in range(0, len(lFileList), iShardSize)]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(fCountShard, lShardArgs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def countShard(tArgs):
+    '''Tokenizes and counts one shard of the training reviews.  tArgs is a tuple of the
+    training source, the list of file names in the shard (None for all the reviews of the
+    source), the short review length (see strategies.Strategy), the word budget, the spill directory (see
+    corpus.CountSpiller), the longest n-gram and the number of hash buckets of the features
+    (see features.py).  The reviews are read a chunk at a time.  Returns the unweighted
+    feature counts of the shard (see countDocuments()).  This is a module-level function, so
+    that train() can hand the shards to a pool of worker processes.'''
+
+    sTrainSource, lFileList, iShortReviewLength, iSpillWords, sSpillDirectory, iNgrams, iHashBuckets = tArgs
+
+    iDocuments = ((sLabel, corpus.iterChunkTokens(iChunks, TOKEN_PATTERN)) for sName, sLabel, iChunks in corpus.iterDocuments(sTrainSource, lFileList))
+    return countDocuments(iDocuments, iShortReviewLength, iSpillWords, sSpillDirectory, iNgrams, iHashBuckets)
+
+
+def countDocuments(iDocuments, iShortReviewLength, iSpillWords = 0, sSpillDirectory = None, iNgrams = 1, iHashBuckets = 0):
+    '''Counts the features of labeled reviews.  iDocuments yields (class, tokens) for each
+    review, where tokens is an iterator of lists of its lowercased tokens (one list per chunk,
+    see corpus.iterChunkTokens(), or a single list); the other arguments are as for
+    countShard().  Returns the unweighted counts:  [feature counts (a corpus.CountSpiller, whose
+    columns are positive long reviews, positive short reviews, negative long reviews and
+    negative short reviews), number of positive docs, number of negative docs].  The weights
+    are applied by Classifier.modelFromCounts() after the counts are merged.  With an
+    iShortReviewLength of 0, every review is long.'''
+
+    oCounts = corpus.CountSpiller(4, iSpillWords, sSpillDirectory)
+    dPositiveLong, dPositiveShort, dNegativeLong, dNegativeShort = oCounts.columns
+    iPositiveDocs  = 0
+    iNegativeDocs  = 0
+
+    for sLabel, iTokenLists in iDocuments:
+
+        # Process Positive Review:
+        if (sLabel == "positive"):
+            iPositiveDocs = iPositiveDocs + 1
+            dLong, dShort = dPositiveLong, dPositiveShort
+
+        # Process Negative Review:
+        else:
+            iNegativeDocs = iNegativeDocs + 1
+            dLong, dShort = dNegativeLong, dNegativeShort
+
+        # Features of the Lowercased Tokens (as in Classifier.tokenize), Counted One Chunk
+        # at a Time; the First Features are Held Back until the Review is Known to be Long (in
+        # Tokens), or Ends Short
+        lHeadWords = []
+        iHeadTokens = 0
+        for tokens, words in features.iterChunkFeatures(iTokenLists, iNgrams, iHashBuckets):
+            if lHeadWords is not None:
+                lHeadWords.extend(words)
+                iHeadTokens = iHeadTokens + len(tokens)
+                if iHeadTokens < iShortReviewLength:
+                    continue
+                words, lHeadWords = lHeadWords, None
+            for word in words:
+                dLong[word] = dLong.get(word,0) + 1
+            oCounts.spillIfFull()
+
+        if lHeadWords is not None:
+            for word in lHeadWords:
+                dShort[word] = dShort.get(word,0) + 1
+            oCounts.spillIfFull()
+
+    # With a Budget, Hand Back Only Run Files (Not Counts to Pickle)
+    if iSpillWords:
+        oCounts.spill()
+
+    return [oCounts, iPositiveDocs, iNegativeDocs]
+
+
+def topIndices(aValues, k):
+    '''Returns the indices of the k largest values of a NumPy array, largest first (and lowest
+    index first among equal values), found by partial sort (numpy.argpartition) rather than by
+    sorting the whole array.'''
+
+    if k <= 0:
+        return numpy.arange(0)
+    if len(aValues) > k:
+        fThreshold = aValues[numpy.argpartition(-aValues, k - 1)[k - 1]]
+        aTop = numpy.flatnonzero(aValues >= fThreshold)
+    else:
+        aTop = numpy.arange(len(aValues))
+    return aTop[numpy.lexsort((aTop, -aValues[aTop]))][:k]
+
+
+class Classifier(object):
+    '''Implements a Naive Bayes classifer designed to classify movie reviews as
+    either positive or negative, based on the words within the review.  In that
+    regard, this can be viewed as a "Sentiment Analysis".  This classifier can
+    train on a training set, or load a pre-computed database (derived from a
+    previous training session, and saved in the binary format of modelfile.py).
+    The weighting of its counts and its decision rule are those of its strategy
+    (see strategies.py).'''
+
+    defaultStrategy = "bayes" # Name of the Strategy of a Classifier Created without One
+
+    def __init__(self, trainDirectory = "movie_reviews/", workers = 1, mapped = False, cacheSize = 0, minCount = 1, maxVocab = 0, spillWords = 0,
+                 modelFile = None, lazy = True, preload = False, ngrams = None, hashBuckets = None, metrics = False, strategy = None):
+        '''This method initializes the Naive Bayes Sentiment Classifier.  If a trained model
+        has been saved to modelFile, it loads this model.  Otherwise, or if the model is stale
+        (see isStale()), the system will proceed through training (on the given number of
+        worker processes).  If lazy is set (the default), this is put off until the model is
+        first needed, e.g. by the first call to classify(), so that creating the classifier is
+        cheap; if preload is also set, it is started at once on a background thread, and the
+        first call waits for it.  If mapped is set, the saved model is memory-mapped read-only
+        (see mapModel()) rather than loaded.  A cacheSize > 0 enables a result cache of that
+        many reviews (see enableCache()).  Training prunes the words seen fewer than minCount
+        times, and keeps at most maxVocab words if maxVocab > 0 (see
+        vocabulary.CountTable.prune()), and spills its partial counts to disk whenever they
+        hold more than spillWords words, if spillWords > 0 (see train()).  The features of a
+        review are its tokens and, if ngrams > 1, its n-grams up to that length, hashed into
+        hashBuckets buckets if hashBuckets > 0 (see features.py); by default, those the saved
+        model was trained with, or unigrams for a new model.  If metrics is set, the classifier
+        counts and times its stages (see enableMetrics()).  strategy is a strategy object, or
+        the name of a registered strategy (by default, defaultStrategy; see strategies.py), and
+        modelFile defaults to the model file of the strategy.  After running this method, the
+        classifier is ready to classify input text.'''
+
+        self._strategy       = strategies.getStrategy(strategy if strategy is not None else self.defaultStrategy)
+        self._trainDirectory = trainDirectory
+        self._modelFile      = modelFile if modelFile is not None else self._strategy.modelFile
+        self._minCount       = minCount # Words Seen Fewer Times are Pruned by train()
+        self._maxVocab       = maxVocab # Largest Vocabulary Kept by train() (0 = No Limit)
+        self._spillWords     = spillWords # Word Budget of the Partial Counts of train() (0 = No Limit)
+        self._ngrams         = ngrams      # Longest N-gram of the Features (None = As in the Saved Model)
+        self._hashBuckets    = hashBuckets # Hash Buckets of the Features (0 = Not Hashed; None = As Saved)
+        self._counts         = None     # Compact Word Counts of Both Classes (see setCountTable())
+        self._positiveWords  = {}
+        self._negativeWords  = {}
+        self._logProbTable   = None # Per-word Log Conditional Probabilities (built on demand)
+        self._logProbArrays  = None # Vocabulary Ids and Log Probability Vectors, for Batch Scoring
+        self._ratioIndex     = None # Partial-Sort Index of the Log-Ratios (see mostDiscriminative())
+        self._reviewCache    = None # LRU Cache of Review Results (see enableCache())
+        self._tokenCache     = None # LRU Cache of Token Log Probabilities (see enableCache())
+        self._metrics        = None # Counters and Timing Histograms of the Stages (see enableMetrics())
+
+        if cacheSize > 0:
+            self.enableCache(cacheSize)
+        if metrics:
+            self.enableMetrics()
+
+        # Model Loading State (see ensureModel())
+        self._workers       = workers
+        self._mapped        = mapped
+        self._fingerprint   = None  # Fingerprint of the Training Set of the Model (see isStale())
+        self._modelLock     = threading.RLock()
+        self._modelPending  = True  # The Model is Still to be Loaded (or Trained)
+        self._modelReady    = False # The Model is Loaded (or Trained)
+        self._preloadThread = None
+
+        # Load Saved Training Object (if it exists), Now, in the Background, or on First Use
+        if preload:
+            self._preloadThread = threading.Thread(target = self.ensureModel, name = "model-preload")
+            self._preloadThread.daemon = True
+            self._preloadThread.start()
+        elif not lazy:
+            self.ensureModel()
+
+
+    @property
+    def strategy(self):
+        '''Getter for the strategy property (the weighting and decision rule, see strategies.py)'''
+        return self._strategy
+
+    @property
+    def trainDirectory(self):
+        '''Getter for the trainDirectory property'''
+        return self._trainDirectory
+
+    @property
+    def modelFile(self):
+        '''Getter for the modelFile property'''
+        return self._modelFile
+
+    @property
+    def minCount(self):
+        '''Getter for the minCount property'''
+        return self._minCount
+
+    @property
+    def maxVocab(self):
+        '''Getter for the maxVocab property'''
+        return self._maxVocab
+
+    @property
+    def spillWords(self):
+        '''Getter for the spillWords property'''
+        return self._spillWords
+
+    @property
+    def ngrams(self):
+        '''Getter for the ngrams property (the longest n-gram of the features)'''
+        self.ensureModel()
+        return self._ngrams or 1
+
+    @property
+    def hashBuckets(self):
+        '''Getter for the hashBuckets property (0 if the features are not hashed)'''
+        self.ensureModel()
+        return self._hashBuckets or 0
+
+    @property
+    def positiveWords(self):
+        '''Getter for the positiveWords property (a read-only view of the count table)'''
+        self.ensureModel()
+        return self._positiveWords
+
+    @property
+    def negativeWords(self):
+        '''Getter for the negativeWords property (a read-only view of the count table)'''
+        self.ensureModel()
+        return self._negativeWords
+
+    @property
+    def numPositiveDocs(self):
+        '''Getter for the numPositiveDocs property'''
+        self.ensureModel()
+        return self._numPositiveDocs
+
+    @property
+    def numNegativeDocs(self):
+        '''Getter for the numNegativeDocs property'''
+        self.ensureModel()
+        return self._numNegativeDocs
+
+    @property
+    def numPositiveWords(self):
+        '''Getter for the numPositiveWords property'''
+        self.ensureModel()
+        return self._numPositiveWords
+
+    @property
+    def numNegativeWords(self):
+        '''Getter for the numNegativeWords property'''
+        self.ensureModel()
+        return self._numNegativeWords
+
+    @trainDirectory.setter
+    def trainDirectory(self, value):
+        '''Setter for the trainDirectory property'''
+        self._trainDirectory = value
+
+    @modelFile.setter
+    def modelFile(self, value):
+        '''Setter for the modelFile property (the model is not reloaded)'''
+        self._modelFile = value
+
+    @minCount.setter
+    def minCount(self, value):
+        '''Setter for the minCount property'''
+        self._minCount = value
+
+    @maxVocab.setter
+    def maxVocab(self, value):
+        '''Setter for the maxVocab property'''
+        self._maxVocab = value
+
+    @spillWords.setter
+    def spillWords(self, value):
+        '''Setter for the spillWords property'''
+        self._spillWords = value
+
+    @ngrams.setter
+    def ngrams(self, value):
+        '''Setter for the ngrams property (retrain the classifier after changing it)'''
+        self._ngrams = value
+
+    @hashBuckets.setter
+    def hashBuckets(self, value):
+        '''Setter for the hashBuckets property (retrain the classifier after changing it)'''
+        self._hashBuckets = value
+
+    @positiveWords.setter
+    def positiveWords(self, value):
+        '''Setter for the positiveWords property (the counts are copied into the count table)'''
+        self.setCountTable(vocabulary.CountTable.fromMappings(value, self.negativeWords))
+
+    @negativeWords.setter
+    def negativeWords(self, value):
+        '''Setter for the negativeWords property (the counts are copied into the count table)'''
+        self.setCountTable(vocabulary.CountTable.fromMappings(self.positiveWords, value))
+
+    @numPositiveDocs.setter
+    def numPositiveDocs(self, value):
+        '''Setter for the numPositiveDocs property'''
+        self.ensureModel()
+        self._numPositiveDocs = value
+        self._logProbTable = None
+
+    @numNegativeDocs.setter
+    def numNegativeDocs(self, value):
+        '''Setter for the numNegativeDocs property'''
+        self.ensureModel()
+        self._numNegativeDocs = value
+        self._logProbTable = None
+
+    @numPositiveWords.setter
+    def numPositiveWords(self, value):
+        '''Setter for the numPositiveWords property'''
+        self.ensureModel()
+        self._numPositiveWords = value
+        self._logProbTable = None
+
+    @numNegativeWords.setter
+    def numNegativeWords(self, value):
+        '''Setter for the numNegativeWords property'''
+        self.ensureModel()
+        self._numNegativeWords = value
+        self._logProbTable = None
+
+
+    def train(self, workers = 1):
+        '''Trains the Naive Bayes Sentiment Classifier on trainDirectory:  a directory tree of
+        review files, a tar or zip archive of them, or a JSONL file of labeled reviews (see
+        corpus.py).  The reviews are read a chunk at a time and, if spillWords > 0, the partial
+        counts are spilled to sorted run files on disk whenever they hold more than spillWords
+        words, and merged at the end; so memory use is bounded by the budget and the size of the
+        model, not by the size of the corpus.  With workers > 1, the files of a directory are
+        split into shards which are counted by a pool of worker processes (each with its own
+        budget), and the shard counts are then merged.  The result does not depend on the
+        source format, the budget or the number of workers.  The fingerprint of the training
+        set is saved with the model (see isStale()).'''
+
+        # Training Replaces any Model Still to be Loaded
+        self.claimModel()
+        fStart = time.time()
+        sFingerprint = corpus.fingerprint(self.trainDirectory)
+
+        sSpillDirectory = tempfile.mkdtemp(prefix = "bayes-train-")
+        try:
+            # Count the Reviews in Shards (on a Pool of Worker Processes, if Requested)
+            lShards = self.countShards(workers, sSpillDirectory)
+            fCounted = time.time()
+
+            # Merge the (Unweighted) Shard Counts, and Train (i.e. Fill the Count Table with the
+            # Weighted Counts, and the Word and Document Counters)
+            oCounts = corpus.CountSpiller(4, self.spillWords, sSpillDirectory)
+            lStatistics = [0, 0]
+            for shard in lShards:
+                oCounts.absorb(shard[0])
+                lStatistics = [iTotal + iCount for iTotal, iCount in zip(lStatistics, shard[1:])]
+            iFeatures = self.modelFromCounts(oCounts.iterMerged(), lStatistics)
+            fMerged = time.time()
+        finally:
+            shutil.rmtree(sSpillDirectory, ignore_errors = True)
+
+        # Save Results of the Training (in the Binary Model Format)
+        self._fingerprint = sFingerprint
+        self.saveModel(self.modelFile)
+        self._modelReady = True
+
+        if self._metrics is not None:
+            self._metrics.observe("train", time.time() - fStart)
+            self._metrics.observe("train.count", fCounted - fStart)
+            self._metrics.observe("train.merge", fMerged - fCounted)
+            self._metrics.count("train.documents", self.numPositiveDocs + self.numNegativeDocs)
+            self._metrics.count("train.features", iFeatures)
+
+
+    def countShards(self, workers = 1, sSpillDirectory = None):
+        '''Splits the training reviews into shards, and returns the list of their counts (see
+        countShard()), in file order, counted by a pool of worker processes if workers > 1 (see
+        mapShards()).'''
+
+        return mapShards(countShard, self.trainDirectory,
+                         (self._strategy.shortReviewLength, self.spillWords, sSpillDirectory, self.ngrams, self.hashBuckets), workers)
+
+
+    def countTokenLists(self, lTokenLists, lLabels):
+        '''Counts the features of reviews that have already been tokenized (lists of lowercased
+        tokens, see tokenize()) and labeled ("positive" or "negative"), as train() counts the
+        reviews it reads.  Returns the unweighted counts, in the layout of the shard counts (see
+        countDocuments()).'''
+
+        return countDocuments(zip(lLabels, ([lTokens] for lTokens in lTokenLists)), self._strategy.shortReviewLength, 0, None, self.ngrams, self.hashBuckets)
+
+
+    def modelFromCounts(self, iRows, lStatistics):
+        '''Makes the model of the classifier from the merged, unweighted counts of its training
+        reviews:  iRows yields (word, [positive long, positive short, negative long, negative
+        short count]) for every word, in sorted order (as corpus.CountSpiller.iterMerged() does),
+        and lStatistics holds [number of positive docs, number of negative docs] (the sums of
+        the rest of the shard counts, see countDocuments()).  The counts are weighted by the
+        strategy (see strategies.Strategy.weightWord()), and rare words pruned, if requested.
+        Returns the (unweighted) number of features counted.  train() builds its model this
+        way, as does crossvalidate.py, from counts it derives by subtraction.'''
+
+        lPositiveTotals = [0, 0, 0]
+        lNegativeTotals = [0, 0, 0]
+
+        # Fill the Count Table with the Weighted Counts, in Sorted Order
+        weightWord = self._strategy.weightWord
+        oTable = vocabulary.CountTable.fromSortedCounts(
+            (word, weightWord(word, lCounts[0], lCounts[1], lPositiveTotals),
+                   weightWord(word, lCounts[2], lCounts[3], lNegativeTotals))
+            for word, lCounts in iRows)
+
+        # Fill the Word and Document Counters
+        self.numPositiveWords = self._strategy.weightTotals(lPositiveTotals)
+        self.numNegativeWords = self._strategy.weightTotals(lNegativeTotals)
+        self.numPositiveDocs, self.numNegativeDocs = lStatistics
+
+        # Prune Rare Words (if Requested); Pruned Words are Scored as Unseen Words, and the
+        # Word Counters Keep them
+        if self.minCount > 1 or self.maxVocab > 0:
+            oTable = oTable.prune(self.minCount, self.maxVocab)
+        self.setCountTable(oTable)
+        return sum(lPositiveTotals + lNegativeTotals)
+
+
+    def buildLogProbTable(self):
+        '''Precomputes the log of the conditional probability of every word in each class,
+        along with the values for unseen words and the log prior probability of each class.
+        classify() uses this table, so scoring a review costs one dictionary lookup per
+        token.  The table is discarded whenever the counts are changed (e.g. by train()),
+        and rebuilt on the next call to classify().  A model loaded from a model file, whose
+        log conditional probabilities are stored with its counts, fills the dictionary with
+        those (see storedLogProbs()) rather than computing them again.'''
+
+        # Load the Model First, if Needed (a Memory-Mapped Model Brings its Own Table)
+        self.ensureModel()
+        if self._logProbTable is not None:
+            return
+
+        fStart = time.time()
+        fPositiveTotal = float(self.numPositiveWords + 1)
+        fNegativeTotal = float(self.numNegativeWords + 1)
+
+        # Counts that are Not in a Count Table (e.g. Memory-Mapped Views) are Copied into One
+        if self._counts is None:
+            self.setCountTable(vocabulary.CountTable.fromMappings(self._positiveWords, self._negativeWords))
+
+        # Log Conditional Probabilities of an Unseen Word
+        self._unseenLogProbs = (math.log10(float(0 + 1) / fPositiveTotal),
+                                math.log10(float(0 + 1) / fNegativeTotal))
+
+        # Log Conditional Probabilities of Each Word (with Add-One Smoothing), as Stored in the
+        # Model File if the Counts have Not Changed Since
+        tStored = self.storedLogProbs()
+        if tStored is not None:
+            dLogProbs = dict(zip(self._counts.vocabulary.words, zip(tStored[0], tStored[1])))
+        else:
+            dLogProbs = {}
+            for word, positiveCount, negativeCount in self._counts.iterCounts():
+                dLogProbs[word] = (math.log10(float(positiveCount + 1) / fPositiveTotal),
+                                   math.log10(float(negativeCount + 1) / fNegativeTotal))
+
+        # Log Prior Probabilities of the Positive and Negative Classes
+        fTotalDocs = float(self.numPositiveDocs + self.numNegativeDocs)
+        self._logPriorProbs = (math.log10(float(self.numPositiveDocs) / fTotalDocs),
+                               math.log10(float(self.numNegativeDocs) / fTotalDocs))
+
+        self._logProbTable = dLogProbs
+        self._logProbArrays = None
+        self._ratioIndex = None
+        self.clearCache()
+        if self._metrics is not None:
+            self._metrics.observe("model.build_table", time.time() - fStart)
+
+
+    def storedLogProbs(self):
+        '''Returns the (positive, negative) arrays of the log conditional probabilities of the
+        words of the count table, by id, as stored in the model file it was read from (see
+        modelfile.readCountTable()), or None if there are none, or if the counts or the word
+        totals have changed since.'''
+
+        tStored = self._counts.logProbs if self._counts is not None else None
+        if tStored is None or tStored[2:] != (self._numPositiveWords, self._numNegativeWords) or not self._counts.vocabulary.isSorted():
+            return None
+        return tStored[:2]
+
+
+    def setCountTable(self, oTable):
+        '''Makes oTable (a vocabulary.CountTable) the word counts of the classifier:  one
+        vocabulary shared by both classes, and an array of counts per class.  positiveWords
+        and negativeWords become read-only, dictionary-like views of it.'''
+
+        self._counts        = oTable
+        self._positiveWords = oTable.view("positive") # Word counts in POSITIVE reviews
+        self._negativeWords = oTable.view("negative") # Word counts in NEGATIVE reviews
+        self._logProbTable  = None
+
+
+    def loadModel(self, sFilename):
+        '''Loads the trained counts saved in sFilename.  A binary model file is read straight
+        into a count table, along with its stored log conditional probabilities, which
+        classify() then uses as they are (see buildLogProbTable()); the dictionaries of a
+        pickle database (saved by an earlier version) are copied into one.'''
+
+        self.claimModel()
+        fStart = time.time()
+        if modelfile.isModelFile(sFilename):
+            oTable, lStatistics, dHeader = modelfile.readCountTable(sFilename)
+            self._fingerprint = dHeader["fingerprint"]
+            self._ngrams, self._hashBuckets = dHeader["ngrams"], dHeader["hashBuckets"]
+        else:
+            database = self.load(sFilename)
+            oTable, lStatistics = vocabulary.CountTable.fromMappings(database[0], database[1]), database[2:]
+            self._fingerprint, self._ngrams, self._hashBuckets = None, 1, 0
+
+        self.setCountTable(oTable)
+        self._numPositiveDocs  = lStatistics[0] # Number of POSITIVE reviews
+        self._numNegativeDocs  = lStatistics[1] # Number of NEGATIVE reviews
+        self._numPositiveWords = lStatistics[2] # Number of total words in all POSITIVE reviews
+        self._numNegativeWords = lStatistics[3] # Number of total words in all NEGATIVE reviews
+        self._modelReady = True
+        if self._metrics is not None:
+            self._metrics.observe("model.load", time.time() - fStart)
+
+
+    def saveModel(self, sFilename = None):
+        '''Saves the trained counts (with the fingerprint of their training set, and the
+        feature settings) to sFilename (by default, modelFile), in the binary model format.  The
+        file is replaced atomically, so a concurrent reader never sees a partly written model.'''
+
+        fStart = time.time()
+        modelfile.writeModel(sFilename or self.modelFile,
+                             [self.positiveWords, self.negativeWords,
+                              self.numPositiveDocs, self.numNegativeDocs,
+                              self.numPositiveWords, self.numNegativeWords],
+                             self._fingerprint, self.ngrams, self.hashBuckets)
+        if self._metrics is not None:
+            self._metrics.observe("model.save", time.time() - fStart)
+
+
+    def update(self, lDocs, lLabels, bRemove = False, bFiles = False):
+        '''Incrementally trains the classifier on new labeled reviews, without retraining from
+        scratch:  their counts are added to the existing counts, in time proportional to the
+        size of the batch, and the updated model is saved (atomically) to modelFile.  lDocs
+        holds review texts, or, if bFiles is set, the names of review files, and lLabels their
+        classes, "positive" or "negative".  If bRemove is set, the reviews are backed out of
+        the counts instead (e.g. to undo a mislabeled batch).'''
+
+        if len(lDocs) != len(lLabels):
+            raise ValueError("update() needs one label per review")
+        self.ensureModel()
+        fStart = time.time()
+
+        # Read and Tokenize the Reviews, and Total their (Weighted) Counts per Class, in Units
+        # of 1 / countScale (see strategies.Strategy.countUnits())
+        dDeltas   = {"positive": {}, "negative": {}}
+        dNumDocs  = {"positive": 0, "negative": 0}
+        dNumWords = {"positive": 0, "negative": 0}
+        for doc, sLabel in zip(lDocs, lLabels):
+            if sLabel not in dDeltas:
+                raise ValueError('review labels must be "positive" or "negative", not %r' % (sLabel,))
+            if bFiles:
+                doc = self.loadFile(doc)
+            words = self.tokenize(doc, True)
+            dNumDocs[sLabel] = dNumDocs[sLabel] + 1
+
+            # (Weighted) Feature and Total Word Counters, as in train()
+            dNumWords[sLabel] = self._strategy.countFeatures(words, self.extractFeatures(words), dDeltas[sLabel], dNumWords[sLabel])
+
+        # Updates Need a Writable Count Table (e.g. after mapModel())
+        if self._counts is None:
+            self.setCountTable(vocabulary.CountTable.fromMappings(self.positiveWords, self.negativeWords))
+
+        # Check that Removed Reviews are Actually in the Counts
+        countUnits = self._strategy.countUnits
+        if bRemove:
+            for sLabel, dWords, numDocs in [("positive", self.positiveWords, self.numPositiveDocs),
+                                            ("negative", self.negativeWords, self.numNegativeDocs)]:
+                if dNumDocs[sLabel] > numDocs or any(countUnits(dWords.get(word,0)) < iUnits for word, iUnits in dDeltas[sLabel].items()):
+                    raise ValueError("cannot remove %s reviews that the model was not trained on" % sLabel)
+
+        # Update the Count Table and Word Counters (Invalidating the Log Probability Table)
+        iSign = -1 if bRemove else 1
+        self.applyCounts("positive", dDeltas["positive"], iSign)
+        self.applyCounts("negative", dDeltas["negative"], iSign)
+        self.numPositiveDocs  = self.numPositiveDocs  + iSign * dNumDocs["positive"]
+        self.numNegativeDocs  = self.numNegativeDocs  + iSign * dNumDocs["negative"]
+        self.numPositiveWords = self._strategy.fromUnits(countUnits(self.numPositiveWords) + iSign * dNumWords["positive"])
+        self.numNegativeWords = self._strategy.fromUnits(countUnits(self.numNegativeWords) + iSign * dNumWords["negative"])
+
+        # Save the Updated Model
+        self.saveModel(self.modelFile)
+        if self._metrics is not None:
+            self._metrics.observe("update", time.time() - fStart)
+            self._metrics.count("update.documents", len(lDocs))
+
+
+    def remove(self, lDocs, lLabels, bFiles = False):
+        '''Backs previously trained reviews out of the counts (see update()).'''
+
+        self.update(lDocs, lLabels, True, bFiles)
+
+
+    def applyCounts(self, sClass, dDeltas, iSign):
+        '''Adds (iSign = 1) or subtracts (iSign = -1) the word counts in dDeltas, in units of
+        1 / countScale (see strategies.Strategy.countUnits()), to or from the counts of class
+        sClass ("positive" or "negative") in the count table.  A word whose count falls to
+        zero drops out of positiveWords / negativeWords.'''
+
+        self._counts.addCounts(sClass, dDeltas, iSign, self._strategy.countScale)
+
+
+    def mapModel(self, sFilename):
+        '''Switches the classifier to a read-only model, memory-mapped from the binary model
+        file sFilename (see modelfile.MappedModel).  The model is shared with every other
+        process that maps the same file, rather than copied into per-process dictionaries;
+        positiveWords and negativeWords become read-only views of the file, and classify()
+        looks words up in the file directly, which is slower than a loaded model and only
+        saves memory for very large vocabularies (see the tradeoff in MappedModel).  Training
+        (or assigning new counts) switches the classifier back to an in-memory count table.'''
+
+        self.claimModel()
+        fStart = time.time()
+        oModel = modelfile.MappedModel(sFilename)
+        self._fingerprint      = oModel.fingerprint
+        self._ngrams           = oModel.ngrams
+        self._hashBuckets      = oModel.hashBuckets
+        self._positiveWords    = oModel.positiveWords
+        self._negativeWords    = oModel.negativeWords
+        self._numPositiveDocs  = oModel.numPositiveDocs
+        self._numNegativeDocs  = oModel.numNegativeDocs
+        self._numPositiveWords = oModel.numPositiveWords
+        self._numNegativeWords = oModel.numNegativeWords
+
+        self._counts         = None
+
+        self._logProbTable   = oModel
+        self._logProbArrays  = None
+        self._ratioIndex     = None
+        self.clearCache()
+        self._unseenLogProbs = oModel.unseenLogProbs
+        self._logPriorProbs  = oModel.logPriorProbs
+        self._modelReady     = True
+        if self._metrics is not None:
+            self._metrics.observe("model.map", time.time() - fStart)
+
+
+    def ensureModel(self):
+        '''Loads the model, if it has not been loaded (or trained) yet:  the classifier loads
+        it lazily, on first use, unless it was created with lazy = False (see __init__()).  Safe
+        to call from several threads:  one loads the model (see openModel()), and the others
+        wait for it.'''
+
+        if self._modelReady:
+            return
+        with self._modelLock:
+            # Nothing Pending:  Loaded by Another Thread, or Being Loaded by This One
+            if not self._modelPending:
+                return
+            self._modelPending = False
+            try:
+                self.openModel()
+            except Exception:
+                self._modelPending = True
+                raise
+            self._modelReady = True
+
+
+    def claimModel(self):
+        '''Cancels the pending lazy load of the model (as it is about to be trained or loaded
+        explicitly), after waiting for a load already started by another thread.'''
+
+        with self._modelLock:
+            self._modelPending = False
+
+
+    def openModel(self):
+        '''Loads the model saved in modelFile (memory-mapped, if mapped was set), or trains a
+        new one if there is none, or if it is stale (see isStale()).'''
+
+        if os.path.exists(self.modelFile) and not self.isStale():
+            if self._mapped and modelfile.isModelFile(self.modelFile):
+                self.mapModel(self.modelFile)
+            else:
+                self.loadModel(self.modelFile)
+        else:
+            self.train(self._workers)
+            if self._mapped:
+                self.mapModel(self.modelFile)
+
+
+    def isStale(self):
+        '''Returns True if the model saved in modelFile was trained on a different training set
+        than trainDirectory holds now (by comparing the fingerprint saved with the model with
+        that of trainDirectory, see corpus.fingerprint()), or with other feature settings than
+        the ngrams and hashBuckets the classifier was created with (if any).  Otherwise, a model
+        without a fingerprint (e.g. a pickle database), or a missing trainDirectory, is never
+        stale.'''
+
+        fStart = time.time()
+        bStale = isStaleModel(modelfile.readModelHeader(self.modelFile), self.trainDirectory, self._ngrams, self._hashBuckets)
+        if self._metrics is not None:
+            self._metrics.observe("model.stale_check", time.time() - fStart)
+        return bStale
+
+
+    def enableCache(self, iMaxReviews = 10000, iMaxTokens = 100000):
+        '''Enables caching:  a size-bounded LRU cache of review results, keyed by a hash of the
+        review text, so that repeated reviews are not tokenized and scored again, and an LRU
+        cache of token log probabilities, in front of the binary search of a memory-mapped
+        model (an in-memory model's log probability table already holds every token).  The
+        caches are cleared whenever the model is retrained, updated or reloaded.'''
+
+        self._reviewCache = lrucache.LRUCache(iMaxReviews)
+        self._tokenCache  = lrucache.LRUCache(iMaxTokens)
+
+
+    def clearCache(self):
+        '''Empties the caches (if enabled), since their results depend on the current counts.'''
+
+        if self._reviewCache is not None:
+            self._reviewCache.clear()
+            self._tokenCache.clear()
+
+
+    @property
+    def cacheStats(self):
+        '''The size and hit / miss / eviction counters of the review and token caches, or
+        None if caching is not enabled.'''
+
+        if self._reviewCache is None:
+            return None
+        return {"reviews": self._reviewCache.stats(), "tokens": self._tokenCache.stats()}
+
+
+    def enableMetrics(self):
+        '''Enables instrumentation:  counters (of the documents, tokens and features trained
+        on and scored, and of the features scored that are not in the vocabulary) and timing
+        histograms of each stage (training, loading, tokenizing, classifying, ...), collected in
+        an instrument.Metrics (see instrument.py) until disableMetrics().  Disabled (the
+        default), each stage only tests whether it is enabled.'''
+
+        if self._metrics is None:
+            self._metrics = instrument.Metrics()
+
+
+    def disableMetrics(self):
+        '''Disables instrumentation, and discards the metrics collected.'''
+
+        self._metrics = None
+
+
+    @property
+    def metrics(self):
+        '''The instrument.Metrics collected since enableMetrics(), or None if instrumentation
+        is not enabled.'''
+
+        return self._metrics
+
+
+    def exportMetrics(self, sFormat = "json"):
+        '''Returns the metrics collected as text, in sFormat ("json" or "prometheus", see
+        instrument.Metrics.export()), with the counters of the caches (if enabled) and the
+        out-of-vocabulary rate of the features scored; or None if instrumentation is not
+        enabled.'''
+
+        if self._metrics is None:
+            return None
+
+        dCounters = {}
+        if self.cacheStats is not None:
+            for sCache, dStats in self.cacheStats.items():
+                for sCounter in ["hits", "misses", "evictions"]:
+                    dCounters["cache.%s.%s" % (sCache, sCounter)] = dStats[sCounter]
+        iFeatures = self._metrics.counter("score.features")
+        dGauges = {"score.oov_rate": self._metrics.counter("score.unseen_features") / float(iFeatures) if iFeatures else 0.0}
+        return self._metrics.export(sFormat, dCounters, dGauges)
+
+
+    def reviewLogFinalProbs(self, sText):
+        '''Given a target string sText, returns the log of the final probability of the positive
+        and the negative class, and the number of tokens, as a tuple.  If caching is enabled,
+        the result is looked up in (or added to) the review cache.'''
+
+        if self._reviewCache is None:
+            lTokens = self.tokenize(sText, True)
+            return self.logFinalProbs(lTokens) + (len(lTokens),)
+
+        # Rebuild the Log Probability Table First (which Clears the Cache) if the Counts have Changed
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+
+        sKey = lrucache.textKey(sText)
+        tResult = self._reviewCache.get(sKey)
+        if tResult is None:
+            lTokens = self.tokenize(sText, True)
+            tResult = self.logFinalProbs(lTokens) + (len(lTokens),)
+            self._reviewCache.put(sKey, tResult)
+        return tResult
+
+
+    def logFinalProbs(self, lTokens):
+        '''Given a list of (lowercased) tokens, returns the log of the final probability
+        of the positive and the negative class, as a tuple, from the features of the tokens
+        (see extractFeatures()).'''
+
+        # Look Up the Precomputed Log Probabilities (Rebuilt if the Counts have Changed)
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+        dLogProbs = self._logProbTable
+        tUnseenLogProbs = self._unseenLogProbs
+        if self._tokenCache is not None and not isinstance(dLogProbs, dict):
+            dLogProbs = lrucache.CachedLookup(dLogProbs, self._tokenCache)
+
+        # Calculate Sum of Logs of Conditional Probabilities
+        sumlog_p_fi_positive = 0.0
+        sumlog_p_fi_negative = 0.0
+
+        lFeatures = self.extractFeatures(lTokens)
+        if self._metrics is None:
+            for word in lFeatures:
+                cond_prob_positive, cond_prob_negative = dLogProbs.get(word, tUnseenLogProbs)
+                sumlog_p_fi_positive = sumlog_p_fi_positive + cond_prob_positive
+                sumlog_p_fi_negative = sumlog_p_fi_negative + cond_prob_negative
+        else:
+            # Count the Features Scored, and those Not in the Vocabulary (the Lookups that Fall
+            # Back to the Unseen Word Values), from the Same Lookups
+            iUnseen = 0
+            for word in lFeatures:
+                tLogProbs = dLogProbs.get(word, tUnseenLogProbs)
+                if tLogProbs is tUnseenLogProbs:
+                    iUnseen = iUnseen + 1
+                cond_prob_positive, cond_prob_negative = tLogProbs
+                sumlog_p_fi_positive = sumlog_p_fi_positive + cond_prob_positive
+                sumlog_p_fi_negative = sumlog_p_fi_negative + cond_prob_negative
+            self._metrics.count("score.documents")
+            self._metrics.count("score.features", len(lFeatures))
+            self._metrics.count("score.unseen_features", iUnseen)
+
+        # Log of Prior Probabilities of Positive and Negative Classes
+        log_prior_prob_positive, log_prior_prob_negative = self._logPriorProbs
+
+        # Calculate the Log of Final Probabilities
+        log_final_prob_positive = sumlog_p_fi_positive + log_prior_prob_positive
+        log_final_prob_negative = sumlog_p_fi_negative + log_prior_prob_negative
+
+        return log_final_prob_positive, log_final_prob_negative
+
+
+    def batchLogFinalProbs(self, lTexts, bUseCache = True):
+        '''Vectorized version of logFinalProbs() for a list of target strings (requires NumPy).
+        Every token is mapped to an integer vocabulary id (or, for a memory-mapped model, found
+        by numpy.searchsorted), and the batch is laid out as a sparse document-term matrix in
+        coordinate form (one entry per token, in document order), so the sums of logs of all
+        documents come from a single weighted bincount against each class's log probability
+        vector.  The entries are accumulated in the same order as logFinalProbs(), so the
+        results are bit-identical.  Returns NumPy arrays holding the log final probabilities
+        of the positive and negative classes, and the number of tokens, of each document.
+        If caching is enabled, only the distinct reviews missing from the review cache are
+        scored.'''
+
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+        if bUseCache and self._reviewCache is not None:
+            return self.cachedBatchLogFinalProbs(lTexts)
+
+        # Tokenize the Batch
+        return self.tokenBatchLogFinalProbs([self.tokenize(sText, True) for sText in lTexts])
+
+
+    def tokenBatchLogFinalProbs(self, lTokenLists):
+        '''batchLogFinalProbs() for a batch that has already been tokenized:  given a list of
+        lists of (lowercased) tokens, one per document, returns the same arrays.  The matrix
+        holds the features of the tokens (see extractFeatures()); the lengths returned are
+        still the numbers of tokens.'''
+
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+
+        # Lay the Batch Out as One Run of Features
+        lBatchTokens   = []
+        lLengths       = []
+        lFeatureCounts = []
+        for lTokens in lTokenLists:
+            lFeatures = self.extractFeatures(lTokens)
+            lBatchTokens.extend(lFeatures)
+            lLengths.append(len(lTokens))
+            lFeatureCounts.append(len(lFeatures))
+        aLengths = numpy.array(lLengths, dtype = numpy.intp)
+        aDocIds  = numpy.repeat(numpy.arange(len(lLengths)), numpy.array(lFeatureCounts, dtype = numpy.intp))
+
+        # Build the Document-Term Matrix (Coordinate Form), Valued by Log Conditional Probabilities
+        if not isinstance(self._logProbTable, dict):
+            # Vocabulary Ids (-1 for Unseen Words), Found by Binary Search (see modelfile.MappedModel.tokenIds())
+            aTokenIds = self._logProbTable.tokenIds(lBatchTokens)
+            aTokenPositiveLogProbs, aTokenNegativeLogProbs = self._logProbTable.idLogProbs(aTokenIds)
+            iUnseenId = -1
+        else:
+            # Vocabulary Ids and Log Probability Vectors (the Last Id is for Unseen Words)
+            dVocabIds, aPositiveLogProbs, aNegativeLogProbs = self.buildLogProbArrays()[:3]
+            iUnseenId = len(dVocabIds)
+
+            aTokenIds = numpy.array([dVocabIds.get(word, iUnseenId) for word in lBatchTokens], dtype = numpy.intp)
+            aTokenPositiveLogProbs = aPositiveLogProbs[aTokenIds]
+            aTokenNegativeLogProbs = aNegativeLogProbs[aTokenIds]
+
+        # Count the Features Scored, and those Not in the Vocabulary (if Instrumentation is Enabled)
+        if self._metrics is not None:
+            self._metrics.count("score.documents", len(lLengths))
+            self._metrics.count("score.features", len(lBatchTokens))
+            self._metrics.count("score.unseen_features", int(numpy.count_nonzero(aTokenIds == iUnseenId)))
+
+        # Calculate Sum of Logs of Conditional Probabilities, for All Documents at Once
+        sumlog_p_fi_positive = numpy.bincount(aDocIds, weights = aTokenPositiveLogProbs, minlength = len(lLengths))
+        sumlog_p_fi_negative = numpy.bincount(aDocIds, weights = aTokenNegativeLogProbs, minlength = len(lLengths))
+
+        # Calculate the Log of Final Probabilities
+        log_prior_prob_positive, log_prior_prob_negative = self._logPriorProbs
+        return (sumlog_p_fi_positive + log_prior_prob_positive,
+                sumlog_p_fi_negative + log_prior_prob_negative,
+                aLengths)
+
+
+    def buildLogProbArrays(self):
+        '''Builds (on demand) and returns the vectors of batch scoring, from the log probability
+        table of an in-memory model (requires NumPy):  a dictionary of word -> vocabulary id, the
+        positive and negative log conditional probability vectors, the log-ratio vector (the
+        positive minus the negative log conditional probability of each word, as used by
+        explain()), and the sorted list of the words by id (as in a model file, so that words of
+        equal weight rank the same either way).  The last entry of each vector is for unseen
+        words.'''
+
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+        if self._logProbArrays is None:
+            lWords = sorted(self._logProbTable)
+            aLogProbs = numpy.array([self._logProbTable[word] for word in lWords] + [self._unseenLogProbs])
+            aPositiveLogProbs, aNegativeLogProbs = aLogProbs[:, 0].copy(), aLogProbs[:, 1].copy()
+            self._logProbArrays = (dict((word, i) for i, word in enumerate(lWords)),
+                                   aPositiveLogProbs, aNegativeLogProbs, aPositiveLogProbs - aNegativeLogProbs, lWords)
+        return self._logProbArrays
+
+
+    def cachedBatchLogFinalProbs(self, lTexts):
+        '''batchLogFinalProbs() through the review cache:  looks each review up in the cache,
+        scores the distinct missing reviews in one batch, and caches their results.'''
+
+        lKeys = [lrucache.textKey(sText) for sText in lTexts]
+        dResults = {}
+        dMissing = {}
+        for sKey, sText in zip(lKeys, lTexts):
+            if sKey not in dResults and sKey not in dMissing:
+                tResult = self._reviewCache.get(sKey)
+                if tResult is None:
+                    dMissing[sKey] = sText
+                else:
+                    dResults[sKey] = tResult
+
+        if dMissing:
+            lMissingKeys = list(dMissing)
+            aPositive, aNegative, aLengths = self.batchLogFinalProbs([dMissing[sKey] for sKey in lMissingKeys], False)
+            for sKey, tResult in zip(lMissingKeys, zip(aPositive.tolist(), aNegative.tolist(), aLengths.tolist())):
+                self._reviewCache.put(sKey, tResult)
+                dResults[sKey] = tResult
+
+        lResults = [dResults[sKey] for sKey in lKeys]
+        return (numpy.array([tResult[0] for tResult in lResults], dtype = float),
+                numpy.array([tResult[1] for tResult in lResults], dtype = float),
+                numpy.array([tResult[2] for tResult in lResults], dtype = numpy.intp))
+
+
+    def classify(self, sText):
+        '''Given a target string sText, this function returns the most likely document
+        class to which the target string belongs. This function should return one of three
+        strings: "positive", "negative" or "neutral".'''
+
+        # Time the Call (if Instrumentation is Enabled)
+        oMetrics = self._metrics
+        if oMetrics is not None:
+            fStart = time.time()
+            log_final_prob_positive, log_final_prob_negative, iTokens = self.reviewLogFinalProbs(sText)
+            oMetrics.observe("classify", time.time() - fStart)
+            return self.labelScore(log_final_prob_positive, log_final_prob_negative, iTokens)[0]
+
+        log_final_prob_positive, log_final_prob_negative, iTokens = self.reviewLogFinalProbs(sText)
+        return self.labelScore(log_final_prob_positive, log_final_prob_negative, iTokens)[0]
+
+
+    def labelScore(self, log_final_prob_positive, log_final_prob_negative, iTokens):
+        '''Given the log final probabilities of the positive and the negative class of a review,
+        and its number of tokens, returns its classification (as classify() returns it) and its
+        score (as scoreBatch() returns it), as a tuple, by the decision rule of the strategy.'''
+
+        return self._strategy.labelScore(log_final_prob_positive, log_final_prob_negative, iTokens)
+
+
+    def scoreBatch(self, lTexts):
+        '''Given a list of target strings, returns the list of their raw scores, as the
+        strategy computes them from the log final probabilities (e.g. the log of the final
+        probability of the positive class minus that of the negative class).'''
+
+        if numpy is None:
+            return [self.labelScore(*self.reviewLogFinalProbs(sText))[1] for sText in lTexts]
+
+        aPositive, aNegative, aLengths = self.batchLogFinalProbs(lTexts)
+        return self._strategy.scoreArrays(aPositive, aNegative, aLengths).tolist()
+
+
+    def classifyBatch(self, lTexts, bWithScores = False):
+        '''Given a list of target strings, returns the list of their classifications, exactly
+        as classify() would return them one at a time, but scored in one vectorized pass.  If
+        bWithScores is set, returns a list of (classification, score) pairs instead, with the
+        scores of scoreBatch().'''
+
+        if numpy is None:
+            lLabels = [self.classify(sText) for sText in lTexts]
+            return list(zip(lLabels, self.scoreBatch(lTexts))) if bWithScores else lLabels
+
+        oMetrics = self._metrics
+        if oMetrics is not None:
+            fStart = time.time()
+        aPositive, aNegative, aLengths = self.batchLogFinalProbs(lTexts)
+        if oMetrics is not None:
+            oMetrics.observe("classify_batch", time.time() - fStart)
+            oMetrics.count("classify_batch.documents", len(lTexts))
+        return self.labelBatch(aPositive, aNegative, aLengths, bWithScores)
+
+
+    def labelBatch(self, aPositive, aNegative, aLengths, bWithScores = False):
+        '''Given the arrays returned by batchLogFinalProbs() (or tokenBatchLogFinalProbs()),
+        returns the list of classifications of the documents, as classifyBatch() does.'''
+
+        aLabels, aScores = self._strategy.labelArrays(aPositive, aNegative, aLengths)
+        if bWithScores:
+            return list(zip(aLabels.tolist(), aScores.tolist()))
+        return aLabels.tolist()
+
+
+    def explain(self, sText, k = 10):
+        '''Explains the classification of a target string sText.  Returns a dictionary of its
+        "label" and "score" (as classifyBatch(bWithScores = True) returns them), its number of
+        "tokens", the "prior" term (the log prior probability of the positive class minus that
+        of the negative class), the "unseen" term (the total log-ratio of the features that are
+        not in the vocabulary, which all share one log-ratio), the terms that the decision rule
+        of the strategy adds (e.g. "lengthBias", see strategies.Strategy.explainTerms()), and
+        the k features pushing hardest toward each class:  "positive" and "negative" lists of (feature, contribution) pairs, strongest first
+        (in word order among equal ones).  The contribution of a feature is its log-ratio (its
+        positive minus its negative log conditional probability, from the precomputed log
+        probability table) times the number of times it occurs, so the score is the sum of the
+        terms and of the contributions of all the features (up to rounding).  Explaining costs
+        about as much as classify():  one table lookup per feature, and a partial sort of the
+        distinct ones.'''
+
+        lTokens = self.tokenize(sText, True)
+        log_final_prob_positive, log_final_prob_negative = self.logFinalProbs(lTokens)
+        sLabel, fScore = self.labelScore(log_final_prob_positive, log_final_prob_negative, len(lTokens))
+
+        dLogProbs = self._logProbTable
+        if self._tokenCache is not None and not isinstance(dLogProbs, dict):
+            dLogProbs = lrucache.CachedLookup(dLogProbs, self._tokenCache)
+
+        # Sum the Log-Ratios of Each Distinct Feature (and of the Unseen Features, Found by the
+        # Identity of their Default, which the Token Cache Stores as Given)
+        dContributions = {}
+        fUnseen = 0.0
+        tUnseenLogProbs = self._unseenLogProbs
+        fUnseenRatio = tUnseenLogProbs[0] - tUnseenLogProbs[1]
+        for word in self.extractFeatures(lTokens):
+            tLogProbs = dLogProbs.get(word, tUnseenLogProbs)
+            if tLogProbs is tUnseenLogProbs:
+                fUnseen = fUnseen + fUnseenRatio
+            else:
+                dContributions[word] = dContributions.get(word, 0.0) + (tLogProbs[0] - tLogProbs[1])
+
+        # The Top k of Each Sign
+        lPositive = heapq.nsmallest(k, (tWord for tWord in dContributions.items() if tWord[1] > 0), key = lambda tWord: (-tWord[1], tWord[0]))
+        lNegative = heapq.nsmallest(k, (tWord for tWord in dContributions.items() if tWord[1] < 0), key = lambda tWord: (tWord[1], tWord[0]))
+        return self.makeExplanation(sLabel, fScore, len(lTokens), fUnseen, lPositive, lNegative)
+
+
+    def explainBatch(self, lTexts, k = 10):
+        '''Bulk version of explain():  returns the list of the explanations of a list of target
+        strings, computed in one vectorized pass (requires NumPy; without it, the strings are
+        explained one at a time).  The features of the batch are laid out as in
+        tokenBatchLogFinalProbs(), which also gives the labels and scores; the contributions of
+        the distinct features of every document are then summed at once, with one bincount of
+        their log-ratios (precomputed per word, see buildLogProbArrays()), and ranked at once,
+        with one sort of all of them by document, sign and strength.  The results are the same
+        as those of explain().'''
+
+        if numpy is None:
+            return [self.explain(sText, k) for sText in lTexts]
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+
+        # Lay the Batch Out as One Run of Features
+        lBatchTokens   = []
+        lLengths       = []
+        lFeatureCounts = []
+        for sText in lTexts:
+            lTokens = self.tokenize(sText, True)
+            lFeatures = self.extractFeatures(lTokens)
+            lBatchTokens.extend(lFeatures)
+            lLengths.append(len(lTokens))
+            lFeatureCounts.append(len(lFeatures))
+        iDocs    = len(lLengths)
+        aLengths = numpy.array(lLengths, dtype = numpy.intp)
+        aDocIds  = numpy.repeat(numpy.arange(iDocs), numpy.array(lFeatureCounts, dtype = numpy.intp))
+
+        # Vocabulary Ids (the Vocabulary Size for Unseen Features), Log Probabilities and Log-Ratios
+        if not isinstance(self._logProbTable, dict):
+            oModel = self._logProbTable
+            iUnseenId = len(oModel.vocabulary)
+            aTokenIds = oModel.tokenIds(lBatchTokens)
+            aTokenPositiveLogProbs, aTokenNegativeLogProbs = oModel.idLogProbs(aTokenIds)
+            aTokenRatios = aTokenPositiveLogProbs - aTokenNegativeLogProbs
+            aTokenIds[aTokenIds < 0] = iUnseenId
+            lookupWord = oModel.vocabulary.__getitem__
+        else:
+            dVocabIds, aPositiveLogProbs, aNegativeLogProbs, aLogRatios, lWords = self.buildLogProbArrays()
+            iUnseenId = len(lWords)
+            aTokenIds = numpy.array([dVocabIds.get(word, iUnseenId) for word in lBatchTokens], dtype = numpy.intp)
+            aTokenPositiveLogProbs = aPositiveLogProbs[aTokenIds]
+            aTokenNegativeLogProbs = aNegativeLogProbs[aTokenIds]
+            aTokenRatios = aLogRatios[aTokenIds]
+            lookupWord = lWords.__getitem__
+
+        # Labels and Scores (as in tokenBatchLogFinalProbs() and classifyBatch())
+        log_prior_prob_positive, log_prior_prob_negative = self._logPriorProbs
+        aPositive = numpy.bincount(aDocIds, weights = aTokenPositiveLogProbs, minlength = iDocs) + log_prior_prob_positive
+        aNegative = numpy.bincount(aDocIds, weights = aTokenNegativeLogProbs, minlength = iDocs) + log_prior_prob_negative
+        lLabels = self.labelBatch(aPositive, aNegative, aLengths, True)
+
+        # Contributions of the Distinct (Document, Feature) Pairs, in Document Order (the Unseen Features as One Pair)
+        iStride = iUnseenId + 1
+        aKeys, aInverse = numpy.unique(aDocIds * iStride + aTokenIds, return_inverse = True)
+        aContributions = numpy.bincount(aInverse, weights = aTokenRatios, minlength = len(aKeys))
+        aKeyDocs = aKeys // iStride
+        aKeyIds  = aKeys % iStride
+        bUnseen  = aKeyIds == iUnseenId
+        aUnseen  = numpy.zeros(iDocs)
+        aUnseen[aKeyDocs[bUnseen]] = aContributions[bUnseen]
+        lUnseen  = aUnseen.tolist()
+
+        # Rank the Pairs of All the Documents at Once:  in Each Document, the Positive Pairs, Strongest First, then the
+        # Negative Ones, Strongest First, then the Rest (Lowest Id, i.e. Word Order, First among Equal Ones)
+        aGroups = numpy.where(bUnseen | (aContributions == 0), 2, numpy.where(aContributions > 0, 0, 1))
+        aOrder  = numpy.lexsort((aKeyIds, -numpy.abs(aContributions), aGroups, aKeyDocs))
+        lIds    = aKeyIds[aOrder].tolist()
+        lValues = aContributions[aOrder].tolist()
+        lStarts = numpy.searchsorted(aKeyDocs, numpy.arange(iDocs)).tolist()
+        lPositiveCounts = numpy.bincount(aKeyDocs[aGroups == 0], minlength = iDocs).tolist()
+        lNegativeCounts = numpy.bincount(aKeyDocs[aGroups == 1], minlength = iDocs).tolist()
+
+        # The Top k of Each Sign
+        lExplanations = []
+        for iDoc, (sLabel, fScore) in enumerate(lLabels):
+            iStart, iEnd = lStarts[iDoc], lStarts[iDoc] + min(lPositiveCounts[iDoc], k)
+            lPositive = [(lookupWord(iId), fValue) for iId, fValue in zip(lIds[iStart:iEnd], lValues[iStart:iEnd])]
+            iStart = lStarts[iDoc] + lPositiveCounts[iDoc]
+            iEnd   = iStart + min(lNegativeCounts[iDoc], k)
+            lNegative = [(lookupWord(iId), fValue) for iId, fValue in zip(lIds[iStart:iEnd], lValues[iStart:iEnd])]
+            lExplanations.append(self.makeExplanation(sLabel, fScore, lLengths[iDoc], lUnseen[iDoc], lPositive, lNegative))
+        return lExplanations
+
+
+    def makeExplanation(self, sLabel, fScore, iTokens, fUnseen, lPositive, lNegative):
+        '''Returns the dictionary of explain(), given its parts.'''
+
+        dExplanation = {"label": sLabel, "score": fScore, "tokens": iTokens,
+                        "prior": self._logPriorProbs[0] - self._logPriorProbs[1]}
+        dExplanation.update(self._strategy.explainTerms(iTokens))
+        dExplanation.update({"unseen": fUnseen, "positive": lPositive, "negative": lNegative})
+        return dExplanation
+
+
+    def mostDiscriminative(self, k = 20):
+        '''Returns the k words of the vocabulary that most favor each class:  a dictionary of
+        "positive" and "negative" lists of (word, log-ratio) pairs, strongest first, where the
+        log-ratio of a word is its positive minus its negative log conditional probability
+        (words of equal log-ratio are listed in word order).
+        With NumPy, the words are ranked by a partial sort of the log-ratio vector (see
+        topIndices()), whose result is kept as an index, so later queries for as many words or
+        fewer are answered from it, until the counts change; a larger k deepens the index.'''
+
+        if self._logProbTable is None:
+            self.buildLogProbTable()
+
+        if numpy is None:
+            if isinstance(self._logProbTable, dict):
+                iterLogProbs = self._logProbTable.items()
+            else:
+                iterLogProbs = ((word, self._logProbTable.get(word)) for word in self._logProbTable.vocabulary)
+            lRatios = [(word, tLogProbs[0] - tLogProbs[1]) for word, tLogProbs in iterLogProbs]
+            return {"positive": heapq.nsmallest(k, (tWord for tWord in lRatios if tWord[1] > 0), key = lambda tWord: (-tWord[1], tWord[0])),
+                    "negative": heapq.nsmallest(k, (tWord for tWord in lRatios if tWord[1] < 0), key = lambda tWord: (tWord[1], tWord[0]))}
+
+        # Build (or Deepen) the Partial-Sort Index of the Log-Ratios
+        if self._ratioIndex is None or self._ratioIndex[0] < k:
+            if not isinstance(self._logProbTable, dict):
+                aLogRatios, lookupWord = self._logProbTable.logRatios(), self._logProbTable.vocabulary.__getitem__
+            else:
+                lArrays = self.buildLogProbArrays()
+                aLogRatios, lookupWord = lArrays[3][:-1], lArrays[4].__getitem__
+            iDepth = max(k, 2 * self._ratioIndex[0] if self._ratioIndex is not None else 0, 100)
+            self._ratioIndex = (iDepth, topIndices(aLogRatios, iDepth), topIndices(-aLogRatios, iDepth), aLogRatios, lookupWord)
+
+        iDepth, aPositiveOrder, aNegativeOrder, aLogRatios, lookupWord = self._ratioIndex
+        return {"positive": [(lookupWord(iId), aLogRatios[iId]) for iId in aPositiveOrder[:k].tolist() if aLogRatios[iId] > 0],
+                "negative": [(lookupWord(iId), aLogRatios[iId]) for iId in aNegativeOrder[:k].tolist() if aLogRatios[iId] < 0]}
+
+
+    def loadFile(self, sFilename):
+        '''Given a file name, return the contents of the file as a string (decoded from
+        UTF-8, as the reviews of a corpus are, see corpus.readText()).'''
+
+        return corpus.readText(sFilename)
+
+    def save(self, dObj, sFilename):
+        '''Given an object and a file name, write the object to the file using pickle.'''
+
+        f = open(sFilename, "wb")
+        p = pickle.Pickler(f)
+        p.dump(dObj)
+        f.close()
+
+    def load(self, sFilename):
+        '''Given a file name, load and return the object stored in the file.  Trained models
+        in the binary model format are read with modelfile.readModel(); anything else (e.g.
+        a database saved by an earlier version) is unpickled (see modelfile.readDatabase()).'''
+
+        if modelfile.isModelFile(sFilename):
+            return modelfile.readModel(sFilename)
+
+        return modelfile.readDatabase(sFilename)
+
+    def tokenize(self, sText, bLowercase = False):
+        '''Given a string of text sText, returns a list of the individual tokens that
+        occur in that string (in order).  A token is either a run of (Unicode) letters,
+        digits, apostrophes, underscores and hyphens, or any other single non-whitespace
+        character, with any combining marks that follow it in a word.  The text is normalized
+        to NFC first (see normalizeText()).  If bLowercase is set, the tokens are lowercased
+        once they are found (lowercasing can change the length of the text, e.g. of "İ").'''
+
+        # Time the Call, and Count the Tokens (if Instrumentation is Enabled)
+        oMetrics = self._metrics
+        if oMetrics is not None:
+            fStart = time.time()
+            lTokens = tokenizeText(sText, bLowercase)
+            oMetrics.observe("tokenize", time.time() - fStart)
+            oMetrics.count("tokenize.chars", len(sText))
+            oMetrics.count("tokenize.tokens", len(lTokens))
+            return lTokens
+
+        return tokenizeText(sText, bLowercase)
+
+    def iterTokens(self, sText, bLowercase = False):
+        '''Generator version of tokenize(), which yields the tokens of sText one at a
+        time, rather than building the full list in memory.'''
+
+        for mToken in TOKEN_PATTERN.finditer(normalizeText(sText)):
+            yield mToken.group().lower() if bLowercase else mToken.group()
+
+    def extractFeatures(self, lTokens):
+        '''Given a list of (lowercased) tokens, returns the list of their features:  the
+        tokens themselves for a unigram model, and otherwise their n-grams, up to ngrams long,
+        hashed into hashBuckets buckets if hashBuckets > 0 (see features.extract()).'''
+
+        return extractFeatures(lTokens, self.ngrams, self.hashBuckets)
@@ -0,0 +1,66 @@
+'''N-gram features for Bayes_Classifier:  the features of a review are its (lowercased) tokens,
+and, with ngrams > 1, every run of up to ngrams consecutive tokens, joined by a space (e.g.
+"not good"; tokens hold no whitespace, so a joined n-gram is never mistaken for a token).
+
+With hashBuckets > 0, the features are hashed into a fixed number of buckets, each named by
+"#" and its number in hex, so the vocabulary (and the count arrays of vocabulary.CountTable)
+holds at most hashBuckets entries however many n-grams the corpus has; features that share a
+bucket share its counts.  Single-character tokens (mostly punctuation, which bayesbest.py
+weights on its own) are few, and are kept as they are.  The hash is CRC-32 of the UTF-8
+encoding of the feature, which is fast and, unlike hash(), the same on every platform and
+interpreter, as saved models require.'''
+
+import zlib
+
+BUCKET_PREFIX = "#" # Cannot Start a Longer Token, so Bucket Names are Never Tokens
+
+
+def ngrams(lTokens, iMaxN = 1, iStart = 0):
+    '''Returns the n-grams of lTokens, for n = 1 to iMaxN (unigrams first, then bigrams, and
+    so on, each in text order), that end at or after position iStart:  the tokens before it
+    are only the context of the first n-grams (e.g. the end of the previous chunk).'''
+
+    lFeatures = lTokens[iStart:]
+    for n in range(2, iMaxN + 1):
+        iFirst = max(iStart - n + 1, 0)
+        lFeatures.extend(map(" ".join, zip(*[lTokens[iFirst + i:] for i in range(n)])))
+    return lFeatures
+
+
+def hashFeatures(lFeatures, iBuckets):
+    '''Returns the bucket names of a list of features (see above).'''
+
+    crc32 = zlib.crc32
+    sFormat = BUCKET_PREFIX + "%x"
+    return [sFormat % (crc32(sFeature.encode("utf-8")) % iBuckets) if len(sFeature) > 1 else sFeature
+            for sFeature in lFeatures]
+
+
+def extract(lTokens, iMaxN = 1, iBuckets = 0, iStart = 0):
+    '''Returns the features of a list of tokens:  its n-grams, for n = 1 to iMaxN (see
+    ngrams()), hashed into iBuckets buckets if iBuckets > 0.  With the default (unigram,
+    unhashed) settings, this is lTokens itself.'''
+
+    if iMaxN > 1:
+        lFeatures = ngrams(lTokens, iMaxN, iStart)
+    else:
+        lFeatures = lTokens[iStart:] if iStart else lTokens
+    if iBuckets > 0:
+        lFeatures = hashFeatures(lFeatures, iBuckets)
+    return lFeatures
+
+
+def iterChunkFeatures(iTokenLists, iMaxN = 1, iBuckets = 0):
+    '''Yields (tokens, features) for each list of tokens of a text read in chunks (see
+    corpus.iterChunkTokens()).  The last iMaxN - 1 tokens of a chunk are carried over as the
+    context of the next one, so the n-grams that span two chunks are counted once, and the
+    result is the same as extracting the features of the whole text at once.'''
+
+    lContext = []
+    for lTokens in iTokenLists:
+        if iMaxN > 1:
+            lWindow = lContext + lTokens
+            yield lTokens, extract(lWindow, iMaxN, iBuckets, len(lContext))
+            lContext = lWindow[-(iMaxN - 1):]
+        else:
+            yield lTokens, extract(lTokens, 1, iBuckets)
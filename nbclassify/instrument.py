@@ -0,0 +1,311 @@
+'''Instrumentation for Bayes_Classifier:  counters and timing histograms of its stages (see
+Bayes_Classifier.enableMetrics()), exported as JSON or in the Prometheus text format, and
+profilers that wrap a whole run.
+
+Instrumentation is off by default.  The classifier then holds no Metrics, and each
+instrumented stage only tests for one, so the hot paths (tokenize(), classify(), ...) cost
+the same as before.  Enabled, a stage costs two clock reads and a histogram update.
+
+Any script can be run under a profiler, which prints the functions taking the most time
+when it ends (to stderr):
+
+    python -m nbclassify.instrument [--profile cprofile | sample] [--top 25] script.py [args ...]
+
+cprofile is deterministic (every call is timed, which slows the many small calls down);
+sample is a statistical profiler, which samples the stack every millisecond of CPU time
+(Unix only), and barely slows the run down.
+'''
+
+import argparse, bisect, collections, cProfile, json, math, os, pstats, signal, sys, threading
+
+# Timing Histogram Bounds (Seconds):  Four per Decade, from 1 Microsecond to 100 Seconds
+BUCKETS = tuple(float("%.3g" % (10.0 ** (iQuarter / 4.0))) for iQuarter in range(-24, 9))
+
+
+class Histogram(object):
+    '''Distribution of timings (in seconds), in fixed buckets:  the number of observations up
+    to each bound in bounds, and beyond the last one, as in a Prometheus histogram; with
+    their count, sum, minimum and maximum.'''
+
+    def __init__(self, lBounds = BUCKETS):
+        self.bounds = lBounds
+        self.counts = [0] * (len(lBounds) + 1)
+        self.count  = 0
+        self.sum    = 0.0
+        self.min    = None
+        self.max    = None
+
+    def observe(self, fValue):
+        '''Adds one observation.'''
+
+        self.counts[bisect.bisect_left(self.bounds, fValue)] += 1
+        self.count = self.count + 1
+        self.sum = self.sum + fValue
+        if self.min is None or fValue < self.min:
+            self.min = fValue
+        if self.max is None or fValue > self.max:
+            self.max = fValue
+
+    def quantile(self, fQuantile):
+        '''Returns an estimate of the given quantile (e.g. 0.99), interpolated within its bucket
+        (and bounded by the minimum and maximum), or None if there are no observations.'''
+
+        if not self.count:
+            return None
+        fRank = fQuantile * self.count
+        iBelow = 0
+        for i, iCount in enumerate(self.counts):
+            if iCount and iBelow + iCount >= fRank:
+                fLower = max(self.bounds[i - 1] if i > 0 else self.min, self.min)
+                fUpper = min(self.bounds[i] if i < len(self.bounds) else self.max, self.max)
+                return fLower + (fUpper - fLower) * max(fRank - iBelow, 0) / iCount
+            iBelow = iBelow + iCount
+        return self.max
+
+    def snapshot(self):
+        '''Returns the histogram as a dictionary:  its count, sum, minimum, maximum and mean,
+        the 50th, 90th and 99th percentiles, and the cumulative [bound, count] buckets.'''
+
+        lBuckets = []
+        iTotal = 0
+        for fBound, iCount in zip(list(self.bounds) + ["+Inf"], self.counts):
+            iTotal = iTotal + iCount
+            lBuckets.append([fBound, iTotal])
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+                "buckets": lBuckets}
+
+    def absorb(self, dSnapshot):
+        '''Adds the observations of a snapshot of another histogram (with the same bounds).'''
+
+        iPrevious = 0
+        for i, (fBound, iTotal) in enumerate(dSnapshot["buckets"]):
+            self.counts[i] = self.counts[i] + iTotal - iPrevious
+            iPrevious = iTotal
+        self.count = self.count + dSnapshot["count"]
+        self.sum = self.sum + dSnapshot["sum"]
+        if dSnapshot["count"]:
+            self.min = dSnapshot["min"] if self.min is None else min(self.min, dSnapshot["min"])
+            self.max = dSnapshot["max"] if self.max is None else max(self.max, dSnapshot["max"])
+
+
+class Metrics(object):
+    '''Named counters and timing histograms, safe to update from several threads.  Names are
+    dotted (e.g. "score.features"); the Prometheus export turns the dots into underscores.'''
+
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._counters   = {}
+        self._histograms = {}
+
+    def count(self, sName, iValue = 1):
+        '''Adds iValue to the counter sName.'''
+
+        with self._lock:
+            self._counters[sName] = self._counters.get(sName, 0) + iValue
+
+    def observe(self, sName, fSeconds):
+        '''Adds a timing, in seconds, to the histogram sName.'''
+
+        with self._lock:
+            oHistogram = self._histograms.get(sName)
+            if oHistogram is None:
+                oHistogram = self._histograms[sName] = Histogram()
+            oHistogram.observe(fSeconds)
+
+    def counter(self, sName):
+        '''Returns the value of the counter sName (0 if it was never counted).'''
+
+        return self._counters.get(sName, 0)
+
+    def reset(self):
+        '''Clears every counter and histogram.'''
+
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        '''Returns the counters and the histograms (see Histogram.snapshot()) as a dictionary
+        of plain values, which can be pickled (e.g. from a worker process, see absorb()) or
+        written as JSON.'''
+
+        with self._lock:
+            return {"counters": dict(self._counters),
+                    "histograms": dict((sName, oHistogram.snapshot()) for sName, oHistogram in self._histograms.items())}
+
+    def absorb(self, dSnapshot):
+        '''Adds the counters and histograms of a snapshot (e.g. of a worker process) to these.'''
+
+        with self._lock:
+            for sName, iValue in dSnapshot["counters"].items():
+                self._counters[sName] = self._counters.get(sName, 0) + iValue
+            for sName, dHistogram in dSnapshot["histograms"].items():
+                oHistogram = self._histograms.get(sName)
+                if oHistogram is None:
+                    oHistogram = self._histograms[sName] = Histogram()
+                oHistogram.absorb(dHistogram)
+
+    def export(self, sFormat = "json", dCounters = None, dGauges = None):
+        '''Returns the metrics as text, in sFormat:  "json", or "prometheus" (the Prometheus
+        text exposition format, with the names prefixed by "bayes_", histograms in seconds, and
+        counters suffixed by "_total").  dCounters and dGauges are extra values to include, e.g.
+        those kept elsewhere (the cache counters) or derived (rates).'''
+
+        dSnapshot = self.snapshot()
+        dSnapshot["counters"].update(dCounters or {})
+        dSnapshot["gauges"] = dict(dGauges or {})
+        if sFormat == "json":
+            return json.dumps(dSnapshot, indent = 2, sort_keys = True) + "\n"
+        if sFormat != "prometheus":
+            raise ValueError("unknown metrics format: %s" % sFormat)
+
+        lLines = []
+        for sName, iValue in sorted(dSnapshot["counters"].items()):
+            sMetric = prometheusName(sName) + "_total"
+            lLines.extend(["# TYPE %s counter" % sMetric, "%s %s" % (sMetric, prometheusValue(iValue))])
+        for sName, fValue in sorted(dSnapshot["gauges"].items()):
+            sMetric = prometheusName(sName)
+            lLines.extend(["# TYPE %s gauge" % sMetric, "%s %s" % (sMetric, prometheusValue(fValue))])
+        for sName, dHistogram in sorted(dSnapshot["histograms"].items()):
+            sMetric = prometheusName(sName) + "_seconds"
+            lLines.append("# TYPE %s histogram" % sMetric)
+            for fBound, iTotal in dHistogram["buckets"]:
+                lLines.append('%s_bucket{le="%s"} %d' % (sMetric, prometheusValue(fBound), iTotal))
+            lLines.extend(["%s_sum %s" % (sMetric, prometheusValue(dHistogram["sum"])), "%s_count %d" % (sMetric, dHistogram["count"])])
+        return "\n".join(lLines) + "\n"
+
+
+def prometheusName(sName):
+    '''Returns the Prometheus metric name of a dotted metric name.'''
+
+    return "bayes_" + "".join(c if c.isalnum() else "_" for c in sName)
+
+
+def prometheusValue(value):
+    '''Formats a number (or "+Inf") as a Prometheus sample value.'''
+
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and (math.isinf(value) or math.isnan(value)):
+        return {True: "+Inf", False: "-Inf"}[value > 0] if math.isinf(value) else "NaN"
+    return repr(value)
+
+
+def writeMetrics(sFilename, oClassifier):
+    '''Writes the metrics of a classifier (see Bayes_Classifier.exportMetrics()) to sFilename,
+    in the Prometheus text format if its name ends in .prom, and as JSON otherwise.'''
+
+    with open(sFilename, "w") as fh:
+        fh.write(oClassifier.exportMetrics("prometheus" if sFilename.endswith(".prom") else "json"))
+
+
+class SamplingProfiler(object):
+    '''Statistical profiler:  interrupts the process every interval seconds of CPU time (with
+    SIGPROF), and counts the function running in the main thread ("self" samples) and every
+    function on its stack ("total" samples).  Unix only; must be started from the main thread.
+    The interrupts are only taken between bytecodes, so the time spent in a call into C (e.g.
+    a regular expression) is counted in the Python function that made it.'''
+
+    def __init__(self, fInterval = 0.001):
+        self.interval     = fInterval
+        self.samples      = 0
+        self.selfSamples  = collections.Counter()
+        self.totalSamples = collections.Counter()
+
+    def start(self):
+        '''Starts sampling.'''
+
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        '''Stops sampling.'''
+
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def sample(self, iSignal, oFrame):
+        '''SIGPROF handler:  records the stack of the interrupted frame.'''
+
+        self.samples = self.samples + 1
+        self.selfSamples[frameName(oFrame)] += 1
+        setSeen = set()
+        while oFrame is not None:
+            sName = frameName(oFrame)
+            if sName not in setSeen:
+                setSeen.add(sName)
+                self.totalSamples[sName] += 1
+            oFrame = oFrame.f_back
+
+    def report(self, iTop = 25, fh = None):
+        '''Writes the iTop functions with the most self samples to fh (default stderr), with
+        their share of the self and total samples.'''
+
+        fh = fh or sys.stderr
+        fh.write("%d samples, every %g ms of CPU time\n\n" % (self.samples, 1000 * self.interval))
+        fh.write("%7s %7s  %s\n" % ("self%", "total%", "function"))
+        for sName, iSamples in self.selfSamples.most_common(iTop):
+            fh.write("%7.1f %7.1f  %s\n" % (100.0 * iSamples / self.samples, 100.0 * self.totalSamples[sName] / self.samples, sName))
+
+
+def frameName(oFrame):
+    '''Returns the name of the function of a frame, as pstats prints it:  file:line(function).'''
+
+    oCode = oFrame.f_code
+    return "%s:%d(%s)" % (os.path.basename(oCode.co_filename), oCode.co_firstlineno, oCode.co_name)
+
+
+def profile(fCall, sMode = "cprofile", iTop = 25, fh = None, fInterval = 0.001):
+    '''Runs fCall() under a profiler, sMode "cprofile" (deterministic) or "sample" (see
+    SamplingProfiler), writes the iTop functions taking the most time (excluding the
+    functions they call) to fh (default stderr), and returns the result of fCall().  The
+    report is written even if fCall() raises.'''
+
+    fh = fh or sys.stderr
+    if sMode == "cprofile":
+        oProfiler = cProfile.Profile()
+        oProfiler.enable()
+        try:
+            return fCall()
+        finally:
+            oProfiler.disable()
+            pstats.Stats(oProfiler, stream = fh).sort_stats("tottime").print_stats(iTop)
+    elif sMode == "sample":
+        oProfiler = SamplingProfiler(fInterval)
+        oProfiler.start()
+        try:
+            return fCall()
+        finally:
+            oProfiler.stop()
+            oProfiler.report(iTop, fh)
+    else:
+        raise ValueError("unknown profiler: %s" % sMode)
+
+
+def runScript(sScript, lArgs):
+    '''Runs a Python script as the main program (as "python script args" would), with
+    sys.argv set to its arguments.'''
+
+    sys.argv = [sScript] + list(lArgs)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(sScript)))
+    dGlobals = {"__name__": "__main__", "__file__": sScript, "__builtins__": __builtins__}
+    with open(sScript) as fh:
+        exec(compile(fh.read(), sScript, "exec"), dGlobals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run a script under a profiler, and print the functions taking the most time.")
+    parser.add_argument("--profile", choices = ["cprofile", "sample"], default = "cprofile", help = "profiler (default: cprofile)")
+    parser.add_argument("--top", type = int, default = 25, help = "functions to print (default: 25)")
+    parser.add_argument("--interval", type = float, default = 1.0, help = "sampling interval, in ms of CPU time (default: 1)")
+    parser.add_argument("script", help = "script to run")
+    parser.add_argument("args", nargs = argparse.REMAINDER, help = "arguments of the script")
+    args = parser.parse_args()
+
+    try:
+        profile(lambda: runScript(args.script, args.args), args.profile, args.top, sys.stderr, args.interval / 1000.0)
+    except SystemExit as e:
+        if e.code not in [None, 0]:
+            raise
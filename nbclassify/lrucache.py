@@ -0,0 +1,77 @@
+'''Size-bounded, least-recently-used caches for Bayes_Classifier (see enableCache()).'''
+
+import collections, hashlib
+
+
+def textKey(sText):
+    '''Returns the cache key of a review text:  a digest of the text, so that the cache does
+    not hold on to the (possibly long) texts themselves.'''
+
+    return hashlib.sha1(sText.encode("utf-8", "surrogatepass")).digest()
+
+
+class LRUCache(object):
+    '''A cache of at most maxSize entries, which evicts the least recently used entry when
+    it is full, and counts its hits, misses and evictions.'''
+
+    def __init__(self, maxSize):
+        self.maxSize   = maxSize
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self._entries  = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default = None):
+        '''Returns the value cached for key (marking it as the most recently used), or
+        default if key is not in the cache.'''
+
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses = self.misses + 1
+            return default
+        self._entries[key] = value
+        self.hits = self.hits + 1
+        return value
+
+    def put(self, key, value):
+        '''Caches value for key, evicting the least recently used entry if the cache is full.'''
+
+        if key in self._entries:
+            del self._entries[key]
+        elif len(self._entries) >= self.maxSize:
+            self._entries.popitem(last = False)
+            self.evictions = self.evictions + 1
+        self._entries[key] = value
+
+    def clear(self):
+        '''Empties the cache (e.g. when the model it was computed from changes).'''
+
+        self._entries.clear()
+
+    def stats(self):
+        '''Returns the size and counters of the cache, as a dictionary.'''
+
+        return {"size": len(self._entries), "maxSize": self.maxSize,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class CachedLookup(object):
+    '''Puts an LRUCache in front of the get() of a slower lookup table (e.g. the binary
+    search of a memory-mapped model).'''
+
+    MISSING = object()
+
+    def __init__(self, oTable, oCache):
+        self._table = oTable
+        self._cache = oCache
+
+    def get(self, key, default = None):
+        value = self._cache.get(key, self.MISSING)
+        if value is self.MISSING:
+            value = self._table.get(key, default)
+            self._cache.put(key, value)
+        return value
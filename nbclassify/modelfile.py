@@ -0,0 +1,738 @@
+'''Reads and writes trained Bayes_Classifier models in a compact, versioned binary
+format, which replaces the protocol-0 pickle "database" written by earlier versions.
+
+File layout (all values little-endian):
+
+    header      magic, format version, count type ("q" = int64 or "d" = float64),
+                number of positive / negative docs, number of positive / negative
+                words, vocabulary size, vocabulary size in bytes
+    fingerprint the hex fingerprint of the training set the model was trained on
+                (see corpus.fingerprint()), or NULs if unknown
+    features    the longest n-gram and the number of hash buckets (0 if the features
+                are not hashed) of the features (see features.py)
+    vocabulary  the sorted vocabulary, its words concatenated (padded to a multiple
+                of 8 bytes); each word is encoded in UTF-8, whose byte order is the
+                order of the words themselves
+    offsets     the byte offset of each word in the vocabulary, and the end of the
+                last one: vocabulary size + 1 4-byte values (padded to a multiple of
+                8 bytes)
+    arrays      positive counts, negative counts, positive log probabilities and
+                negative log probabilities: one 8-byte value per vocabulary word
+
+Every section sits at a fixed offset computed from the header, so the arrays can be
+read with numpy.frombuffer (or mapped with mmap) without building a Python object per
+entry, and the sorted vocabulary can be binary searched in place, through its offsets.
+Only files of the current format version are read; other versions raise ValueError.
+
+The words of pickle databases (written by the Python 2 versions of the classifier) are the raw
+bytes of the reviews they were read from.  They are read as Latin-1, so that every byte is one
+character:  distinct words stay distinct and in sorted order, and ASCII words, which are all of
+the words of a corpus in ASCII, read just as they did (see convertDatabase()).
+
+The K-class models of ratings.py are saved in a format of the same design:
+
+    header      magic, format version, count type, number of classes K, vocabulary size,
+                vocabulary size in bytes
+    fingerprint the hex fingerprint of the training set, or NULs if unknown
+    features    the longest n-gram and the number of hash buckets of the features
+    classes     the ratings of the classes, their numbers of docs and their numbers of
+                words: K 8-byte values each
+    vocabulary  as above
+    offsets     as above
+    counts      the K x V count matrix, one row of V 8-byte values per class
+
+Run this module as a script (or "nbclassify migrate", see cli.py) to convert an existing
+pickle database:
+
+    python -m nbclassify.modelfile database [output]
+'''
+
+import array, bisect, collections.abc, math, mmap, os, pickle, struct, sys, tempfile
+from . import vocabulary
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC       = b"NBCM"
+VERSION     = 5
+HEADER      = struct.Struct("<4sHcxqqddqq")
+FINGERPRINT = struct.Struct("<40s")
+FEATURES    = struct.Struct("<II")
+
+RATING_MAGIC   = b"NBRK"
+RATING_VERSION = 3
+RATING_HEADER  = struct.Struct("<4sHcxqqq")
+
+OFFSET      = struct.Struct("<I")  # Offset of a Word in the Vocabulary
+WORD_BOUNDS = struct.Struct("<II") # Offsets of a Word and of the Next One
+OFFSET_TYPE = "I" if array.array("I").itemsize == 4 else "L"
+
+PREFIX_SLICE = 1 << 14 # Words whose First Blocks are Computed at a Time (see MappedModel.wordPrefixes())
+
+WORD_ENCODING   = "utf-8"   # Encoding of the Words of the Vocabulary
+LEGACY_ENCODING = "latin-1" # Encoding the Words of Pickle Databases are Read with
+
+UMASK = os.umask(0o022)     # Permission Bits Masked Out of New Files (Read by Setting it Back)
+os.umask(UMASK)
+
+
+def isModelFile(sFilename):
+    '''Returns True if the given file is in the binary model format.'''
+
+    with open(sFilename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def readModelHeader(sFilename):
+    '''Returns the header of a model file (see readHeader()), reading only the header, or
+    None if the file is not in the binary model format (e.g. a pickle database).'''
+
+    with open(sFilename, "rb") as f:
+        sBuffer = f.read(HEADER.size + FINGERPRINT.size + FEATURES.size)
+    if not sBuffer.startswith(MAGIC) or len(sBuffer) < HEADER.size + FINGERPRINT.size + FEATURES.size:
+        return None
+    return readHeader(sBuffer)
+
+
+def readFingerprint(sFilename):
+    '''Returns the training set fingerprint stored in a model file, or None if there is none
+    (e.g. a pickle database).'''
+
+    dHeader = readModelHeader(sFilename)
+    return dHeader["fingerprint"] if dHeader is not None else None
+
+
+def encodeWords(lWords):
+    '''Returns the words of lWords encoded as the words of the vocabulary are.  A word that
+    cannot be encoded (one with a lone surrogate, which no vocabulary can hold) becomes the
+    empty string, which is never a word of the vocabulary.'''
+
+    lEncoded = []
+    for word in lWords:
+        try:
+            lEncoded.append(word.encode(WORD_ENCODING))
+        except UnicodeEncodeError:
+            lEncoded.append(b"")
+    return lEncoded
+
+
+def pad8(iSize):
+    '''Rounds iSize up to a multiple of 8 bytes.'''
+
+    return (iSize + 7) & ~7
+
+
+def vocabularyLayout(dHeader, iVocabBytes):
+    '''Adds the layout of the vocabulary to a header (which holds its "vocabSize" and
+    "vocabOffset"), given its size in bytes:  its "vocabBytes" and the offset of its offsets.
+    Returns the offset of the section that follows the vocabulary.'''
+
+    dHeader["vocabBytes"]    = iVocabBytes
+    dHeader["offsetsOffset"] = dHeader["vocabOffset"] + pad8(iVocabBytes)
+    return dHeader["offsetsOffset"] + pad8(OFFSET.size * (dHeader["vocabSize"] + 1))
+
+
+def replaceFile(sFilename, fWrite):
+    '''Writes a file with fWrite(f) to a temporary file in the directory of sFilename, then
+    renames it over sFilename, so that the update is atomic, and processes that have mapped the
+    old file keep a consistent copy of it.  The temporary file has a unique name (so that
+    concurrent writers of the same file never share one; the last rename wins), the
+    permissions a new file would have, and is removed if writing fails.'''
+
+    iHandle, sTempFilename = tempfile.mkstemp(prefix = os.path.basename(sFilename) + ".", suffix = ".tmp",
+                                              dir = os.path.dirname(os.path.abspath(sFilename)))
+    try:
+        with os.fdopen(iHandle, "wb") as f:
+            fWrite(f)
+        os.chmod(sTempFilename, 0o666 & ~UMASK)
+        os.replace(sTempFilename, sFilename)
+    except BaseException:
+        os.remove(sTempFilename)
+        raise
+
+
+def writeVocabulary(f, iRecords, iVocabSize, iVocabBytes):
+    '''Writes the vocabulary section and the offsets section of a model file:  the iVocabSize
+    encoded words yielded by iRecords (whose lengths add up to iVocabBytes), in sorted
+    order, a block at a time, and then their offsets.'''
+
+    if iVocabBytes >= 1 << 32:
+        raise ValueError("the vocabulary is too large for a model file (%d bytes)" % iVocabBytes)
+
+    aOffsets = array.array(OFFSET_TYPE, [0])
+    lRecords = []
+    for sRecord in iRecords:
+        lRecords.append(sRecord)
+        aOffsets.append(aOffsets[-1] + len(sRecord))
+        if len(lRecords) == 4096:
+            f.write(b"".join(lRecords))
+            lRecords = []
+    f.write(b"".join(lRecords))
+    f.write(b"\0" * (pad8(iVocabBytes) - iVocabBytes))
+
+    if sys.byteorder == "big":
+        aOffsets.byteswap()
+    aOffsets.tofile(f)
+    f.write(b"\0" * (pad8(OFFSET.size * (iVocabSize + 1)) - OFFSET.size * (iVocabSize + 1)))
+
+
+def writeModel(sFilename, lDatabase, sFingerprint = None, iNgrams = 1, iHashBuckets = 0):
+    '''Writes a model to sFilename in the binary format.  lDatabase has the layout of the
+    pickle database:  [positive word counts, negative word counts, number of positive
+    docs, number of negative docs, number of positive words, number of negative words];
+    sFingerprint is the fingerprint of the training set, if known, and iNgrams and
+    iHashBuckets the settings of its features (see features.py).
+    The word counts may be the views of a vocabulary.CountTable (as held by a trained
+    Bayes_Classifier), which are then streamed from the table, in sorted order, without
+    building a list or a dictionary of the vocabulary.'''
+
+    dPositiveWords, dNegativeWords, numPositiveDocs, numNegativeDocs, numPositiveWords, numNegativeWords = lDatabase
+
+    # Sorted (Word, Positive Count, Negative Count) Rows of the Vocabulary (Union of Both Classes)
+    oTable = getattr(dPositiveWords, "table", None)
+    if oTable is not None and getattr(dNegativeWords, "table", None) is oTable:
+        iterRows = oTable.iterSortedCounts
+    else:
+        lVocabulary = sorted(set(dPositiveWords) | set(dNegativeWords))
+        iterRows = lambda: ((word, dPositiveWords.get(word,0), dNegativeWords.get(word,0)) for word in lVocabulary)
+
+    # Size of the Vocabulary (in Words and in Bytes), and the Type of the Counts (First Pass)
+    iVocabSize = 0
+    iVocabBytes = 0
+    bIntegers = isinstance(numPositiveWords, int) and isinstance(numNegativeWords, int)
+    for word, positiveCount, negativeCount in iterRows():
+        iVocabSize = iVocabSize + 1
+        iVocabBytes = iVocabBytes + len(word.encode(WORD_ENCODING))
+        bIntegers = bIntegers and isinstance(positiveCount, int) and isinstance(negativeCount, int)
+    sCountType = "q" if bIntegers else "d"
+
+    # Counts, and Log Conditional Probabilities (with Add-One Smoothing, as in classify())
+    sArrayType = vocabulary.INTEGER_TYPE if bIntegers else vocabulary.FLOAT_TYPE
+    lArrays = [array.array(sArrayType), array.array(sArrayType), array.array("d"), array.array("d")]
+    fPositiveTotal = float(numPositiveWords + 1)
+    fNegativeTotal = float(numNegativeWords + 1)
+
+    def iterRecords():
+        '''Yields the encoded words of the vocabulary (Second Pass), collecting the arrays.'''
+
+        for word, positiveCount, negativeCount in iterRows():
+            lArrays[0].append(positiveCount)
+            lArrays[1].append(negativeCount)
+            lArrays[2].append(math.log10(float(positiveCount + 1) / fPositiveTotal))
+            lArrays[3].append(math.log10(float(negativeCount + 1) / fNegativeTotal))
+            yield word.encode(WORD_ENCODING)
+
+    def writeFile(f):
+        '''Writes the header, the vocabulary and the arrays (see above).'''
+
+        f.write(HEADER.pack(MAGIC, VERSION, sCountType.encode("ascii"), numPositiveDocs, numNegativeDocs,
+                            numPositiveWords, numNegativeWords, iVocabSize, iVocabBytes))
+        f.write(FINGERPRINT.pack((sFingerprint or "").encode("ascii")))
+        f.write(FEATURES.pack(iNgrams, iHashBuckets))
+        writeVocabulary(f, iterRecords(), iVocabSize, iVocabBytes)
+
+        for aValues in lArrays:
+            if sys.byteorder == "big":
+                aValues.byteswap()
+            aValues.tofile(f)
+
+    # Written to a Temporary File, then Renamed over the Target
+    replaceFile(sFilename, writeFile)
+
+
+def readHeader(sBuffer):
+    '''Given the contents of a model file (a string, buffer or mmap), returns its header
+    as a dictionary, including the byte offsets of the vocabulary and of each array.'''
+
+    sMagic, iVersion, sCountType, numPositiveDocs, numNegativeDocs, numPositiveWords, numNegativeWords, iVocabSize, iVocabBytes = HEADER.unpack_from(sBuffer, 0)
+    if sMagic != MAGIC:
+        raise ValueError("not a binary model file")
+    if iVersion != VERSION:
+        raise ValueError("unsupported model file version %d (expected %d)" % (iVersion, VERSION))
+
+    sCountType = sCountType.decode("ascii")
+    if sCountType == "q":
+        numPositiveWords = int(numPositiveWords)
+        numNegativeWords = int(numNegativeWords)
+
+    # Training Set Fingerprint, and Feature Settings
+    sFingerprint = FINGERPRINT.unpack_from(sBuffer, HEADER.size)[0].rstrip(b"\0").decode("ascii") or None
+    iNgrams, iHashBuckets = FEATURES.unpack_from(sBuffer, HEADER.size + FINGERPRINT.size)
+    iVocabOffset = HEADER.size + FINGERPRINT.size + FEATURES.size
+
+    dHeader = {"version": iVersion, "countType": sCountType, "fingerprint": sFingerprint,
+               "ngrams": iNgrams, "hashBuckets": iHashBuckets,
+               "numPositiveDocs": numPositiveDocs, "numNegativeDocs": numNegativeDocs,
+               "numPositiveWords": numPositiveWords, "numNegativeWords": numNegativeWords,
+               "vocabSize": iVocabSize, "vocabOffset": iVocabOffset}
+
+    iArrayOffset = vocabularyLayout(dHeader, iVocabBytes)
+    iArraySize   = iVocabSize * 8
+    dHeader.update({"positiveCountsOffset":   iArrayOffset,
+                    "negativeCountsOffset":   iArrayOffset + iArraySize,
+                    "positiveLogProbsOffset": iArrayOffset + 2 * iArraySize,
+                    "negativeLogProbsOffset": iArrayOffset + 3 * iArraySize})
+    return dHeader
+
+
+def readArray(sBuffer, iOffset, iCount, sType):
+    '''Returns iCount 8-byte values of type sType ("q" or "d") stored at iOffset in the
+    buffer:  a NumPy view of the buffer (no copy) if NumPy is available, or else an array.'''
+
+    if numpy is not None:
+        return numpy.frombuffer(sBuffer, dtype = "<" + {"q": "i8", "d": "f8"}[sType], count = iCount, offset = iOffset)
+    return readTypedArray(sBuffer, iOffset, iCount, sType)
+
+
+def readTypedArray(sBuffer, iOffset, iCount, sType):
+    '''Returns iCount 8-byte values of type sType ("q" or "d") stored at iOffset in the
+    buffer, copied into an array (see vocabulary.CountTable).'''
+
+    aValues = array.array({"q": vocabulary.INTEGER_TYPE, "d": vocabulary.FLOAT_TYPE}[sType])
+    aValues.frombytes(sBuffer[iOffset:iOffset + iCount * 8])
+    if sys.byteorder == "big":
+        aValues.byteswap()
+    return aValues
+
+
+def readOffsets(sBuffer, dHeader):
+    '''Returns the offsets of the words of the vocabulary stored in the buffer, and the end
+    of the last one, as an array.'''
+
+    aOffsets = array.array(OFFSET_TYPE)
+    iStart = dHeader["offsetsOffset"]
+    aOffsets.frombytes(sBuffer[iStart:iStart + OFFSET.size * (dHeader["vocabSize"] + 1)])
+    if sys.byteorder == "big":
+        aOffsets.byteswap()
+    return aOffsets
+
+
+def readVocabulary(sBuffer, dHeader):
+    '''Returns the sorted vocabulary stored in the buffer, as a list of (decoded) words.'''
+
+    iOffset = dHeader["vocabOffset"]
+    sWords = sBuffer[iOffset:iOffset + dHeader["vocabBytes"]]
+    aOffsets = readOffsets(sBuffer, dHeader)
+    return [sWords[iStart:iEnd].decode(WORD_ENCODING) for iStart, iEnd in zip(aOffsets, aOffsets[1:])]
+
+
+def readModel(sFilename):
+    '''Reads a binary model file, and returns it in the layout of the pickle database:
+    [positive word counts, negative word counts, number of positive docs, number of
+    negative docs, number of positive words, number of negative words].'''
+
+    with open(sFilename, "rb") as f:
+        sBuffer = f.read()
+
+    dHeader = readHeader(sBuffer)
+    lVocabulary = readVocabulary(sBuffer, dHeader)
+    lPositiveCounts = readArray(sBuffer, dHeader["positiveCountsOffset"], dHeader["vocabSize"], dHeader["countType"]).tolist()
+    lNegativeCounts = readArray(sBuffer, dHeader["negativeCountsOffset"], dHeader["vocabSize"], dHeader["countType"]).tolist()
+
+    # Each Class Only Holds the Words Seen in That Class
+    dPositiveWords = dict((word, count) for word, count in zip(lVocabulary, lPositiveCounts) if count)
+    dNegativeWords = dict((word, count) for word, count in zip(lVocabulary, lNegativeCounts) if count)
+
+    return [dPositiveWords, dNegativeWords, dHeader["numPositiveDocs"], dHeader["numNegativeDocs"],
+            dHeader["numPositiveWords"], dHeader["numNegativeWords"]]
+
+
+def readCountTable(sFilename):
+    '''Reads a binary model file into the compact in-memory form used by Bayes_Classifier,
+    without building a dictionary per class.  Returns a vocabulary.CountTable of the counts,
+    the list [number of positive docs, number of negative docs, number of positive words,
+    number of negative words], and the header (see readHeader(); e.g. the training set
+    fingerprint and the feature settings).  The log conditional probabilities stored in the
+    file are read along with the counts, into the logProbs of the table, so that they are
+    not computed again.'''
+
+    with open(sFilename, "rb") as f:
+        sBuffer = f.read()
+
+    dHeader = readHeader(sBuffer)
+    oTable = vocabulary.CountTable(vocabulary.Vocabulary(readVocabulary(sBuffer, dHeader)),
+                                   {"positive": readTypedArray(sBuffer, dHeader["positiveCountsOffset"], dHeader["vocabSize"], dHeader["countType"]),
+                                    "negative": readTypedArray(sBuffer, dHeader["negativeCountsOffset"], dHeader["vocabSize"], dHeader["countType"])})
+    oTable.logProbs = (readTypedArray(sBuffer, dHeader["positiveLogProbsOffset"], dHeader["vocabSize"], "d"),
+                       readTypedArray(sBuffer, dHeader["negativeLogProbsOffset"], dHeader["vocabSize"], "d"),
+                       dHeader["numPositiveWords"], dHeader["numNegativeWords"])
+
+    return oTable, [dHeader["numPositiveDocs"], dHeader["numNegativeDocs"],
+                    dHeader["numPositiveWords"], dHeader["numNegativeWords"]], dHeader
+
+
+def writeRatingModel(sFilename, lRatings, lDocs, lWords, lVocabulary, lCounts, sFingerprint = None, iNgrams = 1, iHashBuckets = 0):
+    '''Writes a K-class model (see ratings.py) to sFilename, in the rating model format.
+    lRatings, lDocs and lWords hold the rating, the number of docs and the number of words of
+    each class; lVocabulary is the sorted vocabulary, and lCounts the K x V matrix of the
+    (integer) counts of each word in each class (a 2-D NumPy array, or a list of rows).  As
+    with writeModel(), the file is replaced atomically.'''
+
+    iVocabSize = len(lVocabulary)
+    lRecords = [word.encode(WORD_ENCODING) for word in lVocabulary]
+    iVocabBytes = sum(len(sRecord) for sRecord in lRecords)
+    lArrays = [array.array(vocabulary.INTEGER_TYPE, lValues) for lValues in [lRatings, lDocs, lWords]]
+    lArrays.extend(array.array(vocabulary.INTEGER_TYPE, lRow) for lRow in lCounts)
+    if sys.byteorder == "big":
+        for aValues in lArrays:
+            aValues.byteswap()
+
+    def writeFile(f):
+        '''Writes the header, the class arrays, the vocabulary and the count matrix.'''
+
+        f.write(RATING_HEADER.pack(RATING_MAGIC, RATING_VERSION, b"q", len(lRatings), iVocabSize, iVocabBytes))
+        f.write(FINGERPRINT.pack((sFingerprint or "").encode("ascii")))
+        f.write(FEATURES.pack(iNgrams, iHashBuckets))
+        for aValues in lArrays[:3]:
+            aValues.tofile(f)
+        writeVocabulary(f, lRecords, iVocabSize, iVocabBytes)
+
+        for aValues in lArrays[3:]:
+            aValues.tofile(f)
+
+    replaceFile(sFilename, writeFile)
+
+
+def readRatingHeader(sBuffer):
+    '''Given the contents of a rating model file, returns its header as a dictionary,
+    including the byte offsets of the class arrays, the vocabulary and the count matrix.'''
+
+    sMagic, iVersion, sCountType, iClasses, iVocabSize, iVocabBytes = RATING_HEADER.unpack_from(sBuffer, 0)
+    if sMagic != RATING_MAGIC:
+        raise ValueError("not a rating model file")
+    if iVersion != RATING_VERSION:
+        raise ValueError("unsupported rating model file version %d (expected %d)" % (iVersion, RATING_VERSION))
+
+    iNgrams, iHashBuckets = FEATURES.unpack_from(sBuffer, RATING_HEADER.size + FINGERPRINT.size)
+    iClassOffset = RATING_HEADER.size + FINGERPRINT.size + FEATURES.size
+    iVocabOffset = iClassOffset + 3 * iClasses * 8
+
+    dHeader = {"version": iVersion, "countType": sCountType.decode("ascii"),
+               "fingerprint": FINGERPRINT.unpack_from(sBuffer, RATING_HEADER.size)[0].rstrip(b"\0").decode("ascii") or None,
+               "ngrams": iNgrams, "hashBuckets": iHashBuckets, "classes": iClasses,
+               "vocabSize": iVocabSize, "classOffset": iClassOffset, "vocabOffset": iVocabOffset}
+    dHeader["countsOffset"] = vocabularyLayout(dHeader, iVocabBytes)
+    return dHeader
+
+
+def readRatingModelHeader(sFilename):
+    '''Returns the header of a rating model file (see readRatingHeader()), reading only the
+    header, or None if the file is not in the rating model format.'''
+
+    with open(sFilename, "rb") as f:
+        sBuffer = f.read(RATING_HEADER.size + FINGERPRINT.size + FEATURES.size)
+    if not sBuffer.startswith(RATING_MAGIC) or len(sBuffer) < RATING_HEADER.size + FINGERPRINT.size + FEATURES.size:
+        return None
+    return readRatingHeader(sBuffer)
+
+
+def readRatingModel(sFilename):
+    '''Reads a rating model file.  Returns the lists of the ratings, numbers of docs and
+    numbers of words of the classes, the sorted vocabulary (a list of words), the K x V count
+    matrix (a 2-D NumPy array if NumPy is available, or else a list of arrays, one row per
+    class), and the header (with the training set fingerprint and the feature settings).'''
+
+    with open(sFilename, "rb") as f:
+        sBuffer = f.read()
+
+    dHeader = readRatingHeader(sBuffer)
+    iClasses, iVocabSize, sCountType = dHeader["classes"], dHeader["vocabSize"], dHeader["countType"]
+    lRatings, lDocs, lWords = [readTypedArray(sBuffer, dHeader["classOffset"] + i * iClasses * 8, iClasses, "q").tolist() for i in range(3)]
+    if numpy is not None:
+        aCounts = readArray(sBuffer, dHeader["countsOffset"], iClasses * iVocabSize, sCountType).reshape(iClasses, iVocabSize)
+    else:
+        aCounts = [readTypedArray(sBuffer, dHeader["countsOffset"] + i * iVocabSize * 8, iVocabSize, sCountType) for i in range(iClasses)]
+    return lRatings, lDocs, lWords, readVocabulary(sBuffer, dHeader), aCounts, dHeader
+
+
+def wordBlocks(tWords, iBlock):
+    '''Returns block iBlock (bytes 8 * iBlock to 8 * iBlock + 8) of each of the byte strings
+    tWords, given as (bytes, start offsets, lengths) NumPy arrays, as big-endian 64-bit keys
+    (NUL-padded), and the number of bytes left from the start of the block, up to 9.'''
+
+    aBytes, aStarts, aLengths = tWords
+    aColumns = numpy.arange(8)
+    aLeft = aLengths - 8 * iBlock
+    aPositions = numpy.minimum(aStarts[:, None] + (8 * iBlock) + aColumns, len(aBytes) - 1)
+    aBlocks = numpy.where(aColumns < aLeft[:, None], aBytes[aPositions], 0).astype(numpy.uint8)
+    return aBlocks.view(">u8").ravel(), numpy.clip(aLeft, 0, 9)
+
+
+def wordBounds(aWords, aOffsets, aIndices):
+    '''Returns the words at aIndices of a vocabulary given as its bytes and its offsets (NumPy
+    arrays, used in place), as wordBlocks() takes them:  (bytes, start offsets, lengths).'''
+
+    aStarts = aOffsets[aIndices].astype(numpy.intp)
+    return aWords, aStarts, aOffsets[aIndices + 1].astype(numpy.intp) - aStarts
+
+
+def compareWords(tWords, tOthers):
+    '''Compares the byte strings tWords with tOthers, pairwise (both given as for
+    wordBlocks()), and returns a NumPy array of the sign of each comparison (-1 where the
+    word sorts first, as bytes do).  The strings are compared 8 bytes at a time, as
+    big-endian keys, and by their lengths within the block (so a word sorts before the
+    words it is a prefix of); only the pairs still equal after a full block go on to the
+    next block.'''
+
+    aSigns = numpy.zeros(len(tWords[1]), dtype = numpy.intp)
+    aPending = numpy.arange(len(aSigns))
+    iBlock = 0
+    while len(aPending):
+        aKeys, aLeft = wordBlocks((tWords[0], tWords[1][aPending], tWords[2][aPending]), iBlock)
+        aOtherKeys, aOtherLeft = wordBlocks((tOthers[0], tOthers[1][aPending], tOthers[2][aPending]), iBlock)
+        aSign = numpy.where(aKeys != aOtherKeys, numpy.where(aKeys > aOtherKeys, 1, -1), numpy.sign(aLeft - aOtherLeft))
+        aSigns[aPending] = aSign
+        aPending = aPending[(aSign == 0) & (aLeft == 9)]
+        iBlock = iBlock + 1
+    return aSigns
+
+
+class MappedVocabulary(object):
+    '''Read-only sequence view of the sorted vocabulary of a model file, used in place
+    (e.g. from an mmap), so that it can be binary searched with bisect:  each word is found
+    through its offset.  The words are the encoded words themselves unless bDecode is set.'''
+
+    def __init__(self, sBuffer, dHeader, bDecode = True):
+        self._buffer  = sBuffer
+        self._offset  = dHeader["vocabOffset"]
+        self._offsets = dHeader["offsetsOffset"]
+        self._size    = dHeader["vocabSize"]
+        self._decode  = bDecode
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, iIndex):
+        iStart, iEnd = WORD_BOUNDS.unpack_from(self._buffer, self._offsets + OFFSET.size * iIndex)
+        sRecord = self._buffer[self._offset + iStart:self._offset + iEnd]
+        return sRecord.decode(WORD_ENCODING) if self._decode else sRecord
+
+
+class MappedCounts(collections.abc.Mapping):
+    '''Read-only, dictionary-like view of the word counts of one class in a MappedModel.
+    As with the dictionaries of a trained classifier, it only holds the words seen in
+    that class.'''
+
+    def __init__(self, oModel, sClass):
+        self._model = oModel
+        self._class = sClass
+
+    def __getitem__(self, word):
+        iIndex = self._model.index(word)
+        count = self._model.count(self._class, iIndex) if iIndex >= 0 else 0
+        if not count:
+            raise KeyError(word)
+        return count
+
+    def __iter__(self):
+        for iIndex in range(len(self._model.vocabulary)):
+            if self._model.count(self._class, iIndex):
+                yield self._model.vocabulary[iIndex]
+
+    def __len__(self):
+        return sum(1 for word in self)
+
+
+class MappedModel(object):
+    '''A read-only model, memory-mapped from a binary model file.  The vocabulary and the
+    arrays are used in place, so every process that maps the same file shares one copy of
+    the model (through the page cache) instead of building its own dictionaries.  Words
+    are looked up by binary search over the sorted vocabulary.  get() returns the pair of
+    log conditional probabilities of a word, so the model can stand in for the log
+    probability table of Bayes_Classifier.
+
+    Mapping is a tradeoff, not a general win.  Classifying one review at a time is more than
+    10 times slower than with the dictionary of a loaded model (every word is a binary search
+    in Python), and batches are somewhat slower too.  On a model as small as the shipped one,
+    a worker mapping it also uses more memory (a proportional set size of about 1162 KB,
+    against 842 KB when loaded).  Mapping only pays off for very large vocabularies, which
+    would otherwise be copied into every worker:  at 300k words, about 5.4 MB shared against
+    32 MB per process.'''
+
+    def __init__(self, sFilename):
+        with open(sFilename, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        self._header = readHeader(self._buffer)
+        self.vocabulary = MappedVocabulary(self._buffer, self._header)
+        self._records   = MappedVocabulary(self._buffer, self._header, False) # Searched by Encoded Word
+        self._prefixes  = None # First 8 Bytes of Each Word, as Keys (see tokenIds())
+
+        # Class Statistics, the Training Set Fingerprint and the Feature Settings
+        self.fingerprint      = self._header["fingerprint"]
+        self.ngrams           = self._header["ngrams"]
+        self.hashBuckets      = self._header["hashBuckets"]
+        self.numPositiveDocs  = self._header["numPositiveDocs"]
+        self.numNegativeDocs  = self._header["numNegativeDocs"]
+        self.numPositiveWords = self._header["numPositiveWords"]
+        self.numNegativeWords = self._header["numNegativeWords"]
+        self.positiveWords    = MappedCounts(self, "positive")
+        self.negativeWords    = MappedCounts(self, "negative")
+
+        # Log Conditional Probabilities of an Unseen Word, and Log Prior Probabilities (as in classify())
+        self.unseenLogProbs = (math.log10(float(0 + 1) / float(self.numPositiveWords + 1)),
+                               math.log10(float(0 + 1) / float(self.numNegativeWords + 1)))
+        fTotalDocs = float(self.numPositiveDocs + self.numNegativeDocs)
+        self.logPriorProbs = (math.log10(float(self.numPositiveDocs) / fTotalDocs),
+                              math.log10(float(self.numNegativeDocs) / fTotalDocs))
+
+    def index(self, word):
+        '''Returns the index of word in the vocabulary, or -1 if it is not in the vocabulary.'''
+
+        sRecord = encodeWords([word])[0]
+        if not sRecord:
+            return -1
+        iIndex = bisect.bisect_left(self._records, sRecord)
+        if iIndex < len(self._records) and self._records[iIndex] == sRecord:
+            return iIndex
+        return -1
+
+    def count(self, sClass, iIndex):
+        '''Returns the count of the word at iIndex in the given class ("positive" or "negative").'''
+
+        sType = self._header["countType"]
+        return struct.unpack_from("<" + sType, self._buffer, self._header[sClass + "CountsOffset"] + 8 * iIndex)[0]
+
+    def get(self, word, default = None):
+        '''Returns the (positive, negative) log conditional probabilities of word, or default
+        if the word is not in the vocabulary.'''
+
+        iIndex = self.index(word)
+        if iIndex < 0:
+            return default
+        return (struct.unpack_from("<d", self._buffer, self._header["positiveLogProbsOffset"] + 8 * iIndex)[0],
+                struct.unpack_from("<d", self._buffer, self._header["negativeLogProbsOffset"] + 8 * iIndex)[0])
+
+    def tokenLogProbs(self, lTokens):
+        '''Vectorized version of get() (requires NumPy):  returns NumPy arrays of the positive
+        and negative log conditional probabilities of each token in lTokens, using the
+        unseen word values for tokens that are not in the vocabulary.  The vocabulary is
+        searched in place with numpy.searchsorted.'''
+
+        return self.idLogProbs(self.tokenIds(lTokens))
+
+    def tokenIds(self, lTokens):
+        '''Vectorized version of index() (requires NumPy):  returns a NumPy array of the index
+        of each token in lTokens in the vocabulary (-1 for tokens that are not in it).  The
+        distinct tokens are binary searched all at once, one step of every search per pass,
+        in place (see compareWords()), within the run of words that share their first 8 bytes
+        (found with numpy.searchsorted, over the first block of every word, see wordBlocks(),
+        which is computed on first use).'''
+
+        iSize = self._header["vocabSize"]
+        lRecords = encodeWords(lTokens)
+        if iSize == 0 or not lRecords:
+            return numpy.full(len(lRecords), -1, dtype = numpy.intp)
+
+        # The Distinct Tokens, Laid Out as the Vocabulary is (Concatenated, with Offsets)
+        lDistinct = sorted(set(lRecords))
+        aTokenLengths = numpy.array([len(sRecord) for sRecord in lDistinct], dtype = numpy.intp)
+        tTokens = (numpy.frombuffer(b"".join(lDistinct) or b"\0", dtype = numpy.uint8),
+                   numpy.concatenate(([0], numpy.cumsum(aTokenLengths)))[:-1], aTokenLengths)
+        aWords = numpy.frombuffer(self._buffer, dtype = numpy.uint8, count = max(self._header["vocabBytes"], 1), offset = self._header["vocabOffset"])
+        aOffsets = numpy.frombuffer(self._buffer, dtype = "<u4", count = iSize + 1, offset = self._header["offsetsOffset"])
+
+        # The Run of Words Sharing the First Block of Each Token (the First Blocks of the Words
+        # are in Sorted Order, as the Words are)
+        if self._prefixes is None:
+            self._prefixes = self.wordPrefixes(aWords, aOffsets)
+        aTokenPrefixes = wordBlocks(tTokens, 0)[0]
+        aLow  = numpy.searchsorted(self._prefixes, aTokenPrefixes, "left")
+        aHigh = numpy.searchsorted(self._prefixes, aTokenPrefixes, "right")
+
+        # Binary Search (bisect_left) for Every Distinct Token at Once, within its Run
+        aActive = numpy.flatnonzero(aLow < aHigh)
+        while len(aActive):
+            aMiddle = (aLow[aActive] + aHigh[aActive]) // 2
+            tWords = wordBounds(aWords, aOffsets, aMiddle)
+            aBelow = compareWords(tWords, (tTokens[0], tTokens[1][aActive], tTokens[2][aActive])) < 0
+            aLow[aActive[aBelow]] = aMiddle[aBelow] + 1
+            aHigh[aActive[~aBelow]] = aMiddle[~aBelow]
+            aActive = aActive[aLow[aActive] < aHigh[aActive]]
+
+        # A Token is Found if it Matches its Search Position
+        aPositions = numpy.minimum(aLow, iSize - 1)
+        tWords = wordBounds(aWords, aOffsets, aPositions)
+        aFound = (aLow < iSize) & (aTokenLengths > 0) & (compareWords(tWords, tTokens) == 0)
+        dIds = dict(zip(lDistinct, numpy.where(aFound, aPositions, -1).tolist()))
+        return numpy.array([dIds[sRecord] for sRecord in lRecords], dtype = numpy.intp)
+
+    def wordPrefixes(self, aWords, aOffsets):
+        '''Returns the first block of every word of the vocabulary (see wordBlocks()), computed
+        a slice of PREFIX_SLICE words at a time, so that the temporary arrays stay small.'''
+
+        lPrefixes = []
+        for iStart in range(0, len(aOffsets) - 1, PREFIX_SLICE):
+            aSlice = numpy.arange(iStart, min(iStart + PREFIX_SLICE, len(aOffsets) - 1))
+            lPrefixes.append(wordBlocks(wordBounds(aWords, aOffsets, aSlice), 0)[0])
+        return numpy.concatenate(lPrefixes)
+
+    def idLogProbs(self, aIndices):
+        '''Returns NumPy arrays of the positive and negative log conditional probabilities of the
+        words at aIndices (as returned by tokenIds()), using the unseen word values for -1.'''
+
+        iSize  = self._header["vocabSize"]
+        aFound = aIndices >= 0
+        aSafeIndices = numpy.maximum(aIndices, 0)
+
+        lArrays = []
+        for sClass, fUnseen in zip(["positive", "negative"], self.unseenLogProbs):
+            aLogProbs = readArray(self._buffer, self._header[sClass + "LogProbsOffset"], iSize, "d")
+            lArrays.append(numpy.where(aFound, aLogProbs[aSafeIndices] if iSize > 0 else fUnseen, fUnseen))
+        return lArrays[0], lArrays[1]
+
+    def logRatios(self):
+        '''Returns a NumPy array of the log-ratio of every word in the vocabulary (its positive
+        log conditional probability minus its negative one), in vocabulary order (requires NumPy).'''
+
+        iSize = self._header["vocabSize"]
+        return (readArray(self._buffer, self._header["positiveLogProbsOffset"], iSize, "d") -
+                readArray(self._buffer, self._header["negativeLogProbsOffset"], iSize, "d"))
+
+
+class DatabaseUnpickler(pickle.Unpickler):
+    '''An unpickler of pickle databases, which holds only lists, dictionaries, numbers and
+    strings:  it refuses every other class or function a pickle may name (and would call), so
+    that reading a file that is not a database cannot run arbitrary code.'''
+
+    ALLOWED = frozenset(["dict", "list", "int", "long", "float", "str", "unicode"])
+
+    def find_class(self, sModule, sName):
+        if sModule in ("builtins", "__builtin__") and sName in self.ALLOWED:
+            return super().find_class(sModule, sName)
+        raise pickle.UnpicklingError("%s.%s is not allowed in a pickle database" % (sModule, sName))
+
+
+def readDatabase(sPickleFile):
+    '''Reads a pickle database (as written by earlier versions of the classifier), whose
+    byte-string words are read as Latin-1 (see above).  Only the plain values of a database
+    can be unpickled (see DatabaseUnpickler); anything else raises pickle.UnpicklingError.'''
+
+    with open(sPickleFile, "rb") as f:
+        return DatabaseUnpickler(f, encoding = LEGACY_ENCODING).load()
+
+
+def convertDatabase(sPickleFile, sModelFile):
+    '''Converts a protocol-0 pickle database (as written by earlier versions of the
+    classifier) into the binary model format.  The two file names may be the same.'''
+
+    writeModel(sModelFile, readDatabase(sPickleFile))
+
+
+def migrate(sPickleFile, sModelFile = None):
+    '''Converts the pickle database sPickleFile to the binary model format, in place unless
+    sModelFile is given, and reports the sizes of the two files.'''
+
+    sModelFile = sModelFile or sPickleFile
+    if isModelFile(sPickleFile):
+        sys.exit("%s is already in the binary model format" % sPickleFile)
+    iPickleSize = os.path.getsize(sPickleFile)
+    convertDatabase(sPickleFile, sModelFile)
+    print("Converted %s (%d bytes) to %s (%d bytes)." % (sPickleFile, iPickleSize, sModelFile, os.path.getsize(sModelFile)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("usage: python -m nbclassify.modelfile <pickle database> [<output file>]")
+    migrate(sys.argv[1], sys.argv[-1])
@@ -0,0 +1,436 @@
+'''K-class Naive Bayes model of the star rating of a review:  where Bayes_Classifier keeps only
+the reviews rated 5 (positive) and 1 (negative), Rating_Classifier has a class per rating (by
+default 1 to 5, read from the review file names, movies-<rating>-<id>.txt, see
+corpus.fileRating()), and holds the word counts of all the classes in one K x V matrix (K
+classes, V vocabulary words).  A review is scored against every class at once:  a batch of
+reviews is laid out as a sparse document-term matrix in coordinate form, as in
+Bayes_Classifier.batchLogFinalProbs(), and the K sums of logs of all the documents come from a
+single weighted bincount.  The result is the most likely rating and the log final probability
+of each class; the positive / negative / neutral classification of Bayes_Classifier is derived
+from them (see polarity()).
+
+The probabilities are estimated as in Bayes_Classifier (base 10 logs, add-one smoothing over
+the number of words of the class), so a model of the ratings 5 and 1 alone gives the same
+classifications.  The model is saved in the rating model format of modelfile.py.
+
+Run this module as a script to train (or load) a model and evaluate it on a test directory:
+
+    python -m nbclassify.ratings [--model ratings] [--workers N] [--ngrams N] [--hash-buckets N]
+                                 training/ [testing/]
+'''
+
+import argparse, array, math, os, shutil, tempfile
+from . import corpus, engine, features, modelfile, vocabulary
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RATINGS = (1, 2, 3, 4, 5) # Ratings of the Classes of a New Model
+
+
+def countRatingShard(tArgs):
+    '''Tokenizes and counts one shard of the training reviews (see engine.mapShards()), as
+    engine.countShard() does, with a class per rating.  tArgs is a tuple of the training
+    source, the list of file names in the shard (None for all the reviews of the source), the
+    ratings of the classes (reviews with other ratings are skipped), the word budget, the
+    spill directory, the longest n-gram and the number of hash buckets of the features.  Returns the counts of the shard:  [feature
+    counts (a corpus.CountSpiller with a column per class), list of the numbers of docs of the
+    classes, list of their numbers of features].'''
+
+    sTrainSource, lFileList, lRatings, iSpillWords, sSpillDirectory, iNgrams, iHashBuckets = tArgs
+
+    dClasses = dict((iRating, iClass) for iClass, iRating in enumerate(lRatings))
+    oCounts = corpus.CountSpiller(len(lRatings), iSpillWords, sSpillDirectory)
+    lDocs  = [0] * len(lRatings)
+    lWords = [0] * len(lRatings)
+
+    for sName, iRating, iChunks in corpus.iterDocuments(sTrainSource, lFileList, bRatings = True):
+        iClass = dClasses.get(iRating)
+        if iClass is None:
+            continue
+
+        # Features of the Lowercased Tokens, Counted One Chunk at a Time
+        dCounts = oCounts.columns[iClass]
+        iWords = 0
+        for tokens, words in features.iterChunkFeatures(corpus.iterChunkTokens(iChunks, engine.TOKEN_PATTERN), iNgrams, iHashBuckets):
+            iWords = iWords + len(words)
+            for word in words:
+                dCounts[word] = dCounts.get(word,0) + 1
+            oCounts.spillIfFull()
+        lDocs[iClass] = lDocs[iClass] + 1
+        lWords[iClass] = lWords[iClass] + iWords
+
+    # With a Budget, Hand Back Only Run Files (Not Counts to Pickle)
+    if iSpillWords:
+        oCounts.spill()
+
+    return [oCounts, lDocs, lWords]
+
+
+def logSum(lLogProbs):
+    '''Returns the base 10 log of the sum of the probabilities whose base 10 logs are given
+    (minus infinity if there are none), factoring out the largest so that none underflows.
+    The log of a single probability is returned as it is.'''
+
+    if not lLogProbs:
+        return float("-inf")
+    fLargest = max(lLogProbs)
+    return fLargest + math.log10(sum(10.0 ** (fLogProb - fLargest) for fLogProb in lLogProbs))
+
+
+class Rating_Classifier(object):
+    '''Implements a K-class Naive Bayes classifier of the star rating of movie reviews, based
+    on the words within the review (see above).  The classifier trains on a training set, or
+    loads a model saved by a previous training session.'''
+
+    def __init__(self, trainDirectory = "movie_reviews/", workers = 1, modelFile = "ratings", ratings = RATINGS,
+                 spillWords = 0, ngrams = None, hashBuckets = None):
+        '''This method initializes the rating classifier.  If a model has been saved to
+        modelFile, and was trained on trainDirectory as it is now (and with the given feature
+        settings, if any), it loads this model; otherwise it trains a new one (on the given
+        number of worker processes), with a class per rating in ratings, and saves it.  Classes
+        without any training review are left out of the model.  spillWords, ngrams and
+        hashBuckets are as for Bayes_Classifier.'''
+
+        self._trainDirectory = trainDirectory
+        self._modelFile      = modelFile
+        self._ratings        = tuple(ratings) # Ratings of the Classes, in Increasing Order
+        self._spillWords     = spillWords
+        self._ngrams         = ngrams      # Longest N-gram of the Features (None = As in the Saved Model)
+        self._hashBuckets    = hashBuckets # Hash Buckets of the Features (0 = Not Hashed; None = As Saved)
+        self._numDocs        = []   # Number of Reviews of Each Class
+        self._numWords       = []   # Number of Features of Each Class
+        self._vocabulary     = []   # Sorted Vocabulary of All the Classes
+        self._counts         = None # K x V Count Matrix (a NumPy Array, or a List of Rows)
+        self._fingerprint    = None # Fingerprint of the Training Set of the Model
+        self._logProbs       = None # Log Probability Tables (built on demand, see buildLogProbs())
+
+        # Load the Saved Model (if it exists, and is Not Stale), or Train a New One
+        if os.path.exists(modelFile) and not self.isStale():
+            self.loadModel(modelFile)
+        else:
+            self.train(workers)
+
+    @property
+    def trainDirectory(self):
+        '''Getter for the trainDirectory property'''
+        return self._trainDirectory
+
+    @property
+    def modelFile(self):
+        '''Getter for the modelFile property'''
+        return self._modelFile
+
+    @property
+    def ratings(self):
+        '''Getter for the ratings property (the rating of each class, in increasing order)'''
+        return self._ratings
+
+    @property
+    def spillWords(self):
+        '''Getter for the spillWords property'''
+        return self._spillWords
+
+    @property
+    def ngrams(self):
+        '''Getter for the ngrams property (the longest n-gram of the features)'''
+        return self._ngrams or 1
+
+    @property
+    def hashBuckets(self):
+        '''Getter for the hashBuckets property (0 if the features are not hashed)'''
+        return self._hashBuckets or 0
+
+    @property
+    def numDocs(self):
+        '''Getter for the numDocs property (the number of reviews of each class)'''
+        return self._numDocs
+
+    @property
+    def numWords(self):
+        '''Getter for the numWords property (the number of features of each class)'''
+        return self._numWords
+
+    @property
+    def vocabulary(self):
+        '''Getter for the vocabulary property (the sorted list of the words of the model)'''
+        return self._vocabulary
+
+    @property
+    def counts(self):
+        '''Getter for the counts property (the K x V count matrix, one row per class)'''
+        return self._counts
+
+
+    def train(self, workers = 1):
+        '''Trains the classifier on trainDirectory (a directory tree, archive or JSONL file of
+        rated reviews, see corpus.py), as Bayes_Classifier.train() does:  the reviews are
+        counted in shards (by a pool of worker processes, with workers > 1), within the word
+        budget spillWords, and the counts are merged into the K x V count matrix, with the
+        sorted vocabulary as its columns.  The model is then saved to modelFile.'''
+
+        sFingerprint = corpus.fingerprint(self.trainDirectory)
+        lRatings = sorted(set(self._ratings))
+
+        sSpillDirectory = tempfile.mkdtemp(prefix = "ratings-train-")
+        try:
+            # Count the Reviews in Shards (on a Pool of Worker Processes, if Requested)
+            lShards = engine.mapShards(countRatingShard, self.trainDirectory,
+                                       (lRatings, self.spillWords, sSpillDirectory, self.ngrams, self.hashBuckets), workers)
+
+            # Merge the Shards into the Word and Document Counters
+            oCounts = corpus.CountSpiller(len(lRatings), self.spillWords, sSpillDirectory)
+            lDocs  = [0] * len(lRatings)
+            lWords = [0] * len(lRatings)
+            for shard in lShards:
+                oCounts.absorb(shard[0])
+                lDocs  = [iCount + iShardCount for iCount, iShardCount in zip(lDocs, shard[1])]
+                lWords = [iCount + iShardCount for iCount, iShardCount in zip(lWords, shard[2])]
+
+            # Keep the Classes with Training Reviews, and Fill their Rows of the Count Matrix
+            lClasses = [iClass for iClass in range(len(lRatings)) if lDocs[iClass]]
+            lVocabulary = []
+            lRows = [[] for iClass in lClasses]
+            for word, lCounts in oCounts.iterMerged():
+                lVocabulary.append(word)
+                for lRow, iClass in zip(lRows, lClasses):
+                    lRow.append(lCounts[iClass])
+        finally:
+            shutil.rmtree(sSpillDirectory, ignore_errors = True)
+
+        self.setModel([lRatings[iClass] for iClass in lClasses], [lDocs[iClass] for iClass in lClasses],
+                      [lWords[iClass] for iClass in lClasses], lVocabulary, lRows)
+        self._fingerprint = sFingerprint
+        self.saveModel(self.modelFile)
+
+
+    def setModel(self, lRatings, lDocs, lWords, lVocabulary, lCounts):
+        '''Makes the given classes (their ratings, numbers of docs and numbers of words), sorted
+        vocabulary and K x V counts the model of the classifier.'''
+
+        self._ratings    = tuple(lRatings)
+        self._numDocs    = list(lDocs)
+        self._numWords   = list(lWords)
+        self._vocabulary = lVocabulary
+        if numpy is not None:
+            self._counts = numpy.array(lCounts, dtype = numpy.int64).reshape(len(lRatings), len(lVocabulary))
+        else:
+            self._counts = [array.array(vocabulary.INTEGER_TYPE, lRow) for lRow in lCounts]
+        self._logProbs = None
+
+
+    def loadModel(self, sFilename):
+        '''Loads the model saved in sFilename (in the rating model format).'''
+
+        lRatings, lDocs, lWords, lVocabulary, aCounts, dHeader = modelfile.readRatingModel(sFilename)
+        self.setModel(lRatings, lDocs, lWords, lVocabulary, aCounts)
+        self._fingerprint = dHeader["fingerprint"]
+        self._ngrams, self._hashBuckets = dHeader["ngrams"], dHeader["hashBuckets"]
+
+
+    def saveModel(self, sFilename = None):
+        '''Saves the model (with the fingerprint of its training set, and the feature settings)
+        to sFilename (by default, modelFile), in the rating model format.'''
+
+        modelfile.writeRatingModel(sFilename or self.modelFile, self._ratings, self._numDocs, self._numWords,
+                                   self._vocabulary, self._counts, self._fingerprint, self.ngrams, self.hashBuckets)
+
+
+    def isStale(self):
+        '''Returns True if modelFile is not a rating model, or was trained on a different
+        training set than trainDirectory holds now, or with other feature settings than those
+        the classifier was created with (as Bayes_Classifier.isStale() does).'''
+
+        dHeader = modelfile.readRatingModelHeader(self.modelFile)
+        if dHeader is None:
+            return True
+        return engine.isStaleModel(dHeader, self.trainDirectory, self._ngrams, self._hashBuckets)
+
+
+    def buildLogProbs(self):
+        '''Builds (on demand) and returns the log probability tables of the model:  the log
+        prior probability of each class, a dictionary of word -> vocabulary id, the V + 1 x K
+        matrix of the log conditional probabilities of each word in each class (a NumPy array;
+        the last row is for unseen words), and the same, as a dictionary of word -> tuple of K
+        log probabilities, with the tuple of unseen words, for scoring one review at a time.
+        Without NumPy, the matrix is None.'''
+
+        if self._logProbs is not None:
+            return self._logProbs
+
+        # Log Prior Probabilities of the Classes
+        fTotalDocs = float(sum(self._numDocs))
+        lLogPriorProbs = [math.log10(float(iDocs) / fTotalDocs) for iDocs in self._numDocs]
+        lTotals = [float(iWords + 1) for iWords in self._numWords]
+
+        # Log Conditional Probabilities of Each Word in Each Class (with Add-One Smoothing)
+        if numpy is not None:
+            aTotals = numpy.array(lTotals).reshape(len(lTotals), 1)
+            aLogProbs = numpy.log10(numpy.hstack([self._counts + 1, numpy.ones_like(aTotals)]) / aTotals).T.copy()
+            lTableRows = [tuple(lRow) for lRow in aLogProbs.tolist()]
+        else:
+            aLogProbs = None
+            lTableRows = [tuple(math.log10(float(iCount + 1) / fTotal) for iCount, fTotal in zip(lCounts, lTotals))
+                          for lCounts in zip(*self._counts)]
+            lTableRows.append(tuple(math.log10(1.0 / fTotal) for fTotal in lTotals))
+
+        dVocabIds = dict((word, i) for i, word in enumerate(self._vocabulary))
+        dLogProbs = dict(zip(self._vocabulary, lTableRows))
+        self._logProbs = (lLogPriorProbs, dVocabIds, aLogProbs, dLogProbs, lTableRows[-1])
+        return self._logProbs
+
+
+    def logFinalProbs(self, lTokens):
+        '''Given a list of (lowercased) tokens, returns the list of the log final probabilities
+        of the classes (in the order of ratings), from the features of the tokens.'''
+
+        lLogPriorProbs, dVocabIds, aLogProbs, dLogProbs, tUnseenLogProbs = self.buildLogProbs()
+
+        # Calculate the Sums of Logs of Conditional Probabilities, Adding Down the Column of Each
+        # Class in Feature Order, as batchLogFinalProbs() does (sum() Compensates Float Sums from Python 3.12 On)
+        lRows = [dLogProbs.get(word, tUnseenLogProbs) for word in self.extractFeatures(lTokens)]
+        lSums = [0.0] * len(lLogPriorProbs)
+        for iClass, tColumn in enumerate(zip(*lRows)):
+            fSum = 0.0
+            for fLogProb in tColumn:
+                fSum += fLogProb
+            lSums[iClass] = fSum
+
+        # Log of Prior Probabilities plus Sums of Logs
+        return [fLogPriorProb + fSum for fLogPriorProb, fSum in zip(lLogPriorProbs, lSums)]
+
+
+    def batchLogFinalProbs(self, lTexts):
+        '''Vectorized version of logFinalProbs() for a list of target strings (requires NumPy):
+        every feature of the batch is mapped to its vocabulary id, the rows of the log
+        probability matrix of the features are gathered (one row of K values per feature, in
+        document order), and the sums of logs of all the documents and all the classes come from
+        a single weighted bincount, over a bin per (document, class) pair.  The entries are
+        accumulated in the same order as logFinalProbs(), so the results are bit-identical.
+        Returns a D x K NumPy array of the log final probabilities of the classes of each
+        document.'''
+
+        lLogPriorProbs, dVocabIds, aLogProbs, dLogProbs, tUnseenLogProbs = self.buildLogProbs()
+        iClasses = len(lLogPriorProbs)
+        iUnseenId = len(dVocabIds)
+
+        # Lay the Batch Out as One Run of Feature Ids
+        lBatchIds = []
+        lFeatureCounts = []
+        for sText in lTexts:
+            lFeatures = self.extractFeatures(self.tokenize(sText, True))
+            lBatchIds.extend([dVocabIds.get(word, iUnseenId) for word in lFeatures])
+            lFeatureCounts.append(len(lFeatures))
+        aDocIds = numpy.repeat(numpy.arange(len(lTexts)), numpy.array(lFeatureCounts, dtype = numpy.intp))
+
+        # Bin (Document, Class) of Each Entry of the N x K Matrix of Gathered Rows
+        aBins = (aDocIds.reshape(-1, 1) * iClasses + numpy.arange(iClasses)).ravel()
+        aWeights = aLogProbs[numpy.array(lBatchIds, dtype = numpy.intp)].ravel()
+        aSums = numpy.bincount(aBins, weights = aWeights, minlength = len(lTexts) * iClasses).reshape(len(lTexts), iClasses)
+
+        return numpy.array(lLogPriorProbs) + aSums
+
+
+    def rate(self, sText):
+        '''Given a target string sText, returns its most likely rating, and the list of the
+        log final probabilities of the classes (in the order of ratings), as a tuple.'''
+
+        lLogProbs = self.logFinalProbs(self.tokenize(sText, True))
+        return self._ratings[lLogProbs.index(max(lLogProbs))], lLogProbs
+
+
+    def rateBatch(self, lTexts):
+        '''Given a list of target strings, returns the list of their (rating, log final
+        probabilities) pairs, exactly as rate() would return them one at a time, but scored in
+        one vectorized pass.'''
+
+        if numpy is None:
+            return [self.rate(sText) for sText in lTexts]
+
+        aLogProbs = self.batchLogFinalProbs(lTexts)
+        lRatings = [self._ratings[iClass] for iClass in numpy.argmax(aLogProbs, axis = 1).tolist()]
+        return list(zip(lRatings, aLogProbs.tolist()))
+
+
+    def polarity(self, lLogProbs):
+        '''Given the log final probabilities of the classes of a review, returns its
+        classification as Bayes_Classifier.classify() would ("positive", "negative" or
+        "neutral") and its score, as a tuple.  The log final probability of the positive class
+        is that of the ratings above the middle of the rating scale of the model (e.g. 4 and 5),
+        and of the negative class that of the ratings below it (e.g. 1 and 2); the score is
+        their difference, and the same threshold applies.'''
+
+        fMiddle = (self._ratings[0] + self._ratings[-1]) / 2.0
+        log_final_prob_positive = logSum([fLogProb for iRating, fLogProb in zip(self._ratings, lLogProbs) if iRating > fMiddle])
+        log_final_prob_negative = logSum([fLogProb for iRating, fLogProb in zip(self._ratings, lLogProbs) if iRating < fMiddle])
+        fScore = log_final_prob_positive - log_final_prob_negative
+
+        # Positive / Negative (minus Threshold), Otherwise "Neutral"
+        if (log_final_prob_positive > (0.2 + log_final_prob_negative)):
+            return "positive", fScore
+        if (log_final_prob_negative > (0.2 + log_final_prob_positive)):
+            return "negative", fScore
+        return "neutral", fScore
+
+
+    def classify(self, sText):
+        '''Given a target string sText, returns its classification, derived from the
+        probabilities of its ratings (see polarity()):  "positive", "negative" or "neutral".'''
+
+        return self.polarity(self.rate(sText)[1])[0]
+
+
+    def classifyBatch(self, lTexts, bWithScores = False):
+        '''Given a list of target strings, returns the list of their classifications, exactly
+        as classify() would return them one at a time (a list of (classification, score) pairs
+        if bWithScores is set).'''
+
+        lResults = [self.polarity(lLogProbs) for iRating, lLogProbs in self.rateBatch(lTexts)]
+        return lResults if bWithScores else [sLabel for sLabel, fScore in lResults]
+
+
+    def tokenize(self, sText, bLowercase = False):
+        '''Given a string of text sText, returns the list of its tokens, as
+        Bayes_Classifier.tokenize() does (see engine.tokenizeText()).'''
+
+        return engine.tokenizeText(sText, bLowercase)
+
+    def extractFeatures(self, lTokens):
+        '''Given a list of (lowercased) tokens, returns the list of their features, as
+        Bayes_Classifier.extractFeatures() does (see engine.extractFeatures()).'''
+
+        return engine.extractFeatures(lTokens, self.ngrams, self.hashBuckets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Train (or load) a star-rating model, and evaluate it on a test directory.")
+    parser.add_argument("source", help = "training directory, archive or JSONL file of rated reviews")
+    parser.add_argument("test_dir", nargs = "?", help = "directory of rated test reviews (movies-<rating>-<id>.txt)")
+    parser.add_argument("--model", default = "ratings", help = "model file (default: ratings)")
+    parser.add_argument("--workers", type = int, default = 1, help = "worker processes counting the files of a directory (default: 1)")
+    parser.add_argument("--ngrams", type = int, help = "longest n-gram of the features (default: as saved, or 1)")
+    parser.add_argument("--hash-buckets", type = int, help = "hash the features into this many buckets (default: as saved, or 0)")
+    args = parser.parse_args()
+
+    rc = Rating_Classifier(args.source, args.workers, args.model, ngrams = args.ngrams, hashBuckets = args.hash_buckets)
+    print("Classes: %s" % ", ".join("%d (%d reviews)" % (iRating, iDocs) for iRating, iDocs in zip(rc.ratings, rc.numDocs)))
+    print("Vocabulary: %d features" % len(rc.vocabulary))
+
+    if args.test_dir:
+        lNames = [sName for sName in corpus.listDocuments(args.test_dir) if corpus.fileRating(sName) is not None]
+        lTexts = [corpus.readText(os.path.join(args.test_dir, sName)) for sName in lNames]
+        lTrue = [corpus.fileRating(sName) for sName in lNames]
+        lPredicted = [iRating for iRating, lLogProbs in rc.rateBatch(lTexts)]
+
+        iCorrect = sum(1 for iTrue, iPredicted in zip(lTrue, lPredicted) if iTrue == iPredicted)
+        print("\n%d test reviews:  rating accuracy %.4f, mean absolute error %.4f" % (
+            len(lNames), iCorrect / float(max(len(lNames), 1)),
+            sum(abs(iTrue - iPredicted) for iTrue, iPredicted in zip(lTrue, lPredicted)) / float(max(len(lNames), 1))))
+
+        # Confusion Matrix (Rows are True Ratings, Columns Predicted Ratings)
+        lRatings = sorted(set(lTrue) | set(rc.ratings))
+        print("\ntrue \\ predicted " + "".join("%7d" % iRating for iRating in lRatings))
+        for iTrue in lRatings:
+            print("%16d " % iTrue + "".join("%7d" % sum(1 for iT, iP in zip(lTrue, lPredicted) if iT == iTrue and iP == iPredicted) for iPredicted in lRatings))
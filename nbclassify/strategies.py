@@ -0,0 +1,318 @@
+'''Scoring strategies of the classifier engine (see engine.py):  the weighting of the training
+counts and the decision rule that turns the log final probabilities of a review into its
+classification, which are all that set bayes.py and bayesbest.py apart.  The engine counts,
+stores and scores the features; a strategy object weighs the counts as the model is made from
+them (or updated), and labels the scores, one review at a time or a whole batch at once (as
+NumPy arrays).  The strategies are registered by name, so that the scripts can pick one with
+--strategy:
+
+    Strategy        "bayes"      plain counts, and a fixed margin of 0.2 between the classes
+    BestStrategy    "bayesbest"  scaled punctuation and short review counts, a review length
+                                 bias and a tunable neutrality margin
+
+Each strategy caches its model in its own file (modelFile), since the counts of one are not a
+model of the other.
+'''
+
+import fractions, math, string
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STRATEGIES = {} # Registered Strategy Classes, by Name (see registerStrategy())
+
+MAX_COUNT_SCALE = 10 ** 6 # Largest Denominator of a Count Weight (see BestStrategy.countScale)
+
+
+def registerStrategy(cStrategy):
+    '''Registers a strategy class under its name (cStrategy.name), so that getStrategy() and
+    the --strategy option of the scripts find it.  Returns the class, so it can be used as a
+    class decorator.'''
+
+    STRATEGIES[cStrategy.name] = cStrategy
+    return cStrategy
+
+
+def getStrategy(strategy):
+    '''Returns a new strategy object of the registered strategy named strategy, or strategy
+    itself if it is already a strategy object.'''
+
+    if isinstance(strategy, Strategy):
+        return strategy
+    if strategy not in STRATEGIES:
+        raise ValueError("unknown strategy %r (expected one of %s)" % (strategy, ", ".join(strategyNames())))
+    return STRATEGIES[strategy]()
+
+
+def strategyNames():
+    '''Returns the sorted list of the names of the registered strategies.'''
+
+    return sorted(STRATEGIES)
+
+
+@registerStrategy
+class Strategy(object):
+    '''The plain Naive Bayes strategy of bayes.py:  every feature counts once, and a review is
+    positive (or negative) if the log final probability of its class exceeds that of the
+    other by more than 0.2, and neutral otherwise.  Its score is the log final probability of
+    the positive class minus that of the negative class.  Subclasses override the weighting
+    (weightWord() and weightArrays(), weightTotals() and countFeatures()) and the decision
+    rule (labelScore() and labelArrays()).'''
+
+    name              = "bayes"
+    modelFile         = "database" # Default Model File of the Strategy
+    shortReviewLength = 0 # Reviews of Fewer Tokens are Counted Apart (see engine.countDocuments())
+    countScale        = 1 # Weighted Counts are Whole Multiples of 1 / countScale (see countUnits())
+
+
+    def weightWord(self, word, iLong, iShort, lTotals):
+        '''Given the unweighted counts of a word in the long and the short reviews of one
+        class, returns its weighted count, and adds the unweighted counts to lTotals, the
+        [punctuation, long review words, short review words] totals of the class (see
+        weightTotals()).  Here every feature counts once.'''
+
+        lTotals[1] = lTotals[1] + iLong
+        lTotals[2] = lTotals[2] + iShort
+        return iLong + iShort
+
+
+    def weightArrays(self, aLong, aShort, aPunctuation, lTotals):
+        '''Vectorized version of weightWord(), for NumPy arrays of the unweighted counts of the
+        words of a vocabulary in the long and the short reviews of one class, and a mask of
+        which of them are punctuation:  returns an array of their weighted counts, and adds
+        their unweighted counts to lTotals.'''
+
+        lTotals[1] = lTotals[1] + int(aLong.sum())
+        lTotals[2] = lTotals[2] + int(aShort.sum())
+        return aLong + aShort
+
+
+    def countUnits(self, count):
+        '''Returns a weighted count as a whole number of units of 1 / countScale.  Updates add
+        and subtract counts in these units (see countFeatures()), so that backing a review out
+        gives back exactly the count it was added to.'''
+
+        return int(round(count * self.countScale))
+
+
+    def fromUnits(self, iUnits):
+        '''Returns the weighted count of iUnits units of 1 / countScale (see countUnits()), as
+        an integer if it is whole.'''
+
+        if iUnits % self.countScale == 0:
+            return iUnits // self.countScale
+        return iUnits / float(self.countScale)
+
+
+    def weightTotals(self, lTotals):
+        '''Returns the weighted total word count of a class, from its unweighted [punctuation,
+        long review words, short review words] totals (see weightWord()).'''
+
+        return lTotals[0] + lTotals[1] + lTotals[2]
+
+
+    def weightCounts(self, dLongCounts, dShortCounts):
+        '''Given the unweighted word counts of one class, from its long and its short reviews,
+        returns the weighted word counts and the weighted total word count of the class (see
+        weightWord()).  The weights are applied to the integer counts in one step, so the
+        result does not depend on the order (or sharding) of the training files.'''
+
+        dWords = {}
+        lTotals = [0, 0, 0]
+        for dCounts in [dLongCounts, dShortCounts]:
+            for word in dCounts:
+                if word not in dWords:
+                    dWords[word] = self.weightWord(word, dLongCounts.get(word,0), dShortCounts.get(word,0), lTotals)
+
+        return dWords, self.weightTotals(lTotals)
+
+
+    def countFeatures(self, lTokens, lFeatures, dCounts, numWords):
+        '''Adds the weighted counts of the features lFeatures of one review (of the tokens
+        lTokens) to dCounts, as Classifier.update() counts a review, and returns numWords plus
+        their weighted total.  The counts are in units of 1 / countScale (see countUnits()),
+        which here are whole features.'''
+
+        for word in lFeatures:
+            dCounts[word] = dCounts.get(word,0) + 1
+        return numWords + len(lFeatures)
+
+
+    def labelScore(self, log_final_prob_positive, log_final_prob_negative, iTokens):
+        '''Given the log final probabilities of the positive and the negative class of a review,
+        and its number of tokens, returns its classification ("positive", "negative" or
+        "neutral") and its score, as a tuple.'''
+
+        fScore = log_final_prob_positive - log_final_prob_negative
+
+        # Check for Positive (minus Threshold)
+        if (log_final_prob_positive > (0.2 + log_final_prob_negative)):
+            return "positive", fScore
+
+        # Check for Negative (minus Threshold)
+        if (log_final_prob_negative > (0.2 + log_final_prob_positive)):
+            return "negative", fScore
+
+        # Otherwise, the Review is "Neutral"
+        return "neutral", fScore
+
+
+    def scoreArrays(self, aPositive, aNegative, aLengths):
+        '''Vectorized version of the score of labelScore(), for NumPy arrays of the log final
+        probabilities and numbers of tokens of a batch of reviews.'''
+
+        return aPositive - aNegative
+
+
+    def labelArrays(self, aPositive, aNegative, aLengths):
+        '''Vectorized version of labelScore():  returns a NumPy array of the classifications
+        of a batch of reviews, and one of their scores, as a tuple.'''
+
+        # Positive / Negative (minus Threshold), Otherwise "Neutral"
+        aLabels = numpy.where(aPositive > (0.2 + aNegative), "positive",
+                              numpy.where(aNegative > (0.2 + aPositive), "negative", "neutral"))
+        return aLabels, self.scoreArrays(aPositive, aNegative, aLengths)
+
+
+    def explainTerms(self, iTokens):
+        '''Returns the terms of the score of a review of iTokens tokens that the decision rule
+        adds to its log final probabilities, as a dictionary (see Classifier.explain()).'''
+
+        return {}
+
+
+@registerStrategy
+class BestStrategy(Strategy):
+    '''The improved strategy of bayesbest.py:  punctuation is counted punctuationWeight
+    times, and the other words of short reviews (of fewer than shortReviewLength tokens)
+    shortReviewWeight times; the score of a review is the delta between the log final
+    probabilities of its classes plus its number of tokens times reviewLengthWeight, and
+    it is neutral if the score is within neutralityBias of zero.'''
+
+    name        = "bayesbest"
+    modelFile   = "database.bayesbest"
+    _countScale = (None, 1) # (punctuationWeight, shortReviewWeight) and their countScale
+
+    def __init__(self):
+        # "Bayes Best" Tweaking Parameters:
+        self.neutralityBias     = 0.01  # "Neutral" Buffer between Positive and Negative Reviews
+        self.punctuationWeight  = 1000  # Weight to apply to punctuation, in Training Data
+        self.shortReviewWeight  = 0.1   # Weight to apply to Short Reviews, in Training Data
+        self.shortReviewLength  = 15    # Cut-off for what is considered a "Short Review"
+        self.reviewLengthWeight = 0.12  # Bias to apply to Conditional Prob based on Sentence Length
+
+
+    @property
+    def countScale(self):
+        '''The least number of units (see countUnits()) that makes both punctuationWeight and
+        shortReviewWeight whole numbers of units (e.g. 10 for the default weights), so that
+        every scaled count is a whole number of units.  It is worked out again only when the
+        weights change.'''
+
+        tWeights = (self.punctuationWeight, self.shortReviewWeight)
+        if self._countScale[0] != tWeights:
+            iScale = 1
+            for weight in tWeights:
+                iDenominator = fractions.Fraction(weight).limit_denominator(MAX_COUNT_SCALE).denominator
+                iScale = iScale * iDenominator // math.gcd(iScale, iDenominator)
+            self._countScale = (tWeights, iScale)
+        return self._countScale[1]
+
+
+    def weightWord(self, word, iLong, iShort, lTotals):
+        '''Given the unweighted counts of a word in the long and the short reviews of one
+        class, returns its scaled count:  punctuation is scaled by punctuationWeight, other
+        words from short reviews are scaled by shortReviewWeight, and all other words count
+        once.  The unweighted counts are added to lTotals, the [punctuation, long review
+        words, short review words] totals of the class (see weightTotals()).'''
+
+        if iLong + iShort == 0:
+            return 0
+        if word in string.punctuation:
+            lTotals[0] = lTotals[0] + iLong + iShort
+            return self.fromUnits((iLong + iShort) * self.countUnits(self.punctuationWeight))
+        elif iShort > 0:
+            lTotals[1] = lTotals[1] + iLong
+            lTotals[2] = lTotals[2] + iShort
+            return self.fromUnits(self.countUnits(iLong) + iShort * self.countUnits(self.shortReviewWeight))
+        else:
+            lTotals[1] = lTotals[1] + iLong
+            return iLong
+
+
+    def weightArrays(self, aLong, aShort, aPunctuation, lTotals):
+        '''Vectorized version of weightWord():  the counts are scaled in units of
+        1 / countScale, as there, and returned as floats.'''
+
+        aWords = ~aPunctuation
+        lTotals[0] = lTotals[0] + int(aLong[aPunctuation].sum() + aShort[aPunctuation].sum())
+        lTotals[1] = lTotals[1] + int(aLong[aWords].sum())
+        lTotals[2] = lTotals[2] + int(aShort[aWords].sum())
+        aUnits = numpy.where(aPunctuation, (aLong + aShort) * self.countUnits(self.punctuationWeight),
+                             aLong * self.countScale + aShort * self.countUnits(self.shortReviewWeight))
+        return aUnits / float(self.countScale)
+
+
+    def weightTotals(self, lTotals):
+        '''Returns the scaled total word count of a class, from its unweighted [punctuation,
+        long review words, short review words] totals (see weightWord()).'''
+
+        iPunctuation, iLongWords, iShortWords = lTotals
+        return self.fromUnits(iPunctuation * self.countUnits(self.punctuationWeight) + self.countUnits(iLongWords)
+                              + iShortWords * self.countUnits(self.shortReviewWeight))
+
+
+    def countFeatures(self, lTokens, lFeatures, dCounts, numWords):
+        '''Adds the scaled counts of the features lFeatures of one review (of the tokens
+        lTokens) to dCounts, as train() weights them, in units of 1 / countScale (see
+        countUnits()), and returns numWords plus their scaled total.'''
+
+        iPunctuationUnits = self.countUnits(self.punctuationWeight)
+        iWordUnits = self.countUnits(self.shortReviewWeight if len(lTokens) < self.shortReviewLength else 1)
+        for word in lFeatures:
+            iUnits = iPunctuationUnits if word in string.punctuation else iWordUnits
+            numWords = numWords + iUnits
+            dCounts[word] = dCounts.get(word,0) + iUnits
+        return numWords
+
+
+    def labelScore(self, log_final_prob_positive, log_final_prob_negative, iTokens):
+        '''Given the log final probabilities of the positive and the negative class of a review,
+        and its number of tokens, returns its classification and its score (the delta between
+        the log final probabilities, including the review length bias), as a tuple.'''
+
+        # Check for Delta in Final Probabilities (minus Scaled Threshold)
+        delta_prob = (log_final_prob_positive - log_final_prob_negative) + (iTokens * self.reviewLengthWeight)
+
+        if (delta_prob > +1.0 * self.neutralityBias):
+            return "positive", delta_prob
+        if (delta_prob < -1.0 * self.neutralityBias):
+            return "negative", delta_prob
+        else:
+            return "neutral", delta_prob
+
+
+    def scoreArrays(self, aPositive, aNegative, aLengths):
+        '''Vectorized version of the score of labelScore().'''
+
+        return (aPositive - aNegative) + (aLengths * self.reviewLengthWeight)
+
+
+    def labelArrays(self, aPositive, aNegative, aLengths):
+        '''Vectorized version of labelScore().'''
+
+        aDelta = self.scoreArrays(aPositive, aNegative, aLengths)
+
+        # Positive / Negative (minus Scaled Threshold), Otherwise "Neutral"
+        aLabels = numpy.where(aDelta > +1.0 * self.neutralityBias, "positive",
+                              numpy.where(aDelta < -1.0 * self.neutralityBias, "negative", "neutral"))
+        return aLabels, aDelta
+
+
+    def explainTerms(self, iTokens):
+        '''Returns the "lengthBias" term of the score (the number of tokens times
+        reviewLengthWeight).'''
+
+        return {"lengthBias": iTokens * self.reviewLengthWeight}
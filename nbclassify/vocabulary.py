@@ -0,0 +1,217 @@
+'''Compact in-memory word counts for Bayes_Classifier:  one vocabulary, shared by both classes,
+that maps each word to a dense integer id, and the counts of each class in a typed
+array indexed by that id.  Compared with a dictionary per class, every word is stored once,
+with no hash table entry of its own (the words are not interned either, as that would add
+one, in the interpreter's table of interned strings), and every count takes 8 bytes rather
+than a Python object.'''
+
+import array, bisect, collections.abc, heapq
+
+INTEGER_TYPE = "l" if array.array("l").itemsize == 8 else "q"
+FLOAT_TYPE   = "d"
+CLASSES      = ("positive", "negative")
+
+
+class Vocabulary(object):
+    '''Maps words to dense integer ids, and back.  The words the vocabulary is built with
+    (which must be sorted and distinct) are the first ids, in order, so the id of one of them
+    is found by binary search rather than through a dictionary; words added later get the next
+    ids, and are indexed by a dictionary of their own (which stays small, as it only holds the
+    words added since the vocabulary was last built, e.g. by update()).'''
+
+    def __init__(self, lSortedWords = ()):
+        self.words       = list(lSortedWords)
+        self._sortedSize = len(self.words)
+        self._addedIds   = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def add(self, word):
+        '''Returns the id of word, adding the word if it is new.'''
+
+        iId = self.get(word)
+        if iId is None:
+            iId = len(self.words)
+            self.words.append(word)
+            self._addedIds[word] = iId
+        return iId
+
+    def isSorted(self):
+        '''Returns True if the ids of the words follow their sorted order (i.e. no words were
+        added since the vocabulary was built).'''
+
+        return not self._addedIds
+
+    def get(self, word, default = None):
+        '''Returns the id of word, or default if it is not in the vocabulary.'''
+
+        iId = bisect.bisect_left(self.words, word, 0, self._sortedSize)
+        if iId < self._sortedSize and self.words[iId] == word:
+            return iId
+        return self._addedIds.get(word, default)
+
+
+class CountTable(object):
+    '''The word counts of both classes:  a Vocabulary, and one typed array of counts per class
+    ("positive" and "negative"), indexed by word id.  Integer counts are held as 64-bit
+    integers and scaled counts as doubles; adding a scaled count to an integer table converts
+    it.  A word keeps its id when its count falls back to zero, but the views returned by
+    view() leave it out, just as it would be missing from a dictionary.  A table read from a
+    model file also holds the log conditional probabilities stored with its counts (see
+    logProbs), until the counts change.'''
+
+    def __init__(self, oVocabulary = None, dCounts = None, sType = INTEGER_TYPE):
+        self.vocabulary = oVocabulary if oVocabulary is not None else Vocabulary()
+        if dCounts is None:
+            dCounts = dict((sClass, array.array(sType, [0]) * len(self.vocabulary)) for sClass in CLASSES)
+        self.counts = dCounts
+        self.logProbs = None # Stored (Positive, Negative) Log Conditional Probabilities by Id, and the Word Totals they Use
+
+    @classmethod
+    def fromMappings(cls, dPositiveWords, dNegativeWords):
+        '''Builds a table from a word -> count mapping per class (e.g. the dictionaries of a
+        pickle database).'''
+
+        lWords = sorted(set(dPositiveWords) | set(dNegativeWords))
+        return cls.fromSortedCounts((word, dPositiveWords.get(word,0), dNegativeWords.get(word,0)) for word in lWords)
+
+    @classmethod
+    def fromSortedCounts(cls, iCounts):
+        '''Builds a table from (word, positive count, negative count) tuples, in sorted word
+        order (e.g. the merged counts of corpus.CountSpiller), without an intermediate
+        dictionary.  The counts are integers, unless one of them is not.'''
+
+        lWords = []
+        aPositive = array.array(INTEGER_TYPE)
+        aNegative = array.array(INTEGER_TYPE)
+        for word, positiveCount, negativeCount in iCounts:
+            if aPositive.typecode != FLOAT_TYPE and not (isinstance(positiveCount, int) and isinstance(negativeCount, int)):
+                aPositive = array.array(FLOAT_TYPE, aPositive)
+                aNegative = array.array(FLOAT_TYPE, aNegative)
+            lWords.append(word)
+            aPositive.append(positiveCount)
+            aNegative.append(negativeCount)
+        return cls(Vocabulary(lWords), {"positive": aPositive, "negative": aNegative})
+
+    @property
+    def typeCode(self):
+        '''The array type code of the counts.'''
+        return self.counts["positive"].typecode
+
+    def convert(self, sType):
+        '''Converts the counts to the array type sType (e.g. FLOAT_TYPE).'''
+
+        self.counts = dict((sClass, array.array(sType, aCounts)) for sClass, aCounts in self.counts.items())
+
+    def count(self, sClass, word):
+        '''Returns the count of word in the given class (0 if it is not in the vocabulary).'''
+
+        iId = self.vocabulary.get(word)
+        return 0 if iId is None else self.counts[sClass][iId]
+
+    def addCounts(self, sClass, dCounts, iSign = 1, iScale = 1):
+        '''Adds (iSign = 1) or subtracts (iSign = -1) a word -> count mapping to or from the
+        counts of one class, adding new words to the vocabulary.  The counts of dCounts are
+        whole numbers of units of 1 / iScale (see strategies.Strategy.countUnits()), and are
+        added to the stored counts in those units, so that scaled counts do not drift (and a
+        count backed out again is exactly zero).'''
+
+        if self.typeCode != FLOAT_TYPE and (iScale != 1 or not all(isinstance(count, int) for count in dCounts.values())):
+            self.convert(FLOAT_TYPE)
+        self.logProbs = None
+        oVocabulary = self.vocabulary
+        aCounts = self.counts[sClass]
+        for word, count in dCounts.items():
+            iId = oVocabulary.add(word)
+            if iId == len(aCounts):
+                for aClassCounts in self.counts.values():
+                    aClassCounts.append(0)
+            if iScale == 1:
+                aCounts[iId] = aCounts[iId] + iSign * count
+            else:
+                aCounts[iId] = (int(round(aCounts[iId] * iScale)) + iSign * count) / float(iScale)
+
+    def iterCounts(self):
+        '''Yields (word, positive count, negative count) for every word with a nonzero count
+        in either class, in id order.'''
+
+        aPositive = self.counts["positive"]
+        aNegative = self.counts["negative"]
+        for iId, word in enumerate(self.vocabulary.words):
+            if aPositive[iId] or aNegative[iId]:
+                yield word, aPositive[iId], aNegative[iId]
+
+    def iterSortedCounts(self):
+        '''Like iterCounts(), in sorted word order.'''
+
+        if self.vocabulary.isSorted():
+            return self.iterCounts()
+        return iter(sorted(self.iterCounts()))
+
+    def view(self, sClass):
+        '''Returns a read-only, dictionary-like view of the counts of one class.'''
+
+        return CountsView(self, sClass)
+
+    def prune(self, minCount = 1, maxVocab = 0):
+        '''Returns a new table without the rare words:  those whose total count (over both
+        classes) is below minCount and, if maxVocab > 0, all but the maxVocab most frequent
+        words (ties broken alphabetically).  The words kept get new, dense ids, in sorted order.'''
+
+        lKept = [(positiveCount + negativeCount, word, positiveCount, negativeCount)
+                 for word, positiveCount, negativeCount in self.iterCounts()
+                 if positiveCount + negativeCount >= minCount]
+        if maxVocab > 0 and len(lKept) > maxVocab:
+            lKept = heapq.nsmallest(maxVocab, lKept, key = lambda tWord: (-tWord[0], tWord[1]))
+        lKept.sort(key = lambda tWord: tWord[1])
+
+        return CountTable(Vocabulary(tWord[1] for tWord in lKept),
+                          {"positive": array.array(self.typeCode, [tWord[2] for tWord in lKept]),
+                           "negative": array.array(self.typeCode, [tWord[3] for tWord in lKept])})
+
+
+class CountsView(collections.abc.Mapping):
+    '''Read-only, dictionary-like view of the word counts of one class in a CountTable.  As
+    with the dictionaries it replaces, it only holds the words seen in that class.'''
+
+    def __init__(self, oTable, sClass):
+        self.table  = oTable
+        self._class = sClass
+
+    def __getitem__(self, word):
+        iId = self.table.vocabulary.get(word)
+        count = 0 if iId is None else self.table.counts[self._class][iId]
+        if not count:
+            raise KeyError(word)
+        return count
+
+    def get(self, word, default = None):
+        iId = self.table.vocabulary.get(word)
+        count = 0 if iId is None else self.table.counts[self._class][iId]
+        return count if count else default
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __iter__(self):
+        lWords = self.table.vocabulary.words
+        for iId, count in enumerate(self.table.counts[self._class]):
+            if count:
+                yield lWords[iId]
+
+    def __len__(self):
+        return sum(1 for count in self.table.counts[self._class] if count)
+
+    def items(self):
+        lWords = self.table.vocabulary.words
+        return [(lWords[iId], count) for iId, count in enumerate(self.table.counts[self._class]) if count]
+
+    def values(self):
+        return [count for count in self.table.counts[self._class] if count]
@@ -0,0 +1,265 @@
+'''Long-running scoring server:  loads the classifier once, and classifies reviews sent as
+newline-delimited JSON, over stdin/stdout or a local Unix or TCP socket.
+
+Each request line is a JSON object with the review in "text", and an optional "id" that
+is echoed back; each response line holds "label" and "score" (or "error").  A request
+with "explain": k also gets an "explanation" of its score, with the k features pushing
+hardest toward each class (see engine.Classifier.explain()).  Clients may
+pipeline requests (send many before reading any responses); the responses on each
+connection come back in request order.  Requests from every connection are gathered
+into micro-batches, which are scored by engine.Classifier.classifyBatch().
+
+    python server.py [--strategy bayes] [--unix PATH | --tcp HOST:PORT]
+
+Connections are served by an asyncio event loop, and the batches are scored in a single
+worker thread (scoring is CPU-bound), so that the loop keeps reading requests and writing
+responses while a batch is scored.  Requests and responses are UTF-8; a request line may
+be up to MAX_LINE bytes long.
+'''
+
+import argparse, asyncio, concurrent.futures, json, os, sys, threading
+from nbclassify import engine, strategies
+
+MAX_LINE = 1 << 24 # Longest Request Line, in Bytes
+
+
+class MicroBatcher(object):
+    '''Gathers the reviews submitted from every connection into batches of up to maxBatch
+    reviews, waiting at most maxDelay seconds after the first review of a batch for more
+    to arrive, and scores each batch with a single call to classifyBatch(), in a worker
+    thread.  start() must be called in the event loop, before the first submit().'''
+
+    def __init__(self, oClassifier, maxBatch = 256, maxDelay = 0.002):
+        self._classifier = oClassifier
+        self._maxBatch   = maxBatch
+        self._maxDelay   = maxDelay
+        self._pending    = [] # (Request, Future of its Response) Pairs
+        self._executor   = concurrent.futures.ThreadPoolExecutor(1)
+
+    def start(self):
+        '''Starts the batching task in the running event loop.'''
+
+        self._arrived = asyncio.Event() # Set While a Review is Waiting
+        self._full    = asyncio.Event() # Set While a Full Batch is Waiting
+        self._task    = asyncio.ensure_future(self.run())
+
+    def submit(self, dRequest):
+        '''Queues a request for scoring, and returns a future of its response.'''
+
+        fuResponse = asyncio.get_event_loop().create_future()
+        self._pending.append((dRequest, fuResponse))
+        self._arrived.set()
+        if len(self._pending) >= self._maxBatch:
+            self._full.set()
+        return fuResponse
+
+    async def run(self):
+        '''Batching task:  collects batches, and scores each in the worker thread, forever.'''
+
+        loop = asyncio.get_event_loop()
+        while True:
+            await self._arrived.wait()
+            if not self._full.is_set():
+                try:
+                    await asyncio.wait_for(self._full.wait(), self._maxDelay)
+                except asyncio.TimeoutError:
+                    pass
+
+            lBatch, self._pending = self._pending[:self._maxBatch], self._pending[self._maxBatch:]
+            if not self._pending:
+                self._arrived.clear()
+            if len(self._pending) < self._maxBatch:
+                self._full.clear()
+
+            lResponses = await loop.run_in_executor(self._executor, self.score, [dRequest for dRequest, fuResponse in lBatch])
+            for (dRequest, fuResponse), dResponse in zip(lBatch, lResponses):
+                if not fuResponse.done():
+                    fuResponse.set_result(dResponse)
+
+    def score(self, lRequests):
+        '''Scores a batch of requests, and returns their responses.  The reviews that ask for an
+        explanation are scored with a single call to explainBatch() instead.'''
+
+        try:
+            lTexts = [reviewText(dRequest) for dRequest in lRequests]
+            lExplained = [i for i, dRequest in enumerate(lRequests) if dRequest.get("explain")]
+            lPlain = [i for i, dRequest in enumerate(lRequests) if not dRequest.get("explain")]
+            lResponses = [None] * len(lRequests)
+            if lPlain:
+                for i, (sLabel, fScore) in zip(lPlain, self._classifier.classifyBatch([lTexts[i] for i in lPlain], True)):
+                    lResponses[i] = {"label": sLabel, "score": fScore}
+            if lExplained:
+                iMaxFeatures = max(lRequests[i]["explain"] for i in lExplained)
+                for i, dExplanation in zip(lExplained, self._classifier.explainBatch([lTexts[i] for i in lExplained], iMaxFeatures)):
+                    iFeatures = lRequests[i]["explain"]
+                    dExplanation["positive"] = dExplanation["positive"][:iFeatures]
+                    dExplanation["negative"] = dExplanation["negative"][:iFeatures]
+                    lResponses[i] = {"label": dExplanation.pop("label"), "score": dExplanation.pop("score"), "explanation": dExplanation}
+        except Exception as e:
+            lResponses = [{"error": str(e)} for dRequest in lRequests]
+
+        for dRequest, dResponse in zip(lRequests, lResponses):
+            if "id" in dRequest:
+                dResponse["id"] = dRequest["id"]
+        return lResponses
+
+
+def reviewText(dRequest):
+    '''Returns the review text of a request.'''
+
+    return dRequest["text"]
+
+
+def parseRequest(sLine, oBatcher):
+    '''Parses one request line (UTF-8 bytes), and returns a future of its response (already
+    done, with an error response, if the line is not a valid request; with the "id" of the
+    request, if it has one).'''
+
+    dRequest = None
+    try:
+        dRequest = json.loads(sLine.decode("utf-8"))
+        if not isinstance(dRequest, dict) or not isinstance(dRequest.get("text"), str):
+            raise ValueError('a request must be a JSON object with a "text" string')
+        iFeatures = dRequest.get("explain", 0)
+        if isinstance(iFeatures, bool) or not isinstance(iFeatures, int) or iFeatures < 0:
+            raise ValueError('"explain" must be a number of features')
+    except ValueError as e:
+        dResponse = {"error": str(e)}
+        if isinstance(dRequest, dict) and "id" in dRequest:
+            dResponse["id"] = dRequest["id"]
+        fuResponse = asyncio.get_event_loop().create_future()
+        fuResponse.set_result(dResponse)
+        return fuResponse
+    return oBatcher.submit(dRequest)
+
+
+async def serveConnection(reader, writer, oBatcher, maxPipeline = 1024):
+    '''Serves one connection:  reads request lines from reader until end of file, and writes
+    the responses to writer, in order, from a separate task (so that reading never waits for
+    scoring).  At most maxPipeline requests may be outstanding at a time.  If either side of
+    the connection fails (e.g. the client goes away), the other task is cancelled.'''
+
+    qPending = asyncio.Queue(maxPipeline)
+
+    async def readRequests():
+        while True:
+            sLine = await reader.readline()
+            if not sLine:
+                break
+            if sLine.strip():
+                await qPending.put(parseRequest(sLine, oBatcher))
+        await qPending.put(None)
+
+    async def writeResponses():
+        while True:
+            fuResponse = await qPending.get()
+            if fuResponse is None:
+                break
+            writer.write((json.dumps(await fuResponse) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    lTasks = [asyncio.ensure_future(readRequests()), asyncio.ensure_future(writeResponses())]
+    try:
+        await asyncio.wait(lTasks, return_when = asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in lTasks:
+            task.cancel()
+        lResults = await asyncio.gather(*lTasks, return_exceptions = True)
+
+    # A Lost Connection (or an Overlong Line) Ends the Connection; Anything Else is a Bug
+    for result in lResults:
+        if isinstance(result, Exception) and not isinstance(result, (ConnectionError, ValueError)):
+            raise result
+
+
+class FileReader(object):
+    '''Stream reader over a binary file (e.g. stdin, which may be a regular file, that the
+    event loop cannot watch):  a daemon thread reads its lines ahead, up to maxLines.'''
+
+    def __init__(self, fIn, maxLines = 1024):
+        self._lines = asyncio.Queue(maxLines)
+        loop = asyncio.get_event_loop()
+
+        def readLines():
+            for sLine in iter(fIn.readline, b""):
+                asyncio.run_coroutine_threadsafe(self._lines.put(sLine), loop).result()
+            asyncio.run_coroutine_threadsafe(self._lines.put(b""), loop).result()
+
+        tReader = threading.Thread(target = readLines)
+        tReader.daemon = True
+        tReader.start()
+
+    async def readline(self):
+        return await self._lines.get()
+
+
+class FileWriter(object):
+    '''Stream writer over a binary file (e.g. stdout), flushed whenever it is drained.'''
+
+    def __init__(self, fOut):
+        self._file = fOut
+
+    def write(self, sData):
+        self._file.write(sData)
+
+    async def drain(self):
+        self._file.flush()
+
+
+async def serveStream(fIn, fOut, oBatcher):
+    '''Serves the requests read from fIn (a binary file, until end of file), writing the
+    responses to fOut (another), as serveConnection() does for a socket.'''
+
+    await serveConnection(FileReader(fIn), FileWriter(fOut), oBatcher)
+
+
+async def serve(oBatcher, sUnixPath = None, sTCPAddress = None):
+    '''Serves the requests of every connection to the Unix socket sUnixPath, or to the TCP
+    socket sTCPAddress ("HOST:PORT"), forever; or, with neither, those of stdin.'''
+
+    oBatcher.start()
+    if not (sUnixPath or sTCPAddress):
+        await serveStream(sys.stdin.buffer, sys.stdout.buffer, oBatcher)
+        return
+
+    async def handleConnection(reader, writer):
+        try:
+            await serveConnection(reader, writer, oBatcher)
+        finally:
+            writer.close()
+
+    if sUnixPath:
+        oServer = await asyncio.start_unix_server(handleConnection, sUnixPath, limit = MAX_LINE)
+    else:
+        sHost, sPort = sTCPAddress.rsplit(":", 1)
+        oServer = await asyncio.start_server(handleConnection, sHost, int(sPort), limit = MAX_LINE)
+    sys.stderr.write("Serving on %s\n" % (sUnixPath or sTCPAddress))
+    async with oServer:
+        await oServer.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Classify newline-delimited JSON reviews with a resident model.")
+    parser.add_argument("--strategy", choices = strategies.strategyNames(), default = "bayes", help = "scoring strategy of the classifier (default: bayes)")
+    parser.add_argument("--train-dir", default = "training/", help = "training directory, used if there is no saved model yet (default: training/)")
+    parser.add_argument("--model", default = None, help = "saved model file (default: the model file of the strategy, e.g. database)")
+    parser.add_argument("--mapped", action = "store_true", help = "memory-map the saved model read-only, shared between processes (slower, especially one review at a time; saves memory only for very large vocabularies)")
+    parser.add_argument("--unix", metavar = "PATH", help = "listen on a Unix socket")
+    parser.add_argument("--tcp", metavar = "HOST:PORT", help = "listen on a TCP socket")
+    parser.add_argument("--max-batch", type = int, default = 256, help = "largest micro-batch (default: 256)")
+    parser.add_argument("--max-delay", type = float, default = 2.0, help = "longest wait to fill a micro-batch, in ms (default: 2)")
+    args = parser.parse_args()
+
+    # Load the Model in the Background, while the Server Starts (the First Batch Waits for It)
+    bc = engine.Classifier(args.train_dir, 1, args.mapped, modelFile = args.model, preload = True, strategy = args.strategy)
+    oBatcher = MicroBatcher(bc, args.max_batch, args.max_delay / 1000.0)
+
+    if args.unix and os.path.exists(args.unix):
+        os.remove(args.unix)
+    try:
+        asyncio.run(serve(oBatcher, args.unix, args.tcp))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
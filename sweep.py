@@ -0,0 +1,246 @@
+'''Hyperparameter sweep for the five tuning knobs of the bayesbest strategy (see
+strategies.BestStrategy):  scores every point of a grid of settings against the labels in the
+test file names, and reports the best settings by accuracy.
+
+The training and test reviews are read and tokenized once.  For each class, the training
+word counts are kept in buckets by review length (split at every shortReviewLength on the
+grid), along with which words are punctuation, which is all that the weighting of the strategy
+needs:  the short review counts for a given shortReviewLength are the sum of the buckets below
+it, and the model for any (punctuationWeight, shortReviewWeight, shortReviewLength) is
+recombined from these integer vectors by the strategy itself (see
+strategies.BestStrategy.weightArrays()), exactly as train() weights them, without re-reading
+a file.
+The test reviews are kept as vocabulary ids, so scoring them against a model is a single
+weighted bincount, and the test-time knobs (neutralityBias, reviewLengthWeight) are then
+applied to the whole test set at once.  The training-time points are spread over a pool of
+worker processes.  Requires NumPy.
+
+    python sweep.py [--punctuation-weight 1 10 100 1000] [--short-review-length 5 10 15 20 30]
+                    [--short-review-weight ...] [--neutrality-bias ...] [--review-length-weight ...]
+                    [--workers N] [--top 10] [--output FILE] [--verify]
+'''
+
+import argparse, bisect, json, math, multiprocessing, os, shutil, string, sys, tempfile, time
+from nbclassify import corpus, engine, strategies
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+KNOBS = ["punctuationWeight", "shortReviewWeight", "shortReviewLength", "neutralityBias", "reviewLengthWeight"]
+
+# The Classes as Numbers, the Way the Sweep Compares them:  the True Class of a Review File of
+# Any Other Rating (for which corpus.fileLabel() Returns None) is Neutral
+LABEL_CODES = {"positive": 1, "negative": -1, "neutral": 0, None: 0}
+
+stats = None # Sufficient Statistics, Collected before the Pool is Started (and Handed to Each Worker)
+
+
+def initWorker(dStats):
+    '''Pool initializer:  keeps the sufficient statistics dStats (see collectStatistics()) as
+    the global that evaluateTrainingPoint() reads.  Handing them over this way works whether the
+    pool forks its workers or spawns them (as on macOS, and on Linux from Python 3.14), which
+    do not see the globals of the parent.'''
+
+    global stats
+    stats = dStats
+
+
+def collectStatistics(bc, sTrainDir, sTestDir, lShortLengths):
+    '''Reads and tokenizes the training and test reviews once, and returns their sufficient
+    statistics, as a dictionary:  the vocabulary, a punctuation mask, per-class word counts
+    bucketed by review length (cumulated, so that entry j holds the counts of the reviews
+    shorter than lShortLengths[j]) and totals, the document counts of each class, and the
+    test reviews as vocabulary ids, document ids, lengths and true labels.  The words counted
+    are the features of the classifier (see engine.Classifier.extractFeatures()), and the
+    lengths are in tokens.'''
+
+    lShortLengths = sorted(lShortLengths)
+    iBuckets = len(lShortLengths) + 1
+    dVocabIds = {}
+    dBucketCounts = {1: [{} for i in range(iBuckets)], -1: [{} for i in range(iBuckets)]}
+    dNumDocs = {1: 0, -1: 0}
+
+    # Training Reviews:  Word Counts by Class and Length Bucket (the Files train() Reads)
+    for sFilename in corpus.listDocuments(sTrainDir):
+        iLabel = LABEL_CODES[corpus.fileLabel(sFilename)]
+        if iLabel == 0:
+            continue
+        words = bc.tokenize(bc.loadFile(os.path.join(sTrainDir, sFilename)), True)
+        dNumDocs[iLabel] = dNumDocs[iLabel] + 1
+        dCounts = dBucketCounts[iLabel][bisect.bisect_right(lShortLengths, len(words))]
+        for word in bc.extractFeatures(words):
+            dCounts[word] = dCounts.get(word,0) + 1
+            if word not in dVocabIds:
+                dVocabIds[word] = len(dVocabIds)
+
+    iVocabSize = len(dVocabIds)
+    aPunctuation = numpy.zeros(iVocabSize, dtype = bool)
+    for word, i in dVocabIds.items():
+        aPunctuation[i] = word in string.punctuation
+
+    dCumulative = {}
+    dTotals = {}
+    for iLabel, lBuckets in dBucketCounts.items():
+        aBuckets = numpy.zeros((iBuckets, iVocabSize), dtype = numpy.int64)
+        for iBucket, dCounts in enumerate(lBuckets):
+            for word, count in dCounts.items():
+                aBuckets[iBucket, dVocabIds[word]] = count
+        dCumulative[iLabel] = numpy.cumsum(aBuckets, axis = 0)
+        dTotals[iLabel] = dCumulative[iLabel][-1]
+
+    # Test Reviews:  Vocabulary Ids (iVocabSize for Unseen Words), Lengths and True Labels
+    lTokenIds = []
+    lLengths  = []
+    lFeatureCounts = []
+    lLabels   = []
+    for sFilename in sorted(os.listdir(sTestDir)):
+        words = bc.tokenize(bc.loadFile(os.path.join(sTestDir, sFilename)), True)
+        lFeatures = bc.extractFeatures(words)
+        lTokenIds.extend(dVocabIds.get(word, iVocabSize) for word in lFeatures)
+        lLengths.append(len(words))
+        lFeatureCounts.append(len(lFeatures))
+        lLabels.append(LABEL_CODES[corpus.fileLabel(sFilename)])
+    aLengths = numpy.array(lLengths, dtype = numpy.intp)
+
+    return {"shortLengths": lShortLengths, "punctuation": aPunctuation,
+            "cumulative": dCumulative, "totals": dTotals, "numDocs": dNumDocs,
+            "testTokenIds": numpy.array(lTokenIds, dtype = numpy.intp),
+            "testDocIds": numpy.repeat(numpy.arange(len(lLengths)), numpy.array(lFeatureCounts, dtype = numpy.intp)),
+            "testLengths": aLengths, "testLabels": numpy.array(lLabels, dtype = numpy.int8)}
+
+
+def classLogProbs(iLabel, iShortLength, punctuationWeight, shortReviewWeight):
+    '''Recombines the log conditional probability vector of one class (the last entry is for
+    unseen words) for the given training-time settings, weighting the counts with the
+    bayesbest strategy itself (see strategies.BestStrategy.weightArrays() and weightTotals()).'''
+
+    oStrategy = strategies.BestStrategy()
+    oStrategy.punctuationWeight = punctuationWeight
+    oStrategy.shortReviewWeight = shortReviewWeight
+
+    aShort = stats["cumulative"][iLabel][stats["shortLengths"].index(iShortLength)]
+    aLong = stats["totals"][iLabel] - aShort
+    lTotals = [0, 0, 0]
+    aCounts = oStrategy.weightArrays(aLong, aShort, stats["punctuation"], lTotals)
+
+    fTotal = float(oStrategy.weightTotals(lTotals) + 1)
+    return numpy.log10(numpy.append(aCounts + 1, 1) / fTotal)
+
+
+def evaluateTrainingPoint(tArgs):
+    '''Scores the test reviews against the model of one training-time point, and returns
+    the accuracy of every (neutralityBias, reviewLengthWeight) pair on the test-time grid,
+    as a list of (settings, number correct) pairs.'''
+
+    (punctuationWeight, shortReviewWeight, iShortLength), lNeutralityBiases, lReviewLengthWeights = tArgs
+
+    # Log Final Probabilities of the Test Reviews (as in engine.Classifier.batchLogFinalProbs)
+    fTotalDocs = float(stats["numDocs"][1] + stats["numDocs"][-1])
+    aTokenIds = stats["testTokenIds"]
+    aDocIds = stats["testDocIds"]
+    iDocs = len(stats["testLengths"])
+    aPositive = numpy.bincount(aDocIds, weights = classLogProbs(1, iShortLength, punctuationWeight, shortReviewWeight)[aTokenIds], minlength = iDocs)
+    aNegative = numpy.bincount(aDocIds, weights = classLogProbs(-1, iShortLength, punctuationWeight, shortReviewWeight)[aTokenIds], minlength = iDocs)
+    aPositive = aPositive + math.log10(stats["numDocs"][1] / fTotalDocs)
+    aNegative = aNegative + math.log10(stats["numDocs"][-1] / fTotalDocs)
+
+    # Apply the Test-Time Knobs (as in strategies.BestStrategy.labelArrays)
+    lResults = []
+    for reviewLengthWeight in lReviewLengthWeights:
+        aDelta = (aPositive - aNegative) + (stats["testLengths"] * reviewLengthWeight)
+        for neutralityBias in lNeutralityBiases:
+            aPredicted = (aDelta > +1.0 * neutralityBias).astype(numpy.int8) - (aDelta < -1.0 * neutralityBias).astype(numpy.int8)
+            dSettings = {"punctuationWeight": punctuationWeight, "shortReviewWeight": shortReviewWeight,
+                         "shortReviewLength": iShortLength, "neutralityBias": neutralityBias,
+                         "reviewLengthWeight": reviewLengthWeight}
+            lResults.append((dSettings, int((aPredicted == stats["testLabels"]).sum())))
+    return lResults
+
+
+def trainedAccuracy(bc, dSettings, sTrainDir, sTestDir):
+    '''Retrains bc with the given settings of its strategy (in a scratch directory, so the
+    database is left alone) and returns the number of test reviews it labels correctly.'''
+
+    for sKnob in KNOBS:
+        setattr(bc.strategy, sKnob, dSettings[sKnob])
+    bc.trainDirectory = os.path.abspath(sTrainDir) + "/"
+    sWorkingDir = os.getcwd()
+    sScratchDir = tempfile.mkdtemp()
+    os.chdir(sScratchDir)
+    try:
+        bc.train()
+    finally:
+        os.chdir(sWorkingDir)
+        shutil.rmtree(sScratchDir)
+
+    lFilenames = sorted(os.listdir(sTestDir))
+    lLabels = bc.classifyBatch([bc.loadFile(os.path.join(sTestDir, sFilename)) for sFilename in lFilenames])
+    return sum(1 for sFilename, sLabel in zip(lFilenames, lLabels) if LABEL_CODES[sLabel] == LABEL_CODES[corpus.fileLabel(sFilename)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Sweep the tuning knobs of bayesbest.py, and report the best settings by test accuracy.")
+    parser.add_argument("--train-dir", default = "training/", help = "training directory (default: training/)")
+    parser.add_argument("--test-dir", default = "testing/", help = "test directory (default: testing/)")
+    parser.add_argument("--punctuation-weight", nargs = "+", type = float, default = [1, 10, 100, 1000], help = "punctuationWeight values (default: 1 10 100 1000)")
+    parser.add_argument("--short-review-weight", nargs = "+", type = float, default = [0.1, 0.5, 1], help = "shortReviewWeight values (default: 0.1 0.5 1)")
+    parser.add_argument("--short-review-length", nargs = "+", type = int, default = [5, 10, 15, 20, 30], help = "shortReviewLength values (default: 5 10 15 20 30)")
+    parser.add_argument("--neutrality-bias", nargs = "+", type = float, default = [0, 0.01, 0.1, 0.5, 1], help = "neutralityBias values (default: 0 0.01 0.1 0.5 1)")
+    parser.add_argument("--review-length-weight", nargs = "+", type = float, default = [0, 0.04, 0.08, 0.12, 0.16, 0.2], help = "reviewLengthWeight values (default: 0 0.04 0.08 0.12 0.16 0.2)")
+    parser.add_argument("--workers", type = int, default = multiprocessing.cpu_count(), help = "worker processes (default: one per CPU)")
+    parser.add_argument("--top", type = int, default = 10, help = "best settings to report (default: 10)")
+    parser.add_argument("--output", metavar = "FILE", help = "write the accuracy of every grid point to FILE, as JSON")
+    parser.add_argument("--verify", action = "store_true", help = "retrain the classifier with the best settings, and check that it scores the same")
+    args = parser.parse_args()
+
+    if numpy is None:
+        sys.exit("sweep.py requires NumPy")
+    bc = engine.Classifier(args.train_dir, strategy = "bayesbest")
+    dCurrent = dict((sKnob, getattr(bc.strategy, sKnob)) for sKnob in KNOBS)
+
+    # Make Sure the Current Settings are on the Grid, for Reference
+    lGrids = [args.punctuation_weight, args.short_review_weight, args.short_review_length, args.neutrality_bias, args.review_length_weight]
+    for lGrid, sKnob in zip(lGrids, KNOBS):
+        if dCurrent[sKnob] not in lGrid:
+            lGrid.append(dCurrent[sKnob])
+
+    fStart = time.time()
+    stats = collectStatistics(bc, args.train_dir, args.test_dir, args.short_review_length)
+    fCollected = time.time()
+
+    lTrainingPoints = [((punctuationWeight, shortReviewWeight, iShortLength), args.neutrality_bias, args.review_length_weight)
+                       for punctuationWeight in args.punctuation_weight
+                       for shortReviewWeight in args.short_review_weight
+                       for iShortLength in args.short_review_length]
+    pool = multiprocessing.Pool(max(1, args.workers), initWorker, (stats,))
+    try:
+        lResults = [tResult for lPointResults in pool.imap(evaluateTrainingPoint, lTrainingPoints) for tResult in lPointResults]
+    finally:
+        pool.close()
+        pool.join()
+    fSwept = time.time()
+
+    iTestDocs = len(stats["testLabels"])
+    lResults.sort(key = lambda tResult: -tResult[1])
+    print("Tokenized %d test reviews (and the training reviews) once in %.2f sec." % (iTestDocs, fCollected - fStart))
+    print("Swept %d grid points (%d models) in %.2f sec on %d worker(s)." % (len(lResults), len(lTrainingPoints), fSwept - fCollected, args.workers))
+
+    print("\n%8s  " % "accuracy" + "  ".join("%18s" % sKnob for sKnob in KNOBS))
+    for dSettings, iCorrect in lResults[:args.top]:
+        print("%8.4f  " % (iCorrect / float(iTestDocs)) + "  ".join("%18g" % dSettings[sKnob] for sKnob in KNOBS))
+    for dSettings, iCorrect in lResults:
+        if all(dSettings[sKnob] == dCurrent[sKnob] for sKnob in KNOBS):
+            print("\n%8.4f  " % (iCorrect / float(iTestDocs)) + "  ".join("%18g" % dSettings[sKnob] for sKnob in KNOBS) + "  (current settings)")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump([dict(dSettings, accuracy = iCorrect / float(iTestDocs)) for dSettings, iCorrect in lResults], fh, indent = 2)
+
+    if args.verify:
+        dBest, iBestCorrect = lResults[0]
+        iCorrect = trainedAccuracy(bc, dBest, args.train_dir, args.test_dir)
+        if iCorrect != iBestCorrect:
+            sys.exit("Retraining with the best settings gives %d correct, not %d." % (iCorrect, iBestCorrect))
+        print("\nRetraining with the best settings gives the same accuracy.")
@@ -0,0 +1,384 @@
+'''Tests of the classifier engine (see nbclassify/engine.py):  the tokenizer against the
+original per-character tokenizer (engine.referenceTokenize()) on ASCII text, and on its own
+on Unicode text, single against batch scoring, and the round trips of the model files.  The
+classifiers are trained on the shipped training/ reviews.
+
+    python -m pytest tests/
+'''
+
+import asyncio, io, json, multiprocessing, os, pickle, shutil, string, struct, threading, unicodedata
+import pytest
+from nbclassify import corpus, engine, modelfile, ratings, strategies
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ROOT     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAIN    = os.path.join(ROOT, "training")
+TEST     = os.path.join(ROOT, "testing")
+DATABASE = os.path.join(ROOT, "database")
+
+STRATEGIES = ["bayes", "bayesbest"]
+
+
+def readTexts(sDirectory, iLimit = None):
+    '''Returns the texts of the review files of sDirectory, in name order.'''
+
+    return [corpus.readText(os.path.join(sDirectory, sName)) for sName in sorted(os.listdir(sDirectory))[:iLimit]]
+
+
+@pytest.fixture(scope = "module")
+def testTexts():
+    return readTexts(TEST)
+
+
+@pytest.fixture(scope = "module", params = STRATEGIES)
+def trained(request, tmp_path_factory):
+    '''A classifier of each strategy, trained on training/, and the file its model is saved to.'''
+
+    sModelFile = str(tmp_path_factory.mktemp("model") / "database")
+    bc = engine.Classifier(TRAIN, modelFile = sModelFile, strategy = request.param)
+    bc.train()
+    return bc, sModelFile
+
+
+def test_tokenize_matches_reference():
+    bc = engine.Classifier(TRAIN)
+    lTexts = readTexts(TRAIN) + readTexts(TEST) + ["", "   ", "don't stop-motion_films!!", "a\tb\nc", "x--y 'quoted' 3.5/10 (ok)"]
+
+    # On ASCII Text (All of the Shipped Reviews), the Tokens of the Original Tokenizer
+    for sText in lTexts:
+        assert sText.isascii()
+        assert bc.tokenize(sText) == engine.referenceTokenize(sText)
+        assert bc.tokenize(sText, True) == [sToken.lower() for sToken in engine.referenceTokenize(sText)]
+        assert list(bc.iterTokens(sText, True)) == bc.tokenize(sText, True)
+
+
+def test_tokenize_unicode():
+    bc = engine.Classifier(TRAIN)
+    assert bc.tokenize("été schön, naïve 123abc") == ["été", "schön", ",", "naïve", "123abc"]
+    assert bc.tokenize(unicodedata.normalize("NFD", "Café très bon"), True) == ["café", "très", "bon"]
+    assert bc.tokenize("İstanbul's", True) == ["i\u0307stanbul's"]
+    assert bc.tokenize("हिन्दी फ़िल्म!") == ["हिन्दी", "फ़िल्म", "!"]
+    assert bc.tokenize("日本語 映画!") == ["日本語", "映画", "!"]
+    assert bc.tokenize("\u0301x \u0301") == ["\u0301", "x", "\u0301"]
+    for sText in ["été schön", unicodedata.normalize("NFD", "Très Café, été!"), "İİ हिन्दी"]:
+        assert list(bc.iterTokens(sText, True)) == bc.tokenize(sText, True)
+
+
+def test_chunked_tokens_match_whole_text():
+    bc = engine.Classifier(TRAIN)
+    for sText in readTexts(TRAIN, 50) + [unicodedata.normalize("NFD", "Très Café, été!") * 3, "İİ हिन्दी"]:
+        for iChunkSize in [1, 7, 64]:
+            lChunks = [sText[i:i + iChunkSize] for i in range(0, len(sText), iChunkSize)]
+            lTokens = [sToken for lTokens in corpus.iterChunkTokens(lChunks, engine.TOKEN_PATTERN) for sToken in lTokens]
+            assert lTokens == bc.tokenize(sText, True)
+
+
+def test_jsonl_invalid_utf8(tmp_path):
+    sFile = str(tmp_path / "reviews.jsonl")
+    with open(sFile, "wb") as f:
+        f.write(b'{"label": "positive", "text": "caf\xe9 great"}\n\n["negative", "dull \xff film"]\n')
+
+    # Undecodable Bytes Become U+FFFD, as in Review Files
+    lDocuments = [(sName, sLabel, "".join(iChunks)) for sName, sLabel, iChunks in corpus.iterDocuments(sFile)]
+    assert lDocuments == [("reviews.jsonl:1", "positive", "caf\ufffd great"), ("reviews.jsonl:3", "negative", "dull \ufffd film")]
+
+
+def test_classify_batch_matches_classify(trained, testTexts):
+    bc = trained[0]
+    lExpected = [bc.labelScore(*bc.reviewLogFinalProbs(sText)) for sText in testTexts]
+    assert bc.classifyBatch(testTexts) == [sLabel for sLabel, fScore in lExpected]
+    assert [bc.classify(sText) for sText in testTexts] == [sLabel for sLabel, fScore in lExpected]
+    assert bc.classifyBatch(testTexts, True) == pytest.approx(lExpected)
+
+
+def test_model_round_trip(trained, testTexts):
+    bc, sModelFile = trained
+    assert modelfile.isModelFile(sModelFile)
+
+    bcLoaded = engine.Classifier(TRAIN, modelFile = sModelFile, strategy = bc.strategy.name, lazy = False)
+    assert dict(bcLoaded.positiveWords) == dict(bc.positiveWords)
+    assert dict(bcLoaded.negativeWords) == dict(bc.negativeWords)
+    assert (bcLoaded.numPositiveDocs, bcLoaded.numNegativeDocs, bcLoaded.numPositiveWords, bcLoaded.numNegativeWords) == \
+           (bc.numPositiveDocs, bc.numNegativeDocs, bc.numPositiveWords, bc.numNegativeWords)
+    assert bcLoaded.classifyBatch(testTexts, True) == bc.classifyBatch(testTexts, True)
+
+
+def test_database_migration(tmp_path):
+    bc = engine.Classifier(TRAIN, modelFile = DATABASE, lazy = False)
+    sModelFile = str(tmp_path / "database")
+    modelfile.convertDatabase(DATABASE, sModelFile)
+
+    bcConverted = engine.Classifier(TRAIN, modelFile = sModelFile, lazy = False)
+    assert dict(bcConverted.positiveWords) == dict(bc.positiveWords)
+    assert dict(bcConverted.negativeWords) == dict(bc.negativeWords)
+    assert bcConverted.numPositiveWords == bc.numPositiveWords and bcConverted.numNegativeWords == bc.numNegativeWords
+
+
+def test_mapped_token_ids(trained):
+    bc, sModelFile = trained
+    oModel = modelfile.MappedModel(sModelFile)
+    lVocabulary = sorted(bc.positiveWords.keys() | bc.negativeWords.keys())
+    assert [oModel.vocabulary[i] for i in range(len(oModel.vocabulary))] == lVocabulary
+
+    lTokens = lVocabulary[::3] + ["", "\0", "zzzz", "x" * 2000, lVocabulary[0] + "\0", lVocabulary[-1] + "a", "été"]
+    lIds = [lVocabulary.index(word) if word in lVocabulary else -1 for word in lTokens]
+    assert [oModel.index(word) for word in lTokens] == lIds
+    if numpy is not None:
+        assert oModel.tokenIds(lTokens).tolist() == lIds
+
+
+def test_model_file_long_word(tmp_path):
+    dWords = dict(("word%d" % i, i + 1) for i in range(1000))
+    modelfile.writeModel(str(tmp_path / "short"), [dWords, dWords, 1, 1, 1, 1])
+    dWords["x" * 2000] = 1
+    modelfile.writeModel(str(tmp_path / "long"), [dWords, dWords, 1, 1, 1, 1])
+
+    # One Long Word Costs its Own Bytes, not a Wider Record for Every Word
+    assert os.path.getsize(str(tmp_path / "long")) - os.path.getsize(str(tmp_path / "short")) < 2100
+    assert modelfile.readModel(str(tmp_path / "long"))[0] == dWords
+
+    # Files of Any Other Format Version are Refused
+    with open(str(tmp_path / "long"), "r+b") as f:
+        f.seek(len(modelfile.MAGIC))
+        f.write(struct.pack("<H", modelfile.VERSION - 1))
+    with pytest.raises(ValueError):
+        modelfile.readModel(str(tmp_path / "long"))
+
+
+def test_concurrent_model_writes(tmp_path):
+    sModelFile = str(tmp_path / "database")
+    lDatabases = [[{"word%d" % i: i + 1}, {"other": 1}, 1, 1, i + 1, 1] for i in range(4)]
+    lErrors = []
+
+    def writeModels(lDatabase):
+        try:
+            for i in range(20):
+                modelfile.writeModel(sModelFile, lDatabase)
+        except Exception as e:
+            lErrors.append(e)
+
+    # Each Writer has its Own Temporary File; One of the Complete Models Wins
+    lThreads = [threading.Thread(target = writeModels, args = (lDatabase,)) for lDatabase in lDatabases]
+    for thread in lThreads:
+        thread.start()
+    for thread in lThreads:
+        thread.join()
+    assert lErrors == []
+    assert modelfile.readModel(sModelFile) in lDatabases
+    assert os.listdir(str(tmp_path)) == ["database"]
+
+
+def test_stored_log_probs(trained, testTexts, tmp_path):
+    bc, sModelFile = trained
+    sCopy = str(tmp_path / "database")
+    shutil.copyfile(sModelFile, sCopy)
+    bcLoaded = engine.Classifier(TRAIN, modelFile = sCopy, strategy = bc.strategy.name, lazy = False)
+
+    # A Loaded Model Scores from a Dictionary of the Log Probabilities Stored in its File
+    assert [bcLoaded.reviewLogFinalProbs(sText) for sText in testTexts[:50]] == \
+           pytest.approx([bc.reviewLogFinalProbs(sText) for sText in testTexts[:50]])
+    oTable = modelfile.readCountTable(sCopy)[0]
+    assert bcLoaded._logProbTable == dict(zip(oTable.vocabulary.words, zip(*oTable.logProbs[:2])))
+    assert bcLoaded.explain(testTexts[0]) == pytest.approx(bc.explain(testTexts[0]))
+    assert bcLoaded.explainBatch(testTexts[:5]) == pytest.approx(bc.explainBatch(testTexts[:5]))
+    assert bcLoaded.mostDiscriminative(10) == pytest.approx(bc.mostDiscriminative(10))
+
+    # Changed Counts Fall Back to Computed Log Probabilities
+    bcLoaded.update([testTexts[0]], ["positive"])
+    bcLoaded.classify(testTexts[1])
+    assert bcLoaded._logProbTable != dict(zip(oTable.vocabulary.words, zip(*oTable.logProbs[:2])))
+
+
+def test_update_then_remove_restores_counts(trained, testTexts, tmp_path):
+    bc, sModelFile = trained
+    sCopy = str(tmp_path / "database")
+    shutil.copyfile(sModelFile, sCopy)
+    bcUpdated = engine.Classifier(TRAIN, modelFile = sCopy, strategy = bc.strategy.name, lazy = False)
+    dPositive, dNegative = dict(bcUpdated.positiveWords), dict(bcUpdated.negativeWords)
+    lTotals = [bcUpdated.numPositiveWords, bcUpdated.numNegativeWords]
+
+    # Short Reviews Have Scaled Counts under bayesbest, which Must Not Drift
+    lDocs = [testTexts[0], "an animated adventure for adults , but too short !", "dull"]
+    lLabels = ["positive", "positive", "negative"]
+    for i in range(5):
+        bcUpdated.update(lDocs, lLabels)
+        bcUpdated.remove(lDocs, lLabels)
+    assert dict(bcUpdated.positiveWords) == dPositive
+    assert dict(bcUpdated.negativeWords) == dNegative
+    assert [bcUpdated.numPositiveWords, bcUpdated.numNegativeWords] == lTotals
+
+
+def test_update_reads_files_only_when_asked(trained, tmp_path):
+    bc, sModelFile = trained
+    sCopy = str(tmp_path / "database")
+    shutil.copyfile(sModelFile, sCopy)
+    bcUpdated = engine.Classifier(TRAIN, modelFile = sCopy, strategy = bc.strategy.name, lazy = False)
+    sReview = str(tmp_path / "review.txt")
+    with open(sReview, "w") as f:
+        f.write("zzzunseenword")
+
+    # A Text that Names an Existing File is Still a Text
+    bcUpdated.update([sReview], ["positive"])
+    assert "zzzunseenword" not in bcUpdated.positiveWords
+    bcUpdated.update([sReview], ["positive"], bFiles = True)
+    assert bcUpdated.positiveWords["zzzunseenword"] > 0
+
+
+def test_database_unpickling_is_restricted(tmp_path):
+    sFile = str(tmp_path / "database")
+    with open(sFile, "wb") as f:
+        pickle.dump(os.system, f, 0)
+    with pytest.raises(pickle.UnpicklingError):
+        modelfile.readDatabase(sFile)
+    with pytest.raises(pickle.UnpicklingError):
+        engine.Classifier(TRAIN, modelFile = sFile, lazy = False)
+
+    lDatabase = [{"good": 2}, {"bad": 3}, 1, 1, 2, 3]
+    with open(sFile, "wb") as f:
+        pickle.dump(lDatabase, f, 0)
+    assert modelfile.readDatabase(sFile) == lDatabase
+
+
+def test_crossvalidate_spawned_workers(tmp_path):
+    import crossvalidate
+    lNames = [sName for sName in corpus.listDocuments(TRAIN) if corpus.fileLabel(sName) is not None]
+    lFolds = crossvalidate.assignFolds(lNames, 3, 510)
+    dClassifierArgs = {"trainDirectory": TRAIN, "modelFile": str(tmp_path / "database"), "strategy": "bayes"}
+    bc = engine.Classifier(**dClassifierArgs)
+    bc.claimModel()
+    dStats = crossvalidate.collectStatistics(bc, TRAIN, lFolds)
+
+    # Workers Started by Spawning See Nothing of the Parent but what the Initializer Hands Them
+    pool = multiprocessing.get_context("spawn").Pool(2, crossvalidate.initWorker, (dClassifierArgs, dStats))
+    try:
+        lResults = sorted(pool.map(crossvalidate.evaluateFold, range(3)))
+    finally:
+        pool.close()
+        pool.join()
+    crossvalidate.initWorker(dClassifierArgs, dStats)
+    assert [tResult[:3] for tResult in lResults] == [crossvalidate.evaluateFold(iFold)[:3] for iFold in range(3)]
+
+
+@pytest.mark.skipif(numpy is None, reason = "weightArrays() requires NumPy")
+def test_weight_arrays_match_weight_word():
+    lWords = ["!", "good", ",", "film", "-", "dull"]
+    aLong, aShort = numpy.array([3, 0, 5, 7, 0, 2]), numpy.array([1, 4, 0, 2, 0, 0])
+    aPunctuation = numpy.array([word in string.punctuation for word in lWords])
+    for oStrategy in [strategies.Strategy(), strategies.BestStrategy()]:
+        lTotals, lArrayTotals = [0, 0, 0], [0, 0, 0]
+        lCounts = [oStrategy.weightWord(word, int(iLong), int(iShort), lTotals) for word, iLong, iShort in zip(lWords, aLong, aShort)]
+        assert oStrategy.weightArrays(aLong, aShort, aPunctuation, lArrayTotals).tolist() == lCounts
+        assert lArrayTotals == lTotals
+
+
+@pytest.mark.skipif(numpy is None, reason = "sweep.py requires NumPy")
+def test_sweep_spawned_workers(tmp_path):
+    import sweep
+    bc = engine.Classifier(TRAIN, modelFile = str(tmp_path / "database.bayesbest"), strategy = "bayesbest")
+    dStats = sweep.collectStatistics(bc, TRAIN, TEST, [10, 20])
+    lPoints = [((punctuationWeight, 1, 10), [0, 0.1], [0, 0.08]) for punctuationWeight in [1, 100]]
+
+    pool = multiprocessing.get_context("spawn").Pool(2, sweep.initWorker, (dStats,))
+    try:
+        lResults = pool.map(sweep.evaluateTrainingPoint, lPoints)
+    finally:
+        pool.close()
+        pool.join()
+    sweep.initWorker(dStats)
+    assert lResults == [sweep.evaluateTrainingPoint(tPoint) for tPoint in lPoints]
+
+
+def test_evaluate_parallel_spawned_workers(trained):
+    import evaluate_parallel
+    bc, sModelFile = trained
+    dClassifierArgs = {"trainDirectory": TRAIN, "modelFile": sModelFile, "strategy": bc.strategy.name}
+    lPaths = [os.path.join(TEST, sName) for sName in sorted(os.listdir(TEST))[:100]]
+
+    pool = multiprocessing.get_context("spawn").Pool(1, evaluate_parallel.initWorker, (dClassifierArgs,))
+    try:
+        lLabels, tTimes, iMismatches, dMetrics = pool.apply(evaluate_parallel.classifyChunk, ((lPaths, True),))
+    finally:
+        pool.close()
+        pool.join()
+    assert iMismatches == 0
+    assert lLabels == bc.classifyBatch([corpus.readText(sPath) for sPath in lPaths])
+
+
+def test_server_stream(trained, testTexts):
+    import server
+    bc = trained[0]
+    lRequests = [{"id": i, "text": sText} for i, sText in enumerate(testTexts[:300])]
+    lLines = [json.dumps(dRequest) for dRequest in lRequests] + ['{"id": "a", "text": "x", "explain": true}', '{"id": "b"}', "[1", ""]
+    fIn, fOut = io.BytesIO("\n".join(lLines).encode("utf-8")), io.BytesIO()
+
+    async def serveStream():
+        oBatcher = server.MicroBatcher(bc, 64)
+        oBatcher.start()
+        await server.serveStream(fIn, fOut, oBatcher)
+    asyncio.run(serveStream())
+
+    # Responses in Request Order, in Micro-Batches; Errors Echo the Request's "id"
+    lResponses = [json.loads(sLine) for sLine in fOut.getvalue().decode("utf-8").splitlines()]
+    assert [(dResponse["id"], dResponse["label"]) for dResponse in lResponses[:300]] == \
+           list(enumerate(bc.classifyBatch(testTexts[:300])))
+    assert [dResponse.get("id") for dResponse in lResponses[300:]] == ["a", "b", None]
+    assert all("error" in dResponse for dResponse in lResponses[300:])
+
+
+def test_mapped_model_scores_match(trained, testTexts):
+    bc, sModelFile = trained
+    bcLoaded = engine.Classifier(TRAIN, modelFile = sModelFile, strategy = bc.strategy.name, lazy = False)
+    bcMapped = engine.Classifier(TRAIN, mapped = True, modelFile = sModelFile, strategy = bc.strategy.name, lazy = False)
+    assert isinstance(bcMapped._logProbTable, modelfile.MappedModel)
+
+    # The Same Scores, One at a Time and in Batches, and the Same Explanations
+    assert [bcMapped.reviewLogFinalProbs(sText) for sText in testTexts] == [bcLoaded.reviewLogFinalProbs(sText) for sText in testTexts]
+    assert bcMapped.classifyBatch(testTexts, True) == bcLoaded.classifyBatch(testTexts, True)
+    assert bcMapped.explainBatch(testTexts[:20]) == bcLoaded.explainBatch(testTexts[:20])
+    assert bcMapped.mostDiscriminative(20) == bcLoaded.mostDiscriminative(20)
+
+
+def test_metrics_count_chars_and_unseen_features(trained):
+    bc, sModelFile = trained
+    lTexts = ["Ça été a great zzzunseen film", "zzzunseen, again"]
+    lFeatures = [word for sText in lTexts for word in bc.extractFeatures(bc.tokenize(sText, True))]
+
+    # Unseen Features are Counted from the Scoring Lookups, Including those Answered by the Token Cache
+    for bMapped in [False, True]:
+        bcMetrics = engine.Classifier(TRAIN, mapped = bMapped, modelFile = sModelFile, strategy = bc.strategy.name, lazy = False, metrics = True)
+        bcMetrics.enableCache()
+        for sText in lTexts:
+            bcMetrics.classify(sText)
+        assert bcMetrics.metrics.counter("tokenize.chars") == sum(len(sText) for sText in lTexts)
+        assert bcMetrics.metrics.counter("score.features") == len(lFeatures)
+        assert bcMetrics.metrics.counter("score.unseen_features") == sum(1 for word in lFeatures if word not in bc.positiveWords and word not in bc.negativeWords)
+
+
+@pytest.mark.skipif(numpy is None, reason = "MappedModel.tokenIds() requires NumPy")
+def test_mapped_token_ids_across_prefix_slices(tmp_path):
+    lVocabulary = sorted("w%05d" % i for i in range(0, 2 * modelfile.PREFIX_SLICE + 100, 2))
+    dWords = dict((word, 1) for word in lVocabulary)
+    modelfile.writeModel(str(tmp_path / "database"), [dWords, dWords, 1, 1, len(dWords), len(dWords)])
+    oModel = modelfile.MappedModel(str(tmp_path / "database"))
+
+    lTokens = ["w%05d" % i for i in range(0, 2 * modelfile.PREFIX_SLICE + 100, 7)]
+    assert oModel.tokenIds(lTokens).tolist() == [int(word[1:]) // 2 if int(word[1:]) % 2 == 0 else -1 for word in lTokens]
+
+
+def test_ratings_share_the_engine(tmp_path):
+    sModelFile = str(tmp_path / "ratings")
+    rc = ratings.Rating_Classifier(TRAIN, 1, sModelFile)
+    bc = engine.Classifier(TRAIN)
+    for sText in readTexts(TRAIN, 20) + [unicodedata.normalize("NFD", "Très Café, été!")]:
+        assert rc.tokenize(sText, True) == bc.tokenize(sText, True)
+
+    # Counted in Shards on a Pool, the Same Model; Other Feature Settings Make it Stale
+    rcPool = ratings.Rating_Classifier(TRAIN, 2, str(tmp_path / "ratings-pool"))
+    assert rcPool.vocabulary == rc.vocabulary and rcPool.numWords == rc.numWords
+    assert [list(lRow) for lRow in rcPool.counts] == [list(lRow) for lRow in rc.counts]
+    assert not rc.isStale()
+    assert ratings.Rating_Classifier(TRAIN, 1, sModelFile, ngrams = 2).ngrams == 2
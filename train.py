@@ -0,0 +1,22 @@
+import argparse
+from nbclassify import engine, instrument, strategies
+
+parser = argparse.ArgumentParser(description = "Train a classifier from scratch on a directory tree, a tar / zip archive or a JSONL file of labeled reviews, and save it.")
+parser.add_argument("source", help = "training directory, archive (.tar, .tar.gz, .zip) or JSONL file (.jsonl, .jsonl.gz) of {\"label\", \"text\"} records")
+parser.add_argument("--strategy", choices = strategies.strategyNames(), default = "bayes", help = "scoring strategy of the classifier (default: bayes)")
+parser.add_argument("--workers", type = int, default = 1, help = "worker processes counting the files of a directory (default: 1)")
+parser.add_argument("--spill-words", type = int, default = 0, help = "spill the partial counts to disk whenever they hold more than this many words (default: 0, never)")
+parser.add_argument("--model", default = None, help = "model file to save (default: the model file of the strategy, e.g. database)")
+parser.add_argument("--ngrams", type = int, default = 1, help = "longest n-gram of the features, e.g. 2 for unigrams and bigrams (default: 1)")
+parser.add_argument("--hash-buckets", type = int, default = 0, help = "hash the features into this many buckets, bounding the model size (default: 0, no hashing)")
+parser.add_argument("--metrics", metavar = "FILE", help = "write the counters and stage timings to FILE (Prometheus text if it ends in .prom, JSON otherwise)")
+args = parser.parse_args()
+
+# The Constructor Loads Lazily, so Nothing is Loaded before Training
+bc = engine.Classifier(args.source, args.workers, spillWords = args.spill_words, modelFile = args.model,
+                       ngrams = args.ngrams, hashBuckets = args.hash_buckets, metrics = bool(args.metrics), strategy = args.strategy)
+bc.train(args.workers)
+if args.metrics:
+    instrument.writeMetrics(args.metrics, bc)
+
+print("Trained on %d positive and %d negative reviews (%d distinct features)." % (bc.numPositiveDocs, bc.numNegativeDocs, len(set(bc.positiveWords) | set(bc.negativeWords))))
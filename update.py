@@ -0,0 +1,24 @@
+import argparse
+from nbclassify import engine, instrument, strategies
+
+parser = argparse.ArgumentParser(description = "Add labeled reviews to a trained model (or back them out of it), without retraining from scratch.")
+parser.add_argument("label", choices = ["positive", "negative"], help = "the class of the reviews")
+parser.add_argument("files", nargs = "+", help = "review files to add (or remove)")
+parser.add_argument("--remove", action = "store_true", help = "remove the reviews from the model, instead of adding them")
+parser.add_argument("--strategy", choices = strategies.strategyNames(), default = "bayes", help = "scoring strategy of the classifier (default: bayes)")
+parser.add_argument("--train-dir", default = "training/", help = "training directory, used if there is no saved model yet (default: training/)")
+parser.add_argument("--model", default = None, help = "saved model file (default: the model file of the strategy, e.g. database)")
+parser.add_argument("--metrics", metavar = "FILE", help = "write the counters and stage timings to FILE (Prometheus text if it ends in .prom, JSON otherwise)")
+args = parser.parse_args()
+
+bc = engine.Classifier(args.train_dir, modelFile = args.model, metrics = bool(args.metrics), strategy = args.strategy)
+
+if args.remove:
+    bc.remove(args.files, [args.label] * len(args.files), bFiles = True)
+else:
+    bc.update(args.files, [args.label] * len(args.files), bFiles = True)
+if args.metrics:
+    instrument.writeMetrics(args.metrics, bc)
+
+print("%s %d %s review(s)." % ("Removed" if args.remove else "Added", len(args.files), args.label))
+print("The model now holds %d positive and %d negative reviews." % (bc.numPositiveDocs, bc.numNegativeDocs))